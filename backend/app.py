@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 from authorize import init_authorize_routes
 from customer import init_customer_routes
 from manager import init_manager_routes
+from exports import init_export_routes
 
 
 def create_app():
@@ -22,6 +23,7 @@ def create_app():
     init_authorize_routes(app)
     init_customer_routes(app)
     init_manager_routes(app)
+    init_export_routes(app)
 
     return app
 
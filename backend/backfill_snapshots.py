@@ -0,0 +1,62 @@
+# backend/backfill_snapshots.py
+"""
+One-off backfill of the title/author snapshot columns on order_items and
+rentals (filled at write time by place_order_tx and manual rentals).
+
+Walks each table by primary-key ranges of CHUNK ids, copying the display
+fields from books for rows that do not have them yet, and commits per
+chunk so locks stay short and the job can be stopped and rerun safely.
+
+    python backfill_snapshots.py [--chunk 5000] [--pause 0.05]
+"""
+import argparse
+import time
+
+from database import get_db_connection
+
+CHUNK = 5000
+TABLES = ("order_items", "rentals")
+
+
+def backfill_table(conn, table, chunk=CHUNK, pause=0.0):
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        max_id = cur.fetchone()[0]
+
+        updated = 0
+        lo = 1
+        while lo <= max_id:
+            hi = lo + chunk - 1
+            cur.execute(f"""
+                UPDATE {table} t
+                JOIN books b ON b.id = t.book_id
+                SET t.title = b.title,
+                    t.author = b.author
+                WHERE t.id BETWEEN %s AND %s
+                  AND t.title IS NULL
+            """, (lo, hi))
+            updated += cur.rowcount
+            conn.commit()
+            lo = hi + 1
+            if pause:
+                time.sleep(pause)
+        return updated
+    finally:
+        cur.close()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Backfill title/author snapshots")
+    p.add_argument("--chunk", type=int, default=CHUNK)
+    p.add_argument("--pause", type=float, default=0.0,
+                   help="seconds to sleep between chunks")
+    args = p.parse_args()
+
+    conn = get_db_connection()
+    try:
+        for table in TABLES:
+            n = backfill_table(conn, table, args.chunk, args.pause)
+            print(f"{table}: {n} rows backfilled")
+    finally:
+        conn.close()
@@ -0,0 +1,471 @@
+# backend/bench_inventory.py
+"""
+Checkout contention benchmark.
+
+Drives concurrent POST /api/orders, manual rentals and rental returns
+through the real Flask app (in-process test clients, one per worker
+thread) against a small set of hot books, then checks the stock
+invariants:
+
+    available_copies >= 0
+    available_copies + open rentals == total_copies
+    initial copies - copies sold == total_copies
+
+The "local DB stand-in" is a scratch MySQL database (BENCH_MYSQL_DB,
+default online_bookstore_bench) on the server from .env.  It is rebuilt
+from sql/schema.sql and reseeded on every run, so never point it at the
+real database.
+
+    python bench_inventory.py                     # "hot" profile
+    python bench_inventory.py --profile wide --workers 32
+    python bench_inventory.py --list-profiles
+
+Reports throughput, p50/p99 latency per operation, retries (500s retried
+with the same Idempotency-Key) and InnoDB deadlock / lock-wait counts.
+Exits 1 if an invariant is violated.  This is a benchmark, not a test.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import mysql.connector
+from dotenv import load_dotenv
+
+load_dotenv()
+# Measure the synchronous transactional path; must be set before app import
+os.environ["ORDER_INTAKE"] = "sync"
+
+PROFILES = {
+    "smoke": dict(workers=4, ops=200, books=3, copies=20, cart=(1, 2),
+                  skew=1.0, mix=(0.6, 0.25, 0.15), buy_ratio=0.5, shards=0),
+    "hot": dict(workers=16, ops=2000, books=5, copies=200, cart=(1, 3),
+                skew=1.2, mix=(0.6, 0.25, 0.15), buy_ratio=0.5, shards=0),
+    "hot-sharded": dict(workers=16, ops=2000, books=5, copies=200, cart=(1, 3),
+                        skew=1.2, mix=(0.6, 0.25, 0.15), buy_ratio=0.5, shards=8),
+    "wide": dict(workers=16, ops=2000, books=200, copies=50, cart=(3, 8),
+                 skew=0.0, mix=(0.8, 0.1, 0.1), buy_ratio=0.5, shards=0),
+    "scarce": dict(workers=16, ops=1000, books=3, copies=10, cart=(1, 2),
+                   skew=1.0, mix=(0.5, 0.25, 0.25), buy_ratio=0.3, shards=0),
+}
+
+MAX_RETRIES = 3
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "..", "sql", "schema.sql")
+
+
+# ============================================================
+# SCRATCH DATABASE
+# ============================================================
+
+def _server_connection(database=None):
+    return mysql.connector.connect(
+        host=os.getenv("MYSQL_HOST", "127.0.0.1"),
+        user=os.getenv("MYSQL_USER", "root"),
+        password=os.getenv("MYSQL_PASSWORD", ""),
+        database=database,
+    )
+
+
+def _schema_statements(db_name):
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        lines = [l for l in f if not l.lstrip().startswith("--")]
+    sql = "".join(lines).replace("online_bookstore", db_name)
+    return [stmt.strip() for stmt in sql.split(";") if stmt.strip()]
+
+
+def build_database(db_name, cfg, customers):
+    """Recreate the schema in `db_name` and seed users, books and stock."""
+    conn = _server_connection()
+    cur = conn.cursor()
+    try:
+        for stmt in _schema_statements(db_name):
+            cur.execute(stmt)
+
+        cur.execute("""
+            INSERT INTO users (username, email, password_hash, role)
+            VALUES ('bench_manager', 'bench_manager@example.com', 'x', 'manager')
+        """)
+        manager_id = cur.lastrowid
+
+        cur.executemany("""
+            INSERT INTO users (username, email, password_hash, role)
+            VALUES (%s, %s, 'x', 'customer')
+        """, [(f"bench_{i}", f"bench_{i}@example.com") for i in range(customers)])
+        cur.execute("SELECT id FROM users WHERE role = 'customer' ORDER BY id")
+        customer_ids = [r[0] for r in cur.fetchall()]
+
+        cur.executemany("""
+            INSERT INTO books (title, author, price_buy, price_rent)
+            VALUES (%s, %s, %s, %s)
+        """, [(f"Hot Book {i}", f"Author {i % 7}", 20 + i % 10, 3 + i % 3)
+              for i in range(cfg["books"])])
+        cur.execute("SELECT id FROM books ORDER BY id")
+        book_ids = [r[0] for r in cur.fetchall()]
+
+        cur.executemany("""
+            INSERT INTO inventory (book_id, total_copies, available_copies)
+            VALUES (%s, %s, %s)
+        """, [(bid, cfg["copies"], cfg["copies"]) for bid in book_ids])
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    return manager_id, customer_ids, book_ids
+
+
+def shard_books(book_ids, slots):
+    from database import get_db_connection
+    from inventory_shards import forget_sharded, set_slots
+
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    try:
+        for bid in book_ids:
+            set_slots(cur, bid, slots)
+        conn.commit()
+        forget_sharded()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def innodb_counters(db_name):
+    """(deadlocks, row lock waits) from the server; None where unavailable."""
+    conn = _server_connection(db_name)
+    cur = conn.cursor()
+    deadlocks = waits = None
+    try:
+        try:
+            cur.execute("""
+                SELECT `COUNT` FROM information_schema.INNODB_METRICS
+                WHERE NAME = 'lock_deadlocks'
+            """)
+            row = cur.fetchone()
+            deadlocks = int(row[0]) if row else None
+        except mysql.connector.Error:
+            pass
+        cur.execute("SHOW GLOBAL STATUS LIKE 'Innodb_row_lock_waits'")
+        row = cur.fetchone()
+        waits = int(row[1]) if row else None
+    finally:
+        cur.close()
+        conn.close()
+    return deadlocks, waits
+
+
+def check_invariants(db_name, copies):
+    """Return a list of violation messages (empty when all invariants hold)."""
+    conn = _server_connection(db_name)
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("""
+            SELECT b.id, i.shard_count,
+                   i.total_copies, i.available_copies,
+                   (SELECT SUM(s.total_copies) FROM inventory_shards s
+                    WHERE s.book_id = b.id) AS shard_total,
+                   (SELECT SUM(s.available_copies) FROM inventory_shards s
+                    WHERE s.book_id = b.id) AS shard_available,
+                   (SELECT COUNT(*) FROM rentals r
+                    WHERE r.book_id = b.id AND r.returned_at IS NULL) AS open_rentals,
+                   (SELECT COUNT(*) FROM order_items oi
+                    WHERE oi.book_id = b.id AND oi.type = 'buy') AS sold
+            FROM books b
+            JOIN inventory i ON i.book_id = b.id
+            ORDER BY b.id
+        """)
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+    problems = []
+    for r in rows:
+        sharded = r["shard_count"] > 0
+        total = int(r["shard_total"] if sharded else r["total_copies"])
+        available = int(r["shard_available"] if sharded else r["available_copies"])
+        open_rentals = int(r["open_rentals"])
+        sold = int(r["sold"])
+
+        if available < 0:
+            problems.append(f"book {r['id']}: available_copies = {available}")
+        if available + open_rentals != total:
+            problems.append(
+                f"book {r['id']}: available {available} + open rentals "
+                f"{open_rentals} != total {total}"
+            )
+        if copies - sold != total:
+            problems.append(
+                f"book {r['id']}: {copies} copies - {sold} sold != total {total}"
+            )
+    return problems
+
+
+# ============================================================
+# WORKLOAD
+# ============================================================
+
+class Stats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)      # op -> [seconds]
+        self.outcomes = defaultdict(lambda: defaultdict(int))
+        self.retries = defaultdict(int)
+
+    def add(self, op, outcome, seconds, retries):
+        with self.lock:
+            self.latency[op].append(seconds)
+            self.outcomes[op][outcome] += 1
+            self.retries[op] += retries
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Workload:
+
+    def __init__(self, app, cfg, manager_token, customer_tokens, book_ids, db_name):
+        self.app = app
+        self.cfg = cfg
+        self.manager_token = manager_token
+        self.customer_tokens = customer_tokens   # [(user_id, token)]
+        self.book_ids = book_ids
+        self.db_name = db_name
+        self.stats = Stats()
+
+        self.remaining = cfg["ops"]
+        self.remaining_lock = threading.Lock()
+        self.open_rentals = []
+        self.rentals_lock = threading.Lock()
+        self.key_seq = 0
+
+        s = cfg["skew"]
+        self.weights = [1.0 / (rank + 1) ** s for rank in range(len(book_ids))]
+
+    def _take_op(self):
+        with self.remaining_lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def _key(self):
+        with self.remaining_lock:
+            self.key_seq += 1
+            return f"bench-{os.getpid()}-{self.key_seq}"
+
+    def _pick_books(self, k):
+        return random.choices(self.book_ids, weights=self.weights, k=k)
+
+    def _call(self, op, send):
+        """Run `send()` with retries on 500; record latency and outcome."""
+        started = time.perf_counter()
+        retries = 0
+        while True:
+            resp = send()
+            if resp.status_code < 500 or retries == MAX_RETRIES:
+                break
+            retries += 1
+            time.sleep(0.01 * 2 ** retries)
+        elapsed = time.perf_counter() - started
+
+        if resp.status_code < 300:
+            outcome = "ok"
+        elif resp.status_code < 500:
+            outcome = "rejected"
+        else:
+            outcome = "error"
+        self.stats.add(op, outcome, elapsed, retries)
+        return resp
+
+    def _refill_rentals(self):
+        conn = _server_connection(self.db_name)
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id FROM rentals
+                WHERE returned_at IS NULL
+                ORDER BY RAND()
+                LIMIT 200
+            """)
+            return [r[0] for r in cur.fetchall()]
+        finally:
+            cur.close()
+            conn.close()
+
+    def place_order(self, client):
+        lo, hi = self.cfg["cart"]
+        items = [
+            {"book_id": bid,
+             "type": "buy" if random.random() < self.cfg["buy_ratio"] else "rent"}
+            for bid in self._pick_books(random.randint(lo, hi))
+        ]
+        _, token = random.choice(self.customer_tokens)
+        headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": self._key()}
+        self._call("order", lambda: client.post(
+            "/api/orders", json={"items": items}, headers=headers))
+
+    def manual_rental(self, client):
+        customer_id, _ = random.choice(self.customer_tokens)
+        body = {
+            "book_id": self._pick_books(1)[0],
+            "due_date": (datetime.now() + timedelta(days=14)).strftime("%Y-%m-%d")
+        }
+        headers = {"Authorization": f"Bearer {self.manager_token}",
+                   "Idempotency-Key": self._key()}
+        resp = self._call("manual_rental", lambda: client.post(
+            f"/api/manager/customers/{customer_id}/rentals", json=body, headers=headers))
+        if resp.status_code == 201:
+            with self.rentals_lock:
+                self.open_rentals.append(resp.get_json()["rental_id"])
+
+    def return_rental(self, client):
+        rental_id = None
+        with self.rentals_lock:
+            if not self.open_rentals:
+                self.open_rentals = self._refill_rentals()
+            if self.open_rentals:
+                rental_id = self.open_rentals.pop(random.randrange(len(self.open_rentals)))
+
+        # nothing to return: rent instead (manual_rental takes rentals_lock itself)
+        if rental_id is None:
+            return self.manual_rental(client)
+
+        headers = {"Authorization": f"Bearer {self.manager_token}"}
+        self._call("return", lambda: client.patch(
+            f"/api/manager/rentals/{rental_id}/return", headers=headers))
+
+    def worker(self):
+        client = self.app.test_client()
+        ops = (self.place_order, self.manual_rental, self.return_rental)
+        while self._take_op():
+            random.choices(ops, weights=self.cfg["mix"])[0](client)
+
+    def run(self):
+        threads = [threading.Thread(target=self.worker)
+                   for _ in range(self.cfg["workers"])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - started
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Checkout contention benchmark")
+    p.add_argument("--profile", default="hot", choices=sorted(PROFILES))
+    p.add_argument("--list-profiles", action="store_true")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--ops", type=int)
+    p.add_argument("--books", type=int)
+    p.add_argument("--copies", type=int)
+    p.add_argument("--cart-size", help="min-max items per order, e.g. 1-3")
+    p.add_argument("--skew", type=float, help="Zipf exponent over books (0 = uniform)")
+    p.add_argument("--mix", help="order,rental,return weights, e.g. 0.6,0.25,0.15")
+    p.add_argument("--buy-ratio", type=float)
+    p.add_argument("--shards", type=int, help="shard every book over N slots")
+    p.add_argument("--db", default=os.getenv("BENCH_MYSQL_DB", "online_bookstore_bench"))
+    p.add_argument("--seed", type=int)
+    return p.parse_args()
+
+
+def _config(args):
+    cfg = dict(PROFILES[args.profile])
+    for name in ("workers", "ops", "books", "copies", "skew", "buy_ratio", "shards"):
+        if getattr(args, name) is not None:
+            cfg[name] = getattr(args, name)
+    if args.cart_size:
+        lo, _, hi = args.cart_size.partition("-")
+        cfg["cart"] = (int(lo), int(hi or lo))
+    if args.mix:
+        cfg["mix"] = tuple(float(w) for w in args.mix.split(","))
+    return cfg
+
+
+def main():
+    args = _parse_args()
+    if args.list_profiles:
+        for name, cfg in sorted(PROFILES.items()):
+            print(f"{name:12} {cfg}")
+        return 0
+
+    if args.db == os.getenv("MYSQL_DB", "online_bookstore"):
+        print("Refusing to run: --db is the application database")
+        return 2
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    cfg = _config(args)
+    print(f"Profile {args.profile}: {cfg}")
+
+    manager_id, customer_ids, book_ids = build_database(
+        args.db, cfg, customers=max(cfg["workers"] * 2, 4))
+
+    # Point the app at the scratch database before it opens any connection
+    os.environ["MYSQL_DB"] = args.db
+    from app import create_app
+    from auth_middleware import create_token
+
+    if cfg["shards"]:
+        shard_books(book_ids, cfg["shards"])
+
+    app = create_app()
+    manager_token = create_token(manager_id, "bench_manager", "manager")
+    customer_tokens = [(uid, create_token(uid, f"bench_{uid}", "customer"))
+                       for uid in customer_ids]
+
+    deadlocks_before, waits_before = innodb_counters(args.db)
+    workload = Workload(app, cfg, manager_token, customer_tokens, book_ids, args.db)
+    elapsed = workload.run()
+    deadlocks_after, waits_after = innodb_counters(args.db)
+
+    stats = workload.stats
+    print()
+    print(f"{'op':15}{'calls':>8}{'ok':>8}{'rejected':>10}{'errors':>8}"
+          f"{'retries':>9}{'p50 ms':>9}{'p99 ms':>9}")
+    for op in ("order", "manual_rental", "return"):
+        lat = stats.latency.get(op, [])
+        out = stats.outcomes[op]
+        print(f"{op:15}{len(lat):>8}{out['ok']:>8}{out['rejected']:>10}"
+              f"{out['error']:>8}{stats.retries[op]:>9}"
+              f"{_percentile(lat, 50) * 1000:>9.1f}{_percentile(lat, 99) * 1000:>9.1f}")
+
+    orders_ok = stats.outcomes["order"]["ok"]
+    print()
+    print(f"wall time        {elapsed:.2f}s")
+    print(f"orders/s         {orders_ok / elapsed:.1f}  ({orders_ok} placed)")
+    print(f"operations/s     {sum(len(v) for v in stats.latency.values()) / elapsed:.1f}")
+    if deadlocks_before is not None and deadlocks_after is not None:
+        print(f"deadlocks        {deadlocks_after - deadlocks_before}")
+    if waits_before is not None and waits_after is not None:
+        print(f"row lock waits   {waits_after - waits_before}  (server-wide)")
+
+    problems = check_invariants(args.db, cfg["copies"])
+    print()
+    if problems:
+        print("INVARIANTS VIOLATED")
+        for p in problems:
+            print("  " + p)
+        return 1
+    print("Invariants hold: available >= 0, available + open rentals == total, "
+          "copies - sold == total")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# backend/book_cache.py
+"""
+Two-level cache for book detail records (book fields, availability and
+rating stats) used by the customer and manager detail endpoints.
+
+    L1  per-process LRU (query_cache.QueryCache), validated by the same
+        generation counters as the catalog query cache
+    L2  optional shared tier in Redis, enabled by BOOK_CACHE_REDIS_URL
+        (requires the `redis` package)
+
+Every write path already calls query_cache.bump() with ("book", id),
+("inventory", id) or ("reviews", id); this module listens for those bumps
+and INCRs the book's shared version counter (book:ver:<id>) in Redis.  L2
+entries carry the version that was current when their DB read started
+(read in get(), before the caller queries MySQL), and a lookup only accepts
+an entry whose version matches the counter, so a worker that read the row
+before another worker's write cannot publish its stale copy.  Other
+workers stop serving the record once their (short) L1 TTL expires.
+
+Lookups for ids that do not exist are cached too, for BOOK_CACHE_NEGATIVE_TTL
+seconds, so repeated 404s do not reach MySQL.
+"""
+import json
+import os
+import threading
+
+from flask import json as flask_json
+
+from query_cache import QueryCache, current_generation, on_bump
+
+try:
+    import redis
+except ImportError:  # shared tier is optional
+    redis = None
+
+_NOT_FOUND = {"__not_found__": True}
+
+
+def _depends_on(book_id):
+    return [("book", book_id), ("inventory", book_id), ("reviews", book_id)]
+
+
+class BookDetailCache:
+
+    def __init__(self):
+        self._versions = threading.local()   # L2 key -> version seen by get()
+        self.local = QueryCache(
+            "book_details",
+            max_entries=os.getenv("BOOK_CACHE_SIZE", 2048),
+            ttl_seconds=os.getenv("BOOK_CACHE_TTL", 60),
+        )
+        self.negative_ttl = float(os.getenv("BOOK_CACHE_NEGATIVE_TTL", 10))
+        self.shared_ttl = int(os.getenv("BOOK_CACHE_SHARED_TTL", 300))
+        self.shared_hits = 0
+        self.shared = None
+
+        url = os.getenv("BOOK_CACHE_REDIS_URL")
+        if url:
+            if redis is None:
+                print("[BOOK CACHE] BOOK_CACHE_REDIS_URL set but redis is not installed")
+            else:
+                self.shared = redis.Redis.from_url(url)
+
+        on_bump(self._on_bump)
+
+    @staticmethod
+    def _key(view, book_id):
+        return f"book:{view}:{book_id}"
+
+    @staticmethod
+    def _version_key(book_id):
+        return f"book:ver:{book_id}"
+
+    def _seen(self):
+        seen = getattr(self._versions, "seen", None)
+        if seen is None:
+            seen = self._versions.seen = {}
+        return seen
+
+    def get(self, view, book_id):
+        """
+        Return (hit, record).  On a hit `record` is None when the book is
+        known not to exist.
+        """
+        key = self._key(view, book_id)
+        generation = current_generation()
+
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            try:
+                raw_version, raw = self.shared.mget(self._version_key(book_id), key)
+                version = int(raw_version or 0)
+                self._seen()[key] = version
+            except Exception as e:
+                print("[BOOK CACHE SHARED ERROR]", e)
+                raw = None
+            entry = json.loads(raw) if raw is not None else None
+            if entry is not None and entry.get("v") == version:
+                self._seen().pop(key, None)
+                value = entry["value"]
+                self.shared_hits += 1
+                self.local.put(key, value, generation, _depends_on(book_id),
+                               ttl=self._ttl_for(value))
+
+        if value is None:
+            return False, None
+        return True, (None if value == _NOT_FOUND else value)
+
+    def put(self, view, book_id, record, generation):
+        """
+        Cache `record` (None for a missing book), read by a query started at
+        `generation`.  Must be called inside a request/app context, after a
+        get() for the same record on the same thread (which read the shared
+        version); without one the record is only cached locally.
+        """
+        key = self._key(view, book_id)
+        # Store what jsonify would emit so L1 and L2 hits look the same
+        value = _NOT_FOUND if record is None else json.loads(flask_json.dumps(record))
+        ttl = self._ttl_for(value)
+
+        self.local.put(key, value, generation, _depends_on(book_id), ttl=ttl)
+
+        version = self._seen().pop(key, None)
+        if self.shared is not None and version is not None:
+            shared_ttl = self.shared_ttl if ttl is None else max(int(ttl), 1)
+            try:
+                self.shared.set(key, json.dumps({"v": version, "value": value}),
+                                ex=shared_ttl)
+            except Exception as e:
+                print("[BOOK CACHE SHARED ERROR]", e)
+        return value
+
+    def _ttl_for(self, value):
+        return self.negative_ttl if value == _NOT_FOUND else None
+
+    def _on_bump(self, keys):
+        if self.shared is None:
+            return
+        book_ids = {
+            key[1]
+            for key in keys
+            if isinstance(key, tuple) and key[0] in ("book", "inventory", "reviews")
+        }
+        if book_ids:
+            # version counters never expire: if one vanished, entries written
+            # under its old values could become current again
+            pipe = self.shared.pipeline(transaction=False)
+            for book_id in book_ids:
+                pipe.incr(self._version_key(book_id))
+            pipe.execute()
+
+    def stats(self):
+        stats = self.local.stats()
+        stats["negative_ttl_seconds"] = self.negative_ttl
+        stats["shared_tier"] = self.shared is not None
+        stats["shared_hits"] = self.shared_hits
+        return stats
+
+
+book_details = BookDetailCache()
@@ -0,0 +1,148 @@
+# backend/book_stats.py
+"""
+Denormalized per-book rating aggregates (the book_stats table): rating sum,
+count and a 1–5 star histogram.
+
+record_review() is the only write path for reviews: it upserts the review and
+adjusts book_stats in the same transaction, so list and detail reads can use
+the stored values instead of aggregating reviews.
+
+Run as a script to rebuild book_stats from the reviews table (e.g. after
+manual edits or suspected drift):
+
+    python book_stats.py [chunk_size]
+"""
+import sys
+
+from database import get_db_connection
+
+# Select list fragment for the histogram; use with alias `bs`
+HISTOGRAM_COLUMNS = """
+    COALESCE(bs.rating_1, 0) AS rating_1,
+    COALESCE(bs.rating_2, 0) AS rating_2,
+    COALESCE(bs.rating_3, 0) AS rating_3,
+    COALESCE(bs.rating_4, 0) AS rating_4,
+    COALESCE(bs.rating_5, 0) AS rating_5
+"""
+
+
+def pop_histogram(row):
+    """Move rating_1..rating_5 out of `row` into {"1": n, ..., "5": n}."""
+    return {str(star): int(row.pop(f"rating_{star}") or 0) for star in range(1, 6)}
+
+
+def record_review(cur, user_id, book_id, rating, review_text):
+    """
+    Insert or replace a user's review and update book_stats.
+    `rating` must already be validated as an int in 1..5.
+    `cur` must be a dictionary cursor; the caller commits.
+    """
+    # Lock the existing review (if any) so concurrent re-ratings by the same
+    # user cannot both apply a delta computed from the same old rating.
+    cur.execute("""
+        SELECT rating
+        FROM reviews
+        WHERE user_id = %s AND book_id = %s
+        FOR UPDATE
+    """, (user_id, book_id))
+    old = cur.fetchone()
+
+    cur.execute("""
+        INSERT INTO reviews (user_id, book_id, rating, review_text)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            rating = VALUES(rating),
+            review_text = VALUES(review_text)
+    """, (user_id, book_id, rating, review_text))
+
+    new_col = f"rating_{int(rating)}"
+    histogram = [f"{new_col} = {new_col} + 1"]
+
+    if old is None:
+        sum_delta, count_delta = rating, 1
+    else:
+        old_rating = int(old["rating"])
+        sum_delta, count_delta = rating - old_rating, 0
+        if old_rating == rating:
+            histogram = []
+        else:
+            old_col = f"rating_{old_rating}"
+            histogram.append(f"{old_col} = {old_col} - 1")
+
+    histogram_clause = "".join(f",\n            {h}" for h in histogram)
+    cur.execute(f"""
+        INSERT INTO book_stats (book_id, rating_sum, rating_count, {new_col})
+        VALUES (%s, %s, %s, 1)
+        ON DUPLICATE KEY UPDATE
+            rating_sum = rating_sum + VALUES(rating_sum),
+            rating_count = rating_count + VALUES(rating_count){histogram_clause}
+    """, (book_id, sum_delta, count_delta))
+
+
+def rebuild_book_stats(chunk_size=1000):
+    """
+    Recompute book_stats from reviews, walking books in id order one chunk
+    per transaction.  Returns the number of books processed.
+    """
+    conn = None
+    cur = None
+    processed = 0
+    last_id = 0
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(dictionary=True)
+
+        while True:
+            cur.execute("""
+                SELECT id FROM books
+                WHERE id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, chunk_size))
+            ids = [r["id"] for r in cur.fetchall()]
+            if not ids:
+                break
+
+            cur.execute("""
+                INSERT INTO book_stats (book_id, rating_sum, rating_count,
+                                        rating_1, rating_2, rating_3,
+                                        rating_4, rating_5)
+                SELECT b.id, COALESCE(SUM(r.rating), 0), COUNT(r.id),
+                       COALESCE(SUM(r.rating = 1), 0),
+                       COALESCE(SUM(r.rating = 2), 0),
+                       COALESCE(SUM(r.rating = 3), 0),
+                       COALESCE(SUM(r.rating = 4), 0),
+                       COALESCE(SUM(r.rating = 5), 0)
+                FROM books b
+                LEFT JOIN reviews r ON r.book_id = b.id
+                WHERE b.id BETWEEN %s AND %s
+                GROUP BY b.id
+                ON DUPLICATE KEY UPDATE
+                    rating_sum = VALUES(rating_sum),
+                    rating_count = VALUES(rating_count),
+                    rating_1 = VALUES(rating_1),
+                    rating_2 = VALUES(rating_2),
+                    rating_3 = VALUES(rating_3),
+                    rating_4 = VALUES(rating_4),
+                    rating_5 = VALUES(rating_5)
+            """, (ids[0], ids[-1]))
+            conn.commit()
+
+            processed += len(ids)
+            last_id = ids[-1]
+
+        return processed
+
+    except Exception:
+        if conn: conn.rollback()
+        raise
+
+    finally:
+        if cur: cur.close()
+        if conn: conn.close()
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    count = rebuild_book_stats(size)
+    print(f"Rebuilt rating aggregates for {count} books")
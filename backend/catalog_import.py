@@ -0,0 +1,352 @@
+# backend/catalog_import.py
+"""
+Bulk catalog import from CSV or NDJSON.
+
+Records are parsed as a stream (never the whole file in memory), validated,
+and loaded in batches of BATCH records.  Each batch is one transaction:
+
+    1. one multi-row INSERT of the batch into a temporary table whose
+       title/author columns are copied from books (same collation)
+    2. one grouped query picking the first record of every (title, author)
+       that is neither repeated earlier in the batch nor already in books
+       (idx_books_title_author)
+    3. one INSERT ... SELECT into books, one multi-row INSERT into
+       inventory, and one ledger append of 'import' movements
+    4. commit, then write the checkpoint
+
+Fields: title, author, price_buy, price_rent (required); genre,
+publication_year, copies (default DEFAULT_COPIES) optional.  Duplicates are
+decided by MySQL with the books columns' collation (case- and
+accent-insensitive by default, so "Cafe" matches "Café"), the same rule
+as any catalog lookup, so rerunning an import never duplicates books; the
+checkpoint just skips the records that were already committed.
+
+Cache invalidation: like manager_add_book, each committed batch bumps
+"books" and ("book", id) for every new id (dropping cached "not found"
+details too), which only reaches the process doing the import.  After a
+CLI import, running API servers show the new books once their cache
+entries expire (QUERY_CACHE_TTL, 30s by default; BOOK_CACHE_NEGATIVE_TTL
+for a cached "not found"); rebuild the catalog snapshot too if one is
+configured.
+
+    python catalog_import.py catalog.csv [--format ndjson] [--batch 2000]
+                                         [--checkpoint FILE] [--copies 10]
+
+The checkpoint defaults to <file>.ckpt and is removed when the import
+finishes; rerun the same command after an interruption to resume.
+"""
+import argparse
+import codecs
+import csv
+import gzip
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from database import get_db_connection
+from inventory_ledger import append, movement
+from query_cache import bump
+
+BATCH = 2000
+DEFAULT_COPIES = 10
+READ_SIZE = 64 * 1024
+MAX_ERRORS = 100
+MAX_PRICE = Decimal("999999.99")    # DECIMAL(8,2)
+
+
+# ============================================================
+# PARSING
+# ============================================================
+
+def _lines(binary):
+    """Decoded lines (with their "\\n") from a binary stream, read in blocks."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    while True:
+        block = binary.read(READ_SIZE)
+        pending += decoder.decode(block or b"", final=not block)
+        parts = pending.split("\n")
+        pending = parts.pop()
+        for part in parts:
+            yield part + "\n"
+        if not block:
+            break
+    if pending:
+        yield pending
+
+
+def parse_records(binary, fmt="csv"):
+    """
+    Yield (record_no, fields) from a binary stream, record_no from 1.
+    fields is a dict, or None when the record could not be parsed.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(_lines(binary))
+        for n, row in enumerate(reader, start=1):
+            yield n, row
+    elif fmt == "ndjson":
+        n = 0
+        for line in _lines(binary):
+            if not line.strip():
+                continue
+            n += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield n, row if isinstance(row, dict) else None
+    else:
+        raise ValueError("format must be 'csv' or 'ndjson'")
+
+
+def _text(fields, key, limit, required=False):
+    value = fields.get(key)
+    value = "" if value is None else str(value).strip()
+    if not value:
+        if required:
+            raise ValueError(f"{key} is required")
+        return None
+    if len(value) > limit:
+        raise ValueError(f"{key} is longer than {limit} characters")
+    return value
+
+
+def _price(fields, key):
+    try:
+        value = Decimal(str(fields.get(key)).strip())
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"{key} must be a number")
+    if not value.is_finite() or value < 0 or value > MAX_PRICE:
+        raise ValueError(f"{key} must be between 0 and {MAX_PRICE}")
+    return value.quantize(Decimal("0.01"))
+
+
+def _int(fields, key, lo, hi, default=None):
+    value = fields.get(key)
+    if value is None or str(value).strip() == "":
+        return default
+    try:
+        value = int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{key} must be an integer")
+    if not lo <= value <= hi:
+        raise ValueError(f"{key} must be between {lo} and {hi}")
+    return value
+
+
+def validate(fields, copies=DEFAULT_COPIES):
+    """(title, author, price_buy, price_rent, genre, year, copies); raises ValueError."""
+    if fields is None:
+        raise ValueError("unparseable record")
+    return (
+        _text(fields, "title", 255, required=True),
+        _text(fields, "author", 255, required=True),
+        _price(fields, "price_buy"),
+        _price(fields, "price_rent"),
+        _text(fields, "genre", 100),
+        _int(fields, "publication_year", 0, 32767),
+        _int(fields, "copies", 0, 1000000, default=copies)
+    )
+
+
+# ============================================================
+# LOADING
+# ============================================================
+
+def create_batch_table(cur):
+    """
+    Per-connection scratch table with the books columns' types.  Created
+    outside any transaction (CREATE TEMPORARY TABLE is not allowed inside
+    one on some GTID setups).
+    """
+    cur.execute("""
+        CREATE TEMPORARY TABLE IF NOT EXISTS import_batch (
+            seq    INT UNSIGNED PRIMARY KEY,
+            copies INT UNSIGNED NOT NULL
+        )
+        SELECT title, author, price_buy, price_rent, genre, publication_year
+        FROM books
+        LIMIT 0
+    """)
+
+
+def load_batch(cur, books, actor_id=None):
+    """
+    Insert the books of one batch that are not in the catalog yet.
+    `books` are (record_no, validate() tuple) pairs; returns the ids of the
+    inserted books.  Runs inside the caller's transaction; the connection
+    must have run create_batch_table().
+    """
+    cur.execute("DELETE FROM import_batch")
+    cur.execute(f"""
+        INSERT INTO import_batch
+            (seq, title, author, price_buy, price_rent, genre, publication_year, copies)
+        VALUES {",".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(books))}
+    """, [v for record_no, b in books for v in (record_no,) + b])
+
+    # GROUP BY and the join compare with the column collation
+    cur.execute("""
+        SELECT MIN(t.seq) AS seq
+        FROM import_batch t
+        WHERE NOT EXISTS (
+            SELECT 1 FROM books b
+            WHERE b.title = t.title AND b.author = t.author
+        )
+        GROUP BY t.title, t.author
+        ORDER BY seq
+    """)
+    new = [r[0] for r in cur.fetchall()]
+    if not new:
+        return []
+    in_new = ",".join(["%s"] * len(new))
+
+    cur.execute(f"""
+        INSERT INTO books (title, author, price_buy, price_rent, genre, publication_year)
+        SELECT title, author, price_buy, price_rent, genre, publication_year
+        FROM import_batch
+        WHERE seq IN ({in_new})
+        ORDER BY seq
+    """, new)
+    first_id = cur.lastrowid
+
+    # ids are read back by key: consecutive ids are not guaranteed under
+    # every innodb_autoinc_lock_mode
+    cur.execute(f"""
+        SELECT b.id, t.copies
+        FROM import_batch t
+        JOIN books b ON b.title = t.title AND b.author = t.author
+        WHERE t.seq IN ({in_new}) AND b.id >= %s
+    """, new + [first_id])
+    stock = cur.fetchall()
+
+    cur.execute(f"""
+        INSERT INTO inventory (book_id, total_copies, available_copies)
+        VALUES {",".join(["(%s, %s, %s)"] * len(stock))}
+    """, [v for book_id, copies in stock for v in (book_id, copies, copies)])
+    append(cur, [movement(book_id, "import", copies, copies, "book", book_id, actor_id)
+                 for book_id, copies in stock])
+    return [book_id for book_id, copies in stock]
+
+
+def run_import(conn, records, batch=BATCH, copies=DEFAULT_COPIES, skip=0,
+               actor_id=None, on_batch=None):
+    """
+    Import (record_no, fields) pairs, committing every `batch` records.
+    Records numbered <= skip are ignored (resume).  on_batch(summary) is
+    called after each commit.  Returns the summary dict; summary["last_record"]
+    is the last record covered by a commit.
+    """
+    summary = {"records": 0, "inserted": 0, "duplicates": 0, "invalid": 0,
+               "errors": [], "last_record": skip}
+    cur = conn.cursor()
+    create_batch_table(cur)
+    conn.commit()
+    pending = []
+    last_no = skip
+
+    def flush():
+        books = pending[:]
+        pending.clear()
+        new_ids = load_batch(cur, books, actor_id) if books else []
+        conn.commit()
+        if new_ids:
+            # ("book", id) too: a cached "not found" for the id must go
+            bump("books", *[("book", book_id) for book_id in new_ids])
+        summary["inserted"] += len(new_ids)
+        summary["duplicates"] += len(books) - len(new_ids)
+        summary["last_record"] = last_no
+        if on_batch:
+            on_batch(summary)
+
+    try:
+        for record_no, fields in records:
+            if record_no <= skip:
+                continue
+            last_no = record_no
+            summary["records"] += 1
+            try:
+                book = validate(fields, copies)
+            except ValueError as e:
+                summary["invalid"] += 1
+                if len(summary["errors"]) < MAX_ERRORS:
+                    summary["errors"].append({"record": record_no, "error": str(e)})
+                continue
+
+            pending.append((record_no, book))
+
+            if summary["records"] % batch == 0:
+                flush()
+
+        flush()
+        return summary
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def _save_checkpoint(path, source, summary):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"source": os.path.abspath(source),
+                   "last_record": summary["last_record"]}, f)
+    os.replace(tmp, path)
+
+
+def _open(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Bulk import books from CSV/NDJSON")
+    p.add_argument("file")
+    p.add_argument("--format", choices=("csv", "ndjson"),
+                   help="default: from the file extension")
+    p.add_argument("--batch", type=int, default=BATCH)
+    p.add_argument("--copies", type=int, default=DEFAULT_COPIES,
+                   help="copies for records without a copies field")
+    p.add_argument("--checkpoint", help="default: <file>.ckpt")
+    args = p.parse_args()
+
+    fmt = args.format or ("ndjson" if ".ndjson" in args.file or ".jsonl" in args.file else "csv")
+    ckpt = args.checkpoint or args.file + ".ckpt"
+
+    skip = 0
+    if os.path.exists(ckpt):
+        with open(ckpt) as f:
+            state = json.load(f)
+        if state.get("source") != os.path.abspath(args.file):
+            raise SystemExit(f"{ckpt} belongs to {state.get('source')}")
+        skip = int(state["last_record"])
+        print(f"Resuming after record {skip}")
+
+    started = time.monotonic()
+
+    def report(summary):
+        _save_checkpoint(ckpt, args.file, summary)
+        elapsed = time.monotonic() - started
+        rate = summary["records"] / elapsed if elapsed else 0
+        print(f"record {summary['last_record']}: {summary['inserted']} inserted, "
+              f"{summary['duplicates']} duplicates, {summary['invalid']} invalid "
+              f"({rate:,.0f} records/s)", flush=True)
+
+    conn = get_db_connection()
+    try:
+        with _open(args.file) as f:
+            summary = run_import(conn, parse_records(f, fmt), batch=args.batch,
+                                 copies=args.copies, skip=skip, on_batch=report)
+    finally:
+        conn.close()
+
+    for e in summary["errors"]:
+        print(f"record {e['record']}: {e['error']}")
+    if summary["invalid"] > len(summary["errors"]):
+        print(f"... {summary['invalid'] - len(summary['errors'])} more invalid records")
+    os.remove(ckpt)
+    print(f"Done in {time.monotonic() - started:.1f}s: {summary['inserted']} books imported")
@@ -0,0 +1,387 @@
+# backend/catalog_snapshot.py
+"""
+Compact binary catalog snapshot shared by all worker processes.
+
+A builder job writes the catalog (books, inventory counts, rating totals and
+word postings for search) into a single file made of fixed-width columns plus
+a string heap.  Workers mmap the file read-only, so every process shares the
+same pages and startup does not need to rebuild anything.
+
+Layout (little endian, every section 8-byte aligned):
+
+    header      MAGIC, version, book_count, token_count, section offsets
+    ids         uint32[book_count]      sorted ascending
+    price_buy   int32[book_count]       cents
+    price_rent  int32[book_count]       cents
+    year        int32[book_count]       -1 when NULL
+    total       int32[book_count]
+    available   int32[book_count]
+    rating_sum  uint32[book_count]
+    rating_cnt  uint32[book_count]
+    title_off   uint32[book_count + 1]  offsets into the heap
+    author_off  uint32[book_count + 1]
+    genre_off   uint32[book_count + 1]  empty string when NULL
+    token_off   uint32[token_count + 1] sorted, lowercased word tokens
+    post_off    uint32[token_count + 1] offsets into postings
+    postings    uint32[...]             row indexes, ascending per token
+    heap        utf-8 bytes
+
+Run as a script to (re)build the snapshot:
+
+    python catalog_snapshot.py [path]
+
+The file is written next to its final location and moved into place with
+os.replace(), so readers always see either the old or the new snapshot.
+Workers pick up a new file on the next get_snapshot() call.
+
+Nothing rebuilds the snapshot on writes, so run the builder on a schedule
+(e.g. cron every few minutes) and after bulk imports or repricing.  Search
+only uses it to choose and order the matching books: stock and prices in
+the response are read live for the returned page, so between rebuilds the
+staleness is limited to books added (missing) or with edited title,
+author, genre or year, and to ordering by price.
+"""
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from bisect import bisect_left
+
+MAGIC = b"BKSNAP01"
+VERSION = 1
+
+# magic, version, book_count, token_count, 15 section offsets
+_HEADER = struct.Struct("<8sIII15Q")
+_SECTIONS = (
+    "ids", "price_buy", "price_rent", "year", "total", "available",
+    "rating_sum", "rating_cnt", "title_off", "author_off", "genre_off",
+    "token_off", "post_off", "postings", "heap",
+)
+_COLUMN_TYPES = {
+    "ids": "I", "price_buy": "i", "price_rent": "i", "year": "i",
+    "total": "i", "available": "i", "rating_sum": "I", "rating_cnt": "I",
+    "title_off": "I", "author_off": "I", "genre_off": "I",
+    "token_off": "I", "post_off": "I", "postings": "I",
+}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SORT_COLUMNS = (
+    "title", "author", "genre", "publication_year", "price_buy", "price_rent"
+)
+
+
+def default_snapshot_path():
+    """Path from CATALOG_SNAPSHOT_PATH, or None when snapshots are disabled."""
+    return os.getenv("CATALOG_SNAPSHOT_PATH") or None
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+# ============================================================
+# BUILDER
+# ============================================================
+
+def _cents(value):
+    return int(round(float(value or 0) * 100))
+
+
+def _align(buf):
+    buf.extend(b"\0" * (-len(buf) % 8))
+
+
+def write_snapshot(rows, path):
+    """
+    Serialize `rows` (dicts with id, title, author, genre, publication_year,
+    price_buy, price_rent, total_copies, available_copies, rating_sum,
+    rating_count) to `path` atomically.
+    """
+    rows = sorted(rows, key=lambda r: r["id"])
+    n = len(rows)
+
+    heap = bytearray()
+
+    def put(text):
+        heap.extend((text or "").encode("utf-8"))
+        return len(heap)
+
+    def put_column(field):
+        offsets = [len(heap)]
+        for r in rows:
+            offsets.append(put(r.get(field)))
+        return offsets
+
+    title_off = put_column("title")
+    author_off = put_column("author")
+    genre_off = put_column("genre")
+
+    postings_by_token = {}
+    for idx, r in enumerate(rows):
+        for tok in set(tokenize(r["title"]) + tokenize(r["author"])):
+            postings_by_token.setdefault(tok, []).append(idx)
+
+    tokens = sorted(postings_by_token)
+    token_off = [len(heap)]
+    post_off = [0]
+    postings = []
+    for tok in tokens:
+        token_off.append(put(tok))
+        postings.extend(postings_by_token[tok])
+        post_off.append(len(postings))
+
+    columns = {
+        "ids": [r["id"] for r in rows],
+        "price_buy": [_cents(r["price_buy"]) for r in rows],
+        "price_rent": [_cents(r["price_rent"]) for r in rows],
+        "year": [
+            -1 if r.get("publication_year") is None else int(r["publication_year"])
+            for r in rows
+        ],
+        "total": [int(r.get("total_copies") or 0) for r in rows],
+        "available": [int(r.get("available_copies") or 0) for r in rows],
+        "rating_sum": [int(r.get("rating_sum") or 0) for r in rows],
+        "rating_cnt": [int(r.get("rating_count") or 0) for r in rows],
+        "title_off": title_off,
+        "author_off": author_off,
+        "genre_off": genre_off,
+        "token_off": token_off,
+        "post_off": post_off,
+        "postings": postings,
+    }
+
+    body = bytearray()
+    offsets = []
+    for name in _SECTIONS:
+        _align(body)
+        offsets.append(_HEADER.size + len(body))
+        if name == "heap":
+            body.extend(heap)
+        else:
+            values = columns[name]
+            body.extend(struct.pack(f"<{len(values)}{_COLUMN_TYPES[name]}", *values))
+
+    header = _HEADER.pack(MAGIC, VERSION, n, len(tokens), *offsets)
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return n
+
+
+def build_snapshot(path):
+    """Read books, inventory and book_stats from MySQL and write a snapshot."""
+    from database import get_db_connection
+
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT b.id, b.title, b.author, b.genre, b.publication_year,
+                   b.price_buy, b.price_rent,
+                   COALESCE(inv.total_copies, 0) AS total_copies,
+                   COALESCE(inv.available_copies, 0) AS available_copies,
+                   COALESCE(bs.rating_sum, 0) AS rating_sum,
+                   COALESCE(bs.rating_count, 0) AS rating_count
+            FROM books b
+            LEFT JOIN inventory inv ON inv.book_id = b.id
+            LEFT JOIN book_stats bs ON bs.book_id = b.id
+        """)
+        rows = cur.fetchall()
+    finally:
+        if cur: cur.close()
+        if conn: conn.close()
+
+    return write_snapshot(rows, path)
+
+
+# ============================================================
+# READER
+# ============================================================
+
+class CatalogSnapshot:
+    """Read-only, zero-copy view over a snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n, token_count, *offsets = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a catalog snapshot (v{VERSION})")
+
+        self.book_count = n
+        self.token_count = token_count
+        view = memoryview(self._mm)
+        lengths = {
+            "title_off": n + 1, "author_off": n + 1, "genre_off": n + 1,
+            "token_off": token_count + 1, "post_off": token_count + 1,
+        }
+        bounds = offsets + [len(self._mm)]
+        for i, name in enumerate(_SECTIONS):
+            start = offsets[i]
+            if name == "heap":
+                self.heap = view[start:bounds[i + 1]]
+                continue
+            if name == "postings":
+                count = self.post_off[token_count]
+            else:
+                count = lengths.get(name, n)
+            end = start + count * struct.calcsize(_COLUMN_TYPES[name])
+            setattr(self, name, view[start:end].cast(_COLUMN_TYPES[name]))
+
+    def __len__(self):
+        return self.book_count
+
+    def _string(self, offsets, i):
+        return bytes(self.heap[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def _token(self, i):
+        return self._string(self.token_off, i)
+
+    def row(self, i):
+        year = self.year[i]
+        genre = self._string(self.genre_off, i)
+        return {
+            "id": self.ids[i],
+            "title": self._string(self.title_off, i),
+            "author": self._string(self.author_off, i),
+            "genre": genre or None,
+            "publication_year": None if year < 0 else year,
+            "price_buy": f"{self.price_buy[i] / 100:.2f}",
+            "price_rent": f"{self.price_rent[i] / 100:.2f}",
+            "total_copies": self.total[i],
+            "available_copies": self.available[i],
+            "rating_sum": self.rating_sum[i],
+            "rating_count": self.rating_cnt[i],
+        }
+
+    def index_of(self, book_id):
+        i = bisect_left(self.ids, book_id)
+        if i < self.book_count and self.ids[i] == book_id:
+            return i
+        return None
+
+    def get(self, book_id):
+        i = self.index_of(book_id)
+        return None if i is None else self.row(i)
+
+    def _rows_for_prefix(self, prefix):
+        """Union of postings for every token starting with `prefix`."""
+        lo, hi = 0, self.token_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._token(mid) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = set()
+        i = lo
+        while i < self.token_count and self._token(i).startswith(prefix):
+            found.update(self.postings[self.post_off[i]:self.post_off[i + 1]])
+            i += 1
+        return found
+
+    def search(self, q="", genre="", year="", sort_by="title",
+               direction="asc", limit=200):
+        """
+        Same filters as GET /api/books.  Keyword terms match word prefixes in
+        the title or author (every term must match).
+        """
+        candidates = None
+        for term in tokenize(q):
+            hits = self._rows_for_prefix(term)
+            candidates = hits if candidates is None else candidates & hits
+            if not candidates:
+                return []
+        if candidates is None:
+            candidates = range(self.book_count)
+
+        genre = (genre or "").lower()
+        year = int(year) if str(year or "").strip().lstrip("-").isdigit() else None
+
+        rows = []
+        for i in candidates:
+            if year is not None and self.year[i] != year:
+                continue
+            if genre and genre not in self._string(self.genre_off, i).lower():
+                continue
+            rows.append(i)
+
+        if sort_by not in SORT_COLUMNS:
+            sort_by = "title"
+        key = {
+            "title": lambda i: self._string(self.title_off, i).lower(),
+            "author": lambda i: self._string(self.author_off, i).lower(),
+            "genre": lambda i: self._string(self.genre_off, i).lower(),
+            "publication_year": lambda i: self.year[i],
+            "price_buy": lambda i: self.price_buy[i],
+            "price_rent": lambda i: self.price_rent[i],
+        }[sort_by]
+        rows.sort(key=key, reverse=(direction == "desc"))
+
+        return [self.row(i) for i in rows[:limit]]
+
+
+# ============================================================
+# PER-PROCESS HANDLE (atomic swap on refresh)
+# ============================================================
+
+_lock = threading.Lock()
+_current = None
+
+
+def get_snapshot(path=None):
+    """
+    Return the mapped snapshot for this process, remapping when the file on
+    disk has been replaced.  Returns None when snapshots are disabled or the
+    file does not exist yet.
+    """
+    global _current
+    path = path or default_snapshot_path()
+    if not path:
+        return None
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    snap = _current
+    identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if snap is not None and snap.path == path and snap.identity == identity:
+        return snap
+
+    with _lock:
+        snap = _current
+        if snap is None or snap.path != path or snap.identity != identity:
+            try:
+                snap = CatalogSnapshot(path)
+            except (OSError, ValueError) as e:
+                print("[CATALOG SNAPSHOT ERROR]", e)
+                return _current
+            # Old mapping is released once in-flight readers drop it.
+            _current = snap
+    return snap
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else default_snapshot_path()
+    if not target:
+        print("usage: python catalog_snapshot.py <path>  (or set CATALOG_SNAPSHOT_PATH)")
+        sys.exit(1)
+    count = build_snapshot(target)
+    print(f"Wrote catalog snapshot with {count} books to {target}")
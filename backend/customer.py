@@ -1,16 +1,73 @@
 # backend/customer.py
 from flask import request, jsonify
 from database import get_db_connection
-from datetime import datetime, timedelta
 from auth_middleware import require_customer, get_current_user_id
+from catalog_snapshot import get_snapshot
+from query_cache import catalog_queries, current_generation, bump_books
+from book_stats import record_review, HISTOGRAM_COLUMNS, pop_histogram
+from reviews import fetch_review_page, parse_page_size, review_total
+from book_cache import book_details
+from orders import place_order_tx, check_cart, quote_cart, OrderError
+import order_queue
+from idempotency import (
+    request_key, fingerprint, claim, record, replay, maybe_sweep, IdempotencyError
+)
 
 
 def init_customer_routes(app):
 
+    if order_queue.ASYNC_INTAKE:
+        order_queue.start_workers()
+
     # ============================================================
     # 1. UNIFIED BOOK SEARCH
     # ============================================================
 
+    def _live_stock_and_prices(book_ids):
+        """
+        {book_id: {price_buy, price_rent, available_copies}} from one query
+        over a page of ids (cached until those books are written).
+        Books deleted since the snapshot was built are left out.
+        """
+        if not book_ids:
+            return {}
+        cache_key = ("books_live", tuple(book_ids))
+        cached = catalog_queries.get(cache_key)
+        if cached is not None:
+            return cached
+        generation = current_generation()
+
+        conn = None
+        cur = None
+        try:
+            conn = get_db_connection()
+            cur = conn.cursor(dictionary=True)
+            cur.execute(f"""
+                SELECT b.id, b.price_buy, b.price_rent,
+                       COALESCE(inv.available_copies, 0) AS available_copies
+                FROM books b
+                LEFT JOIN inventory inv ON inv.book_id = b.id
+                WHERE b.id IN ({",".join(["%s"] * len(book_ids))})
+            """, list(book_ids))
+            # prices stay Decimal, serialized exactly like the DB path's rows
+            live = {
+                r["id"]: {
+                    "price_buy": r["price_buy"],
+                    "price_rent": r["price_rent"],
+                    "available_copies": int(r["available_copies"])
+                }
+                for r in cur.fetchall()
+            }
+        finally:
+            if cur: cur.close()
+            if conn: conn.close()
+
+        catalog_queries.put(
+            cache_key, live, generation,
+            [d for b in book_ids for d in (("book", b), ("inventory", b))]
+        )
+        return live
+
     @app.route("/api/books", methods=["GET"])
     @require_customer
     def search_books():
@@ -34,6 +91,33 @@ def init_customer_routes(app):
         if direction not in ("asc", "desc"):
             direction = "asc"
 
+        # Serve from the shared mmap snapshot when one is configured.  The
+        # snapshot decides which books match and their order; stock and
+        # prices are overlaid from the live tables, since the file is only
+        # rebuilt on a schedule (see catalog_snapshot.py)
+        snap = get_snapshot()
+        if snap is not None:
+            rows = snap.search(q, genre, year, sort_by, direction, limit=200)
+            try:
+                live = _live_stock_and_prices([r["id"] for r in rows])
+            except Exception as e:
+                print("[BOOK SEARCH ERROR]", e)
+                return jsonify({"error": "Error searching books"}), 500
+            return jsonify([{
+                "id": r["id"],
+                "title": r["title"],
+                "author": r["author"],
+                "genre": r["genre"],
+                "publication_year": r["publication_year"],
+                **live[r["id"]],
+            } for r in rows if r["id"] in live]), 200
+
+        cache_key = ("books", q.lower(), genre.lower(), year, sort_by, direction)
+        cached = catalog_queries.get(cache_key)
+        if cached is not None:
+            return jsonify(cached), 200
+        generation = current_generation()
+
         conn = None
         cur = None
 
@@ -75,6 +159,11 @@ def init_customer_routes(app):
 
             cur.execute(base, params)
             rows = cur.fetchall()
+
+            catalog_queries.put(
+                cache_key, rows, generation,
+                ["books"] + [("inventory", r["id"]) for r in rows]
+            )
             return jsonify(rows), 200
 
         except Exception as e:
@@ -94,10 +183,11 @@ def init_customer_routes(app):
     def get_book_details(book_id):
         """
         Returns:
-            - core book data
+            - core book data + availability
             - avg rating
             - review count
             - user's own review (if user_id provided)
+        Book data is served from the book detail cache when possible.
         """
         user_id = request.args.get("user_id")
 
@@ -105,32 +195,39 @@ def init_customer_routes(app):
         cur = None
 
         try:
-            conn = get_db_connection()
-            cur = conn.cursor(dictionary=True)
+            hit, book = book_details.get("customer", book_id)
 
-            # Book base info
-            cur.execute("""
-                SELECT id, title, author, genre, publication_year,
-                       price_buy, price_rent
-                FROM books
-                WHERE id = %s
-            """, (book_id,))
-            book = cur.fetchone()
+            if not hit or user_id:
+                conn = get_db_connection()
+                cur = conn.cursor(dictionary=True)
 
-            if not book:
-                return jsonify({"error": "Book not found"}), 404
+            if not hit:
+                generation = current_generation()
 
-            # Average rating + count (rounded to 1 decimal place)
-            cur.execute("""
-                SELECT ROUND(AVG(rating), 1) AS avg_rating,
-                       COUNT(*) AS review_count
-                FROM reviews
-                WHERE book_id = %s
-            """, (book_id,))
-            stats = cur.fetchone()
+                # Book base info + availability + stored rating aggregates
+                cur.execute("""
+                    SELECT b.id, b.title, b.author, b.genre, b.publication_year,
+                           b.price_buy, b.price_rent,
+                           COALESCE(inv.available_copies, 0) AS available_copies,
+                           bs.avg_rating,
+                           COALESCE(bs.rating_count, 0) AS review_count
+                    FROM books b
+                    LEFT JOIN inventory inv ON inv.book_id = b.id
+                    LEFT JOIN book_stats bs ON bs.book_id = b.id
+                    WHERE b.id = %s
+                """, (book_id,))
+                book = cur.fetchone()
+
+                if book:
+                    book["avg_rating"] = float(book["avg_rating"]) if book["avg_rating"] else None
+                    book["review_count"] = int(book["review_count"])
+
+                book = book_details.put("customer", book_id, book, generation)
+
+            if book is None:
+                return jsonify({"error": "Book not found"}), 404
 
-            book["avg_rating"] = float(stats["avg_rating"]) if stats["avg_rating"] else None
-            book["review_count"] = stats["review_count"]
+            book = dict(book)
 
             # User's review (if user_id given)
             if user_id:
@@ -154,19 +251,108 @@ def init_customer_routes(app):
             if conn: conn.close()
 
     # ============================================================
-    # 3. PLACE ORDER (auto-rentals)
+    # 2b. BOOK PAGE (details + own review + first reviews page)
     # ============================================================
 
-    @app.route("/api/orders", methods=["POST"])
+    @app.route("/api/books/<int:book_id>/page", methods=["GET"])
     @require_customer
-    def place_order():
-        data = request.get_json(silent=True) or {}
-        # Get user_id from authenticated token, not from request
+    def get_book_page(book_id):
+        """
+        Everything the book popup needs in one round trip:
+            - core book data + live availability
+            - avg rating / review count / star histogram (book_stats)
+            - caller's own review
+            - first page of reviews (newest first)
+        Query params: limit (default 20, max 100)
+        """
         user_id = get_current_user_id()
-        items = data.get("items", [])
+        limit = parse_page_size(request.args.get("limit"))
 
-        if not items:
-            return jsonify({"error": "Missing items"}), 400
+        conn = None
+        cur = None
+
+        try:
+            conn = get_db_connection()
+            cur = conn.cursor(dictionary=True)
+
+            cur.execute(f"""
+                SELECT b.id, b.title, b.author, b.genre, b.publication_year,
+                       b.price_buy, b.price_rent,
+                       COALESCE(inv.available_copies, 0) AS available_copies,
+                       bs.avg_rating,
+                       COALESCE(bs.rating_count, 0) AS review_count,
+                       {HISTOGRAM_COLUMNS},
+                       own.rating AS own_rating,
+                       own.review_text AS own_review_text
+                FROM books b
+                LEFT JOIN inventory inv ON inv.book_id = b.id
+                LEFT JOIN book_stats bs ON bs.book_id = b.id
+                LEFT JOIN reviews own
+                       ON own.book_id = b.id AND own.user_id = %s
+                WHERE b.id = %s
+            """, (user_id, book_id))
+            book = cur.fetchone()
+
+            if not book:
+                return jsonify({"error": "Book not found"}), 404
+
+            own_rating = book.pop("own_rating")
+            own_text = book.pop("own_review_text")
+            book["user_review"] = (
+                {"rating": int(own_rating), "review_text": own_text}
+                if own_rating is not None else None
+            )
+            book["avg_rating"] = float(book["avg_rating"]) if book["avg_rating"] else None
+            book["review_count"] = int(book["review_count"])
+            book["rating_histogram"] = pop_histogram(book)
+
+            reviews, next_cursor = fetch_review_page(cur, book_id, limit)
+            book["reviews"] = reviews
+            book["next_cursor"] = next_cursor
+
+            return jsonify(book), 200
+
+        except Exception as e:
+            print("[BOOK PAGE ERROR]", e)
+            return jsonify({"error": "Error fetching book page"}), 500
+
+        finally:
+            if cur: cur.close()
+            if conn: conn.close()
+
+    # ============================================================
+    # 2c. BATCH BOOK LOOKUP
+    # ============================================================
+
+    BATCH_MAX_IDS = 100
+
+    @app.route("/api/books/batch", methods=["GET", "POST"])
+    @require_customer
+    def get_books_batch():
+        """
+        GET  /api/books/batch?ids=1,2,3
+        POST /api/books/batch  { "ids": [1, 2, 3] }
+
+        Returns details, availability and rating stats for up to
+        BATCH_MAX_IDS books in one query:
+            { "books": [... in request order ...], "missing": [ids] }
+        """
+        if request.method == "POST":
+            data = request.get_json(silent=True) or {}
+            raw_ids = data.get("ids") or []
+        else:
+            raw_ids = [p for p in (request.args.get("ids") or "").split(",") if p.strip()]
+
+        try:
+            ids = list(dict.fromkeys(int(i) for i in raw_ids))
+        except (ValueError, TypeError):
+            return jsonify({"error": "ids must be integers"}), 400
+
+        if not ids:
+            return jsonify({"error": "ids required"}), 400
+
+        if len(ids) > BATCH_MAX_IDS:
+            return jsonify({"error": f"At most {BATCH_MAX_IDS} ids per request"}), 400
 
         conn = None
         cur = None
@@ -175,106 +361,147 @@ def init_customer_routes(app):
             conn = get_db_connection()
             cur = conn.cursor(dictionary=True)
 
-            # fetch book prices
-            ids = list({i["book_id"] for i in items})
             fmt = ",".join(["%s"] * len(ids))
-
             cur.execute(f"""
-                SELECT id, title, author, price_buy, price_rent
-                FROM books
-                WHERE id IN ({fmt})
+                SELECT b.id, b.title, b.author, b.genre, b.publication_year,
+                       b.price_buy, b.price_rent,
+                       COALESCE(inv.available_copies, 0) AS available_copies,
+                       bs.avg_rating,
+                       COALESCE(bs.rating_count, 0) AS review_count
+                FROM books b
+                LEFT JOIN inventory inv ON inv.book_id = b.id
+                LEFT JOIN book_stats bs ON bs.book_id = b.id
+                WHERE b.id IN ({fmt})
             """, ids)
-            rows = cur.fetchall()
-            book_map = {b["id"]: b for b in rows}
+            found = {}
+            for row in cur.fetchall():
+                row["avg_rating"] = float(row["avg_rating"]) if row["avg_rating"] else None
+                row["review_count"] = int(row["review_count"])
+                found[row["id"]] = row
+
+            return jsonify({
+                "books": [found[i] for i in ids if i in found],
+                "missing": [i for i in ids if i not in found]
+            }), 200
 
-            # calculate bill
-            bill_items = []
-            total = 0.0
+        except Exception as e:
+            print("[BOOK BATCH ERROR]", e)
+            return jsonify({"error": "Error fetching books"}), 500
 
-            for it in items:
-                b = book_map.get(it["book_id"])
-                if not b:
-                    return jsonify({"error": f"Book {it['book_id']} not found"}), 400
+        finally:
+            if cur: cur.close()
+            if conn: conn.close()
 
-                price = float(b["price_buy"] if it["type"] == "buy" else b["price_rent"])
-                total += price
+    # ============================================================
+    # 2d. CART QUOTE (read-only price / stock check)
+    # ============================================================
 
-                bill_items.append({
-                    "book_id": b["id"],
-                    "title": b["title"],
-                    "author": b["author"],
-                    "type": it["type"],
-                    "price": price
-                })
+    @app.route("/api/cart/quote", methods=["POST"])
+    @require_customer
+    def quote():
+        """
+        Price and availability check for the whole cart before checkout.
+        Plain consistent read: takes no locks and writes nothing.
+        """
+        data = request.get_json(silent=True) or {}
+        items = data.get("items", [])
 
-            # Create order
-            cur.execute("""
-                INSERT INTO orders (user_id, total_price, payment_status)
-                VALUES (%s, %s, 'Pending')
-            """, (user_id, total))
-            order_id = cur.lastrowid
+        if not items:
+            return jsonify({"error": "Missing items"}), 400
 
-            # Insert order items, update inventory, and auto-create rentals for rents
-            for it in bill_items:
-                cur.execute("""
-                    INSERT INTO order_items (order_id, book_id, type, price)
-                    VALUES (%s, %s, %s, %s)
-                """, (order_id, it["book_id"], it["type"], it["price"]))
-                order_item_id = cur.lastrowid
+        conn = None
+        cur = None
+        try:
+            conn = get_db_connection()
+            cur = conn.cursor(dictionary=True)
+            return jsonify(quote_cart(cur, items)), 200
 
-                # Lock inventory row for this book to avoid race conditions
-                cur.execute("""
-                    SELECT total_copies, available_copies
-                    FROM inventory
-                    WHERE book_id = %s
-                    FOR UPDATE
-                """, (it["book_id"],))
-                inv = cur.fetchone()
-                available = inv["available_copies"] if inv else 0
-
-                if it["type"] == "rent":
-                    # Renting consumes 1 available copy
-                    if available <= 0:
-                        # Not enough copies to rent
-                        conn.rollback()
-                        return jsonify({"error": f"No available copies to rent book {it['book_id']}"}), 400
-
-                    # decrement available_copies
-                    cur.execute("""
-                        UPDATE inventory
-                        SET available_copies = available_copies - 1
-                        WHERE book_id = %s
-                    """, (it["book_id"],))
-
-                    due = datetime.now() + timedelta(days=14)
-                    cur.execute("""
-                        INSERT INTO rentals (order_item_id, user_id, book_id,
-                                             rented_at, due_date)
-                        VALUES (%s, %s, %s, NOW(), %s)
-                    """, (order_item_id, user_id, it["book_id"], due))
-
-                else:  # buy
-                    # Buying consumes 1 total AND 1 available copy
-                    if available <= 0:
-                        conn.rollback()
-                        return jsonify({"error": f"No available copies to buy book {it['book_id']}"}), 400
-
-                    cur.execute("""
-                        UPDATE inventory
-                        SET total_copies = total_copies - 1,
-                            available_copies = available_copies - 1
-                        WHERE book_id = %s
-                    """, (it["book_id"],))
+        except OrderError as e:
+            return jsonify({"error": e.message}), e.status
+
+        except Exception as e:
+            print("[CART QUOTE ERROR]", e)
+            return jsonify({"error": "Error quoting cart"}), 500
+
+        finally:
+            if cur: cur.close()
+            if conn: conn.close()
+
+    # ============================================================
+    # 3. PLACE ORDER (auto-rentals)
+    # ============================================================
+
+    @app.route("/api/orders", methods=["POST"])
+    @require_customer
+    def place_order():
+        data = request.get_json(silent=True) or {}
+        # Get user_id from authenticated token, not from request
+        user_id = get_current_user_id()
+        items = data.get("items", [])
+
+        if not items:
+            return jsonify({"error": "Missing items"}), 400
+
+        # Optional retry safety: a repeated key replays the first response
+        try:
+            idem_key = request_key()
+        except IdempotencyError as e:
+            return jsonify({"error": e.message}), e.status
+        request_hash = fingerprint("orders", items)
+
+        if order_queue.ASYNC_INTAKE:
+            # Validate, queue durably and let the workers place the order
+            conn = None
+            cur = None
+            try:
+                # a retried request gets its ticket back even if the stock
+                # has run out since
+                ticket = idem_key and order_queue.find_ticket(user_id, idem_key,
+                                                              request_hash)
+                if not ticket:
+                    conn = get_db_connection()
+                    cur = conn.cursor(dictionary=True)
+                    clean = check_cart(cur, items)
+                    ticket = order_queue.enqueue(user_id, clean, idem_key, request_hash)
+            except (OrderError, IdempotencyError) as e:
+                return jsonify({"error": e.message}), e.status
+            except Exception as e:
+                print("[ORDER INTAKE ERROR]", e)
+                return jsonify({"error": "Error placing order"}), 500
+            finally:
+                if cur: cur.close()
+                if conn: conn.close()
+            return jsonify({"ticket": ticket, "status": "queued"}), 202
+
+        conn = None
+        cur = None
+
+        try:
+            conn = get_db_connection()
+            cur = conn.cursor(dictionary=True)
+
+            if idem_key:
+                stored = claim(cur, "orders", user_id, idem_key, request_hash)
+                if stored:
+                    conn.rollback()
+                    return replay(stored)
+
+            # Price, lock (sorted), validate and write the whole cart
+            bill = place_order_tx(cur, user_id, items)
+
+            if idem_key:
+                record(cur, "orders", user_id, idem_key, 201, bill)
 
             conn.commit()
+            bump_books("inventory", [it["book_id"] for it in bill["items"]])
+            if idem_key:
+                maybe_sweep()
 
-            return jsonify({
-                "order_id": order_id,
-                "user_id": user_id,
-                "items": bill_items,
-                "total_price": total,
-                "payment_status": "Pending"
-            }), 201
+            return jsonify(bill), 201
+
+        except (OrderError, IdempotencyError) as e:
+            if conn: conn.rollback()
+            return jsonify({"error": e.message}), e.status
 
         except Exception as e:
             if conn: conn.rollback()
@@ -285,6 +512,20 @@ def init_customer_routes(app):
             if cur: cur.close()
             if conn: conn.close()
 
+    @app.route("/api/orders/tickets/<ticket>", methods=["GET"])
+    @require_customer
+    def get_order_ticket(ticket):
+        """Outcome of an asynchronously placed order (poll until not queued)."""
+        try:
+            status = order_queue.ticket_status(ticket, get_current_user_id())
+        except Exception as e:
+            print("[ORDER TICKET ERROR]", e)
+            return jsonify({"error": "Error loading order status"}), 500
+
+        if status is None:
+            return jsonify({"error": "Ticket not found"}), 404
+        return jsonify(status), 200
+
     # ============================================================
     # 4. GET ALL REVIEWS FOR A BOOK
     # ============================================================
@@ -292,7 +533,14 @@ def init_customer_routes(app):
     @app.route("/api/books/<int:book_id>/reviews", methods=["GET"])
     @require_customer
     def get_book_reviews(book_id):
-        """Return all reviews for a book with usernames."""
+        """
+        One page of reviews for a book with usernames, newest first.
+        Query params: limit (default 20, max 100), cursor (from next_cursor)
+        Returns: { "reviews": [...], "next_cursor": str|null, "total": int }
+        """
+        limit = parse_page_size(request.args.get("limit"))
+        cursor = request.args.get("cursor") or None
+
         conn = None
         cur = None
 
@@ -300,20 +548,16 @@ def init_customer_routes(app):
             conn = get_db_connection()
             cur = conn.cursor(dictionary=True)
 
-            cur.execute("""
-                SELECT r.id, r.rating, r.review_text, r.created_at,
-                       u.username
-                FROM reviews r
-                JOIN users u ON r.user_id = u.id
-                WHERE r.book_id = %s
-                ORDER BY r.created_at DESC
-            """, (book_id,))
+            reviews, next_cursor = fetch_review_page(cur, book_id, limit, cursor)
 
-            reviews = cur.fetchall()
-            for r in reviews:
-                r["rating"] = int(r["rating"])
+            return jsonify({
+                "reviews": reviews,
+                "next_cursor": next_cursor,
+                "total": review_total(cur, book_id)
+            }), 200
 
-            return jsonify(reviews), 200
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
 
         except Exception as e:
             print("[GET BOOK REVIEWS ERROR]", e)
@@ -340,26 +584,30 @@ def init_customer_routes(app):
         if not (book_id and rating):
             return jsonify({"error": "Missing fields"}), 400
 
+        try:
+            rating = int(rating)
+        except (ValueError, TypeError):
+            return jsonify({"error": "rating must be an integer"}), 400
+
+        if not 1 <= rating <= 5:
+            return jsonify({"error": "rating must be between 1 and 5"}), 400
+
         conn = None
         cur = None
 
         try:
             conn = get_db_connection()
-            cur = conn.cursor()
+            cur = conn.cursor(dictionary=True)
 
-            # Insert or replace review
-            cur.execute("""
-                INSERT INTO reviews (user_id, book_id, rating, review_text)
-                VALUES (%s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    rating = VALUES(rating),
-                    review_text = VALUES(review_text)
-            """, (user_id, book_id, rating, review_text))
+            # Insert or replace review (keeps book_stats in step)
+            record_review(cur, user_id, book_id, rating, review_text)
 
             conn.commit()
+            bump_books("reviews", [book_id])
             return jsonify({"success": True}), 201
 
         except Exception as e:
+            if conn: conn.rollback()
             print("[REVIEW ERROR]", e)
             return jsonify({"error": "Error saving review"}), 500
 
@@ -385,17 +633,16 @@ def init_customer_routes(app):
             conn = get_db_connection()
             cur = conn.cursor(dictionary=True)
 
-            # purchases
+            # purchases (title/author are snapshotted at order time)
             cur.execute("""
                 SELECT 
-                    b.id AS book_id,
-                    b.title, 
-                    b.author, 
+                    oi.book_id,
+                    oi.title, 
+                    oi.author, 
                     oi.price, 
                     o.created_at AS purchased_at
                 FROM orders o
                 JOIN order_items oi ON oi.order_id = o.id
-                JOIN books b ON b.id = oi.book_id
                 WHERE o.user_id = %s AND oi.type = 'buy'
                 ORDER BY o.created_at DESC
             """, (user_id,))
@@ -404,14 +651,13 @@ def init_customer_routes(app):
             # current rentals
             cur.execute("""
                 SELECT 
-                    b.id AS book_id,
-                    b.title, 
-                    b.author, 
+                    r.book_id,
+                    r.title, 
+                    r.author, 
                     r.rented_at, 
                     r.due_date,
                     DATEDIFF(r.due_date, NOW()) AS days_remaining
                 FROM rentals r
-                JOIN books b ON b.id = r.book_id
                 WHERE r.user_id = %s AND r.returned_at IS NULL
                 ORDER BY r.due_date ASC
             """, (user_id,))
@@ -420,13 +666,12 @@ def init_customer_routes(app):
             # past rentals
             cur.execute("""
                 SELECT 
-                    b.id AS book_id,
-                    b.title, 
-                    b.author, 
+                    r.book_id,
+                    r.title, 
+                    r.author, 
                     r.rented_at, 
                     r.returned_at
                 FROM rentals r
-                JOIN books b ON b.id = r.book_id
                 WHERE r.user_id = %s AND r.returned_at IS NOT NULL
                 ORDER BY r.returned_at DESC
             """, (user_id,))
@@ -18,3 +18,22 @@ def get_db_connection():
         database=os.getenv("MYSQL_DB", "online_bookstore"),
     )
     return conn
+
+
+def get_replica_connection():
+    """
+    Connection for long read-only work (exports).  Uses the MYSQL_REPLICA_*
+    settings when MYSQL_REPLICA_HOST is set, otherwise the primary.
+    """
+    host = os.getenv("MYSQL_REPLICA_HOST")
+    if not host:
+        return get_db_connection()
+
+    conn = mysql.connector.connect(
+        host=host,
+        port=int(os.getenv("MYSQL_REPLICA_PORT", 3306)),
+        user=os.getenv("MYSQL_REPLICA_USER", os.getenv("MYSQL_USER", "root")),
+        password=os.getenv("MYSQL_REPLICA_PASSWORD", os.getenv("MYSQL_PASSWORD", "")),
+        database=os.getenv("MYSQL_REPLICA_DB", os.getenv("MYSQL_DB", "online_bookstore")),
+    )
+    return conn
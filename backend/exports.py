@@ -0,0 +1,184 @@
+# backend/exports.py
+"""
+Streaming exports of manager data sets for accounting.
+
+    GET /api/manager/exports/<dataset>?format=csv|ndjson&gzip=1
+        dataset: orders | order_items | rentals | customers
+        since / until (YYYY-MM-DD, inclusive) filter on the row's date
+
+Rows are read through an unbuffered cursor in fetchmany() chunks and
+written to a generator response as they arrive, so memory stays flat no
+matter how many rows are exported.  The query runs before the response
+starts (failures are a JSON 500); an error mid-stream aborts the
+connection, so a client never receives a truncated file that looks
+complete (the chunked body or the gzip trailer is missing).  With gzip=1 the stream is compressed
+on the fly (application/gzip, .gz file name).  Exports read from the
+replica when MYSQL_REPLICA_HOST is configured (see database.py).
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from flask import Response, jsonify, request, stream_with_context
+
+from auth_middleware import require_manager
+from database import get_replica_connection
+
+FETCH_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+# dataset -> (SELECT ... without WHERE/ORDER, date column, id column)
+DATASETS = {
+    "orders": ("""
+        SELECT o.id, o.user_id, u.username AS customer_username,
+               o.total_price, o.payment_status, o.created_at
+        FROM orders o
+        JOIN users u ON u.id = o.user_id
+    """, "o.created_at", "o.id"),
+    "order_items": ("""
+        SELECT oi.id, oi.order_id, oi.book_id, oi.title, oi.author,
+               oi.type, oi.price, oi.created_at
+        FROM order_items oi
+    """, "oi.created_at", "oi.id"),
+    "rentals": ("""
+        SELECT r.id, r.order_item_id, r.user_id, r.book_id, r.title, r.author,
+               r.rented_at, r.due_date, r.returned_at
+        FROM rentals r
+    """, "r.rented_at", "r.id"),
+    "customers": ("""
+        SELECT u.id, u.username, u.email, u.created_at
+        FROM users u
+        WHERE u.role = 'customer'
+    """, "u.created_at", "u.id"),
+}
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def _open(sql, params):
+    """Connect and run the query on an unbuffered server-side cursor."""
+    conn = get_replica_connection()
+    try:
+        cur = conn.cursor(buffered=False)
+        cur.execute(sql, params)
+        return conn, cur
+    except Exception:
+        _close(None, conn)
+        raise
+
+
+def _close(cur, conn):
+    # the client may disconnect mid-stream, leaving unread rows
+    for closable in (cur, conn):
+        try:
+            if closable:
+                closable.close()
+        except Exception:
+            pass
+
+
+def _encode(fmt, cur):
+    """Yield encoded text blocks of about FLUSH_BYTES."""
+    columns = [d[0] for d in cur.description]
+    buf = io.StringIO()
+    writer = csv.writer(buf) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+
+    while True:
+        chunk = cur.fetchmany(FETCH_SIZE)
+        if not chunk:
+            break
+        for row in chunk:
+            if writer:
+                writer.writerow([_cell(v) for v in row])
+            else:
+                buf.write(json.dumps(dict(zip(columns, row)), default=str))
+                buf.write("\n")
+            if buf.tell() >= FLUSH_BYTES:
+                yield buf.getvalue().encode()
+                buf.seek(0)
+                buf.truncate()
+
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def _gzip(blocks):
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits=31: gzip container
+    for block in blocks:
+        out = gz.compress(block)
+        if out:
+            yield out
+    yield gz.flush()
+
+
+def init_export_routes(app):
+
+    @app.route("/api/manager/exports/<dataset>", methods=["GET"])
+    @require_manager
+    def manager_export(dataset):
+        if dataset not in DATASETS:
+            return jsonify({"error": f"dataset must be one of {', '.join(DATASETS)}"}), 404
+
+        fmt = request.args.get("format", "csv")
+        if fmt not in ("csv", "ndjson"):
+            return jsonify({"error": "format must be 'csv' or 'ndjson'"}), 400
+        compress = request.args.get("gzip") == "1"
+
+        select, date_col, id_col = DATASETS[dataset]
+        where = []
+        params = []
+        try:
+            since = request.args.get("since") or None
+            until = request.args.get("until") or None
+            if since:
+                where.append(f"{date_col} >= %s")
+                params.append(datetime.strptime(since, "%Y-%m-%d"))
+            if until:
+                where.append(f"{date_col} < %s")
+                params.append(datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1))
+        except ValueError:
+            return jsonify({"error": "Invalid date"}), 400
+
+        joiner = " AND " if "WHERE" in select else " WHERE "
+        sql = select + (joiner + " AND ".join(where) if where else "") + f" ORDER BY {id_col}"
+
+        # connect and run the query before any header is sent, so an
+        # unreachable replica or a failing query is a proper 500
+        try:
+            conn, cur = _open(sql, params)
+        except Exception as e:
+            print("[MANAGER EXPORT ERROR]", e)
+            return jsonify({"error": "Error starting export"}), 500
+
+        blocks = _encode(fmt, cur)
+        filename = f"{dataset}.{fmt}"
+        mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+        if compress:
+            blocks = _gzip(blocks)
+            filename += ".gz"
+            mimetype = "application/gzip"
+
+        def stream():
+            try:
+                yield from blocks
+            except Exception as e:
+                # headers are already sent: re-raise so the server aborts the
+                # chunked response instead of ending it like a complete file
+                print("[MANAGER EXPORT ERROR]", e)
+                raise
+
+        resp = Response(stream_with_context(stream()), mimetype=mimetype)
+        resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        resp.headers["X-Accel-Buffering"] = "no"
+        # the only closer: runs once the response ends, however it ends
+        # (finished, failed, client gone or never iterated)
+        resp.call_on_close(lambda: _close(cur, conn))
+        return resp
@@ -0,0 +1,192 @@
+# backend/idempotency.py
+"""
+Idempotency-Key support for endpoints that create orders or rentals.
+
+A client that may retry sends the same Idempotency-Key header on every
+attempt.  The route claims the key in the same transaction that does the
+work:
+
+    1. INSERT the key + a fingerprint of the request into idempotency_keys
+       (UNIQUE on scope, user_id, key).  A concurrent duplicate blocks on
+       the unique index until the first transaction finishes.
+    2. do the work, record() the response on the key row, commit.
+
+If the INSERT hits an existing key, the stored response is replayed instead
+of running the transaction again (422 if the key was used for a different
+request).  Failed requests roll back their key with everything else, so
+they can be retried.  Keys expire after IDEMPOTENCY_TTL_HOURS and are
+deleted by sweep():
+
+    python idempotency.py
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from flask import json as flask_json, jsonify, request
+from mysql.connector import errorcode, IntegrityError
+
+from database import get_db_connection
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", 24))
+SWEEP_SECONDS = float(os.getenv("IDEMPOTENCY_SWEEP_SECONDS", 300))
+SWEEP_BATCH = 1000
+
+_KEY_RE = re.compile(r"^[A-Za-z0-9_\-:.]{1,64}$")
+_last_sweep = 0
+_sweep_lock = threading.Lock()
+
+
+class IdempotencyError(Exception):
+    """The key cannot be used; `status` is the HTTP status to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def request_key():
+    """Idempotency-Key header of the current request, or None."""
+    key = request.headers.get("Idempotency-Key")
+    if key is None:
+        return None
+    key = key.strip()
+    if not _KEY_RE.match(key):
+        raise IdempotencyError(
+            "Idempotency-Key must be 1-64 characters of letters, digits, '-', '_', ':' or '.'"
+        )
+    return key
+
+
+def fingerprint(*parts):
+    """Stable hash of the request payload, used to detect key reuse."""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def claim(cur, scope, user_id, key, request_hash):
+    """
+    Claim `key` inside the caller's transaction (dictionary cursor).
+    Returns None if the request should run, or (status, body) to replay.
+    Raises IdempotencyError if the key belongs to a different request.
+    """
+    for _ in range(2):
+        try:
+            cur.execute("""
+                INSERT INTO idempotency_keys
+                    (scope, user_id, idem_key, request_hash, expires_at)
+                VALUES (%s, %s, %s, %s, NOW() + INTERVAL %s HOUR)
+            """, (scope, user_id, key, request_hash, IDEMPOTENCY_TTL_HOURS))
+            return None
+        except IntegrityError as e:
+            if e.errno != errorcode.ER_DUP_ENTRY:
+                raise
+
+        # Locking read: sees the latest committed row, not our snapshot
+        cur.execute("""
+            SELECT request_hash, status_code, response_body,
+                   expires_at < NOW() AS expired
+            FROM idempotency_keys
+            WHERE scope = %s AND user_id = %s AND idem_key = %s
+            LOCK IN SHARE MODE
+        """, (scope, user_id, key))
+        row = cur.fetchone()
+
+        if row is None or row["expired"]:
+            # expired (or swept meanwhile): forget it and claim afresh
+            cur.execute("""
+                DELETE FROM idempotency_keys
+                WHERE scope = %s AND user_id = %s AND idem_key = %s
+                  AND expires_at < NOW()
+            """, (scope, user_id, key))
+            continue
+
+        if row["request_hash"] != request_hash:
+            raise IdempotencyError(
+                "Idempotency-Key was already used for a different request", 422
+            )
+        if row["status_code"] is None:
+            raise IdempotencyError(
+                "A request with this Idempotency-Key is still in progress", 409
+            )
+        return row["status_code"], json.loads(row["response_body"])
+
+    raise IdempotencyError("Could not claim Idempotency-Key, please retry", 409)
+
+
+def record(cur, scope, user_id, key, status, body):
+    """Store the response for a claimed key (before the caller commits)."""
+    cur.execute("""
+        UPDATE idempotency_keys
+        SET status_code = %s, response_body = %s
+        WHERE scope = %s AND user_id = %s AND idem_key = %s
+    """, (status, flask_json.dumps(body), scope, user_id, key))
+
+
+def replay(stored):
+    """Flask response for a stored (status, body)."""
+    status, body = stored
+    resp = jsonify(body)
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp, status
+
+
+def sweep(cur, batch=SWEEP_BATCH):
+    """Delete up to `batch` expired keys; returns how many were deleted."""
+    cur.execute("""
+        DELETE FROM idempotency_keys
+        WHERE expires_at < NOW()
+        ORDER BY expires_at
+        LIMIT %s
+    """, (batch,))
+    return cur.rowcount
+
+
+def maybe_sweep():
+    """
+    Start one bounded sweep at most every SWEEP_SECONDS per process, on a
+    background thread so no request waits for the DELETE.
+    """
+    global _last_sweep
+    now = time.monotonic()
+    with _sweep_lock:
+        if now - _last_sweep < SWEEP_SECONDS:
+            return
+        _last_sweep = now
+    threading.Thread(target=_sweep_once, name="idempotency-sweep", daemon=True).start()
+
+
+def _sweep_once():
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        sweep(cur)
+        conn.commit()
+    except Exception as e:
+        print("[IDEMPOTENCY SWEEP ERROR]", e)
+    finally:
+        if cur: cur.close()
+        if conn: conn.close()
+
+
+if __name__ == "__main__":
+    conn = get_db_connection()
+    cur = conn.cursor()
+    total = 0
+    try:
+        while True:
+            deleted = sweep(cur)
+            conn.commit()
+            total += deleted
+            if deleted < SWEEP_BATCH:
+                break
+    finally:
+        cur.close()
+        conn.close()
+    print(f"Deleted {total} expired idempotency keys")
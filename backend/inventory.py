@@ -0,0 +1,136 @@
+# backend/inventory.py
+"""
+Stock reservation primitives.
+
+Every path that consumes copies goes through reserve()/reserve_many(), which
+take stock with a single conditional UPDATE:
+
+    UPDATE inventory
+    SET available_copies = available_copies - n
+    WHERE book_id = ? AND available_copies >= n
+
+and check the affected-row count.  The check and the decrement happen in one
+statement under the row lock InnoDB takes for the UPDATE, so there is no
+SELECT ... FOR UPDATE round trip and no window in which two transactions can
+both see the last copy.  All functions run inside the caller's transaction.
+
+Hot titles can be sharded over several inventory_shards rows (see
+inventory_shards.py); reserve_many()/release() route those books to their
+slots and keep the single-row path, guarded by shard_count = 0, for the rest.
+"""
+import inventory_shards
+
+
+def _in_list(values):
+    return ",".join(["%s"] * len(values))
+
+
+def reserve(cur, book_id, n=1, consume_total=False):
+    """
+    Take `n` available copies of one book (and `n` total copies when the book
+    is sold rather than rented).  Returns False if there is not enough stock.
+    """
+    return not reserve_many(cur, {book_id: n}, {book_id: n} if consume_total else None)
+
+
+def reserve_many(cur, need, sold=None):
+    """
+    Reserve stock for several books.  Unsharded books are taken in one
+    statement; sharded books from their slots.
+
+    need: {book_id: copies leaving the shelf}
+    sold: {book_id: copies that are bought (also leave total_copies)}
+
+    Returns [] on success.  Otherwise nothing is reserved and the ids that
+    were short are returned (ascending).
+    """
+    sold = sold or {}
+    if not need:
+        return []
+
+    sharded = inventory_shards.sharded_books(cur)
+    short, shard_counts = _try_reserve(cur, need, sold, sharded)
+    if short and any(shard_counts.get(bid, 0) != sharded.get(bid, 0) for bid in short):
+        # sharding was toggled since our routing view was loaded; retry once
+        sharded = inventory_shards.sharded_books(cur, refresh=True)
+        short, _ = _try_reserve(cur, need, sold, sharded)
+    return short
+
+
+def _try_reserve(cur, need, sold, sharded):
+    """One routed attempt -> (short ids, {book_id: shard_count} on failure)."""
+    ids = sorted(need)
+    plain = [bid for bid in ids if bid not in sharded]
+
+    cur.execute("SAVEPOINT reserve_many")
+    ok = True
+    if plain:
+        case = " ".join(["WHEN %s THEN %s"] * len(plain))
+        avail_params = [v for bid in plain for v in (bid, need[bid])]
+        total_params = [v for bid in plain for v in (bid, sold.get(bid, 0))]
+        cur.execute(f"""
+            UPDATE inventory
+            SET available_copies = available_copies - CASE book_id {case} END,
+                total_copies = total_copies - CASE book_id {case} END
+            WHERE book_id IN ({_in_list(plain)})
+              AND shard_count = 0
+              AND available_copies >= CASE book_id {case} END
+        """, avail_params + total_params + plain + avail_params)
+        ok = cur.rowcount == len(plain)
+
+    for bid in ids:
+        if not ok:
+            break
+        if bid in sharded:
+            ok = inventory_shards.reserve_sharded(
+                cur, bid, need[bid], sold.get(bid, 0), sharded[bid])
+
+    if ok:
+        cur.execute("RELEASE SAVEPOINT reserve_many")
+        return [], {}
+
+    # Undo the rows that did succeed and report which books were short
+    cur.execute("ROLLBACK TO SAVEPOINT reserve_many")
+    cur.execute(f"""
+        SELECT i.book_id, i.shard_count,
+               COALESCE(SUM(s.available_copies), i.available_copies) AS available_copies
+        FROM inventory i
+        LEFT JOIN inventory_shards s ON s.book_id = i.book_id
+        WHERE i.book_id IN ({_in_list(ids)})
+        GROUP BY i.book_id, i.shard_count, i.available_copies
+    """, ids)
+    rows = cur.fetchall()
+    available = {r["book_id"]: r["available_copies"] for r in rows}
+    shard_counts = {r["book_id"]: r["shard_count"] for r in rows}
+    # stock may have moved since the UPDATE; never report a failure as []
+    short = [bid for bid in ids if available.get(bid, 0) < need[bid]] or ids
+    return short, shard_counts
+
+
+def release(cur, book_id, n=1):
+    """Put `n` rented copies back on the shelf."""
+    return adjust(cur, book_id, n, 0)
+
+
+def adjust(cur, book_id, available_delta, total_delta):
+    """
+    Add (or with negative deltas, remove) copies without a stock check, on the
+    inventory row or one slot of a sharded book.  Returns False if the book
+    has no inventory.
+    """
+    for refresh in (False, True):
+        sharded = inventory_shards.sharded_books(cur, refresh=refresh)
+        if book_id in sharded:
+            if inventory_shards.add_to_random_slot(
+                    cur, book_id, available_delta, total_delta, sharded[book_id]):
+                return True
+        else:
+            cur.execute("""
+                UPDATE inventory
+                SET available_copies = available_copies + %s,
+                    total_copies = total_copies + %s
+                WHERE book_id = %s AND shard_count = 0
+            """, (available_delta, total_delta, book_id))
+            if cur.rowcount == 1:
+                return True
+    return False
@@ -0,0 +1,348 @@
+# backend/inventory_ledger.py
+"""
+Append-only ledger of stock movements.
+
+Every write path that changes stock appends its movements to
+inventory_movements in the same transaction, with one multi-row INSERT per
+transaction (append()):
+
+    reason    delta_total  delta_available   ref
+    create        +n           +n            book
+    buy           -1           -1            order
+    rent           0           -1            order | rental
+    return         0           +1            rental
+    adjust        +n           +n            book (manager increment)
+    edit       new-old      new-old          book (manager edit)
+
+The inventory counters stay the authority for reservations (the
+conditional UPDATE is what prevents overselling); the ledger is the audit
+trail they can be checked against and rebuilt from.
+
+The compactor folds movements, in id order, into inventory_checkpoints
+(book_id, movement_id, as_of, totals), so point-in-time stock is
+"latest checkpoint <= T + movements after it up to T" and never scans
+full history.  Movements younger than COMPACT_LAG_SECONDS are left for the
+next run, so transactions still in flight are not skipped.  Folded
+movements can then be pruned.
+
+    python inventory_ledger.py baseline          # once, with writes paused
+    python inventory_ledger.py compact [--prune-days N]
+    python inventory_ledger.py stock <book_id> [--at "2025-01-31 12:00"]
+    python inventory_ledger.py audit
+"""
+import argparse
+import os
+from datetime import datetime
+
+from database import get_db_connection
+
+COMPACT_BATCH = int(os.getenv("LEDGER_COMPACT_BATCH", 50000))
+COMPACT_LAG_SECONDS = int(os.getenv("LEDGER_COMPACT_LAG", 60))
+CHUNK = 1000
+
+
+def _in_list(values):
+    return ",".join(["%s"] * len(values))
+
+
+# ============================================================
+# APPENDS (inside the caller's transaction)
+# ============================================================
+
+def movement(book_id, reason, delta_total, delta_available,
+             ref_type=None, ref_id=None, actor_id=None):
+    return (book_id, reason, delta_total, delta_available, ref_type, ref_id, actor_id)
+
+
+def append(cur, movements):
+    """Append `movements` (from movement()) with one INSERT."""
+    movements = [m for m in movements if m[2] or m[3]]
+    if not movements:
+        return
+    cur.execute(f"""
+        INSERT INTO inventory_movements
+            (book_id, reason, delta_total, delta_available,
+             ref_type, ref_id, actor_id)
+        VALUES {",".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(movements))}
+    """, [v for m in movements for v in m])
+
+
+# ============================================================
+# POINT-IN-TIME QUERIES
+# ============================================================
+
+def stock_at(cur, book_id, at=None):
+    """
+    {total_copies, available_copies, as_of} for one book at time `at`
+    (default now), from its latest checkpoint plus later movements.
+    `cur` must be a dictionary cursor.
+    """
+    at = at or datetime.now()
+    cur.execute("""
+        SELECT movement_id, total_copies, available_copies
+        FROM inventory_checkpoints
+        WHERE book_id = %s AND as_of <= %s
+        ORDER BY as_of DESC, movement_id DESC
+        LIMIT 1
+    """, (book_id, at))
+    cp = cur.fetchone() or {"movement_id": 0, "total_copies": 0, "available_copies": 0}
+
+    # (book_id, id) range starting at the checkpoint
+    cur.execute("""
+        SELECT COALESCE(SUM(delta_total), 0) AS dt,
+               COALESCE(SUM(delta_available), 0) AS da
+        FROM inventory_movements
+        WHERE book_id = %s AND id > %s AND created_at <= %s
+    """, (book_id, cp["movement_id"], at))
+    d = cur.fetchone()
+    return {
+        "book_id": book_id,
+        "total_copies": int(cp["total_copies"]) + int(d["dt"]),
+        "available_copies": int(cp["available_copies"]) + int(d["da"]),
+        "as_of": at
+    }
+
+
+def movements_between(cur, book_id, since=None, until=None, limit=500):
+    """A book's movements in [since, until), oldest first (book/time index)."""
+    where = ["book_id = %s"]
+    params = [book_id]
+    if since is not None:
+        where.append("created_at >= %s")
+        params.append(since)
+    if until is not None:
+        where.append("created_at < %s")
+        params.append(until)
+
+    cur.execute(f"""
+        SELECT id, reason, delta_total, delta_available,
+               ref_type, ref_id, actor_id, created_at
+        FROM inventory_movements
+        WHERE {" AND ".join(where)}
+        ORDER BY created_at, id
+        LIMIT %s
+    """, params + [limit])
+    return cur.fetchall()
+
+
+# ============================================================
+# COMPACTION
+# ============================================================
+
+def _compacted_upto(cur, lock=False):
+    cur.execute(f"""
+        SELECT last_movement_id FROM inventory_ledger_state WHERE id = 1
+        {"FOR UPDATE" if lock else ""}
+    """)
+    row = cur.fetchone()
+    return int(row["last_movement_id"]) if row else 0
+
+
+def compact_once(cur, batch=COMPACT_BATCH):
+    """
+    Fold the next `batch` settled movements into checkpoints.  Returns the
+    number of movements folded (0 when caught up).
+    """
+    last = _compacted_upto(cur, lock=True)   # one compactor at a time
+    cur.execute("""
+        SELECT MAX(id) AS upto, COUNT(*) AS n
+        FROM (
+            SELECT id FROM inventory_movements
+            WHERE id > %s AND created_at < NOW() - INTERVAL %s SECOND
+            ORDER BY id
+            LIMIT %s
+        ) t
+    """, (last, COMPACT_LAG_SECONDS, batch))
+    row = cur.fetchone()
+    if not row["upto"]:
+        return 0
+    upto = int(row["upto"])
+
+    cur.execute("""
+        SELECT book_id,
+               SUM(delta_total) AS dt,
+               SUM(delta_available) AS da,
+               MAX(created_at) AS as_of
+        FROM inventory_movements
+        WHERE id > %s AND id <= %s
+        GROUP BY book_id
+    """, (last, upto))
+    sums = cur.fetchall()
+
+    for i in range(0, len(sums), CHUNK):
+        chunk = sums[i:i + CHUNK]
+        ids = [s["book_id"] for s in chunk]
+        cur.execute(f"""
+            SELECT c.book_id, c.total_copies, c.available_copies
+            FROM inventory_checkpoints c
+            JOIN (
+                SELECT book_id, MAX(movement_id) AS movement_id
+                FROM inventory_checkpoints
+                WHERE book_id IN ({_in_list(ids)})
+                GROUP BY book_id
+            ) latest ON latest.book_id = c.book_id
+                    AND latest.movement_id = c.movement_id
+        """, ids)
+        prev = {r["book_id"]: r for r in cur.fetchall()}
+
+        rows = []
+        for s in chunk:
+            p = prev.get(s["book_id"], {"total_copies": 0, "available_copies": 0})
+            rows += [s["book_id"], upto, s["as_of"],
+                     int(p["total_copies"]) + int(s["dt"]),
+                     int(p["available_copies"]) + int(s["da"])]
+        cur.execute(f"""
+            INSERT INTO inventory_checkpoints
+                (book_id, movement_id, as_of, total_copies, available_copies)
+            VALUES {",".join(["(%s, %s, %s, %s, %s)"] * len(chunk))}
+        """, rows)
+
+    cur.execute("""
+        INSERT INTO inventory_ledger_state (id, last_movement_id)
+        VALUES (1, %s)
+        ON DUPLICATE KEY UPDATE last_movement_id = VALUES(last_movement_id)
+    """, (upto,))
+    return int(row["n"])
+
+
+def prune(cur, days, batch=CHUNK * 10):
+    """Delete folded movements older than `days`; returns rows deleted."""
+    cur.execute("""
+        DELETE FROM inventory_movements
+        WHERE id <= %s AND created_at < NOW() - INTERVAL %s DAY
+        ORDER BY id
+        LIMIT %s
+    """, (_compacted_upto(cur), days, batch))
+    return cur.rowcount
+
+
+def baseline(cur, conn):
+    """
+    Checkpoint every book's current stock (keyset chunks, one commit each).
+    Run once when the ledger is introduced, while stock writes are paused.
+    """
+    cur.execute("SELECT COALESCE(MAX(id), 0) AS upto FROM inventory_movements")
+    upto = int(cur.fetchone()["upto"])
+
+    last_id = 0
+    done = 0
+    while True:
+        cur.execute("""
+            SELECT i.book_id,
+                   COALESCE(SUM(s.total_copies), i.total_copies) AS total_copies,
+                   COALESCE(SUM(s.available_copies), i.available_copies) AS available_copies
+            FROM inventory i
+            LEFT JOIN inventory_shards s ON s.book_id = i.book_id
+            WHERE i.book_id > %s
+            GROUP BY i.book_id, i.total_copies, i.available_copies
+            ORDER BY i.book_id
+            LIMIT %s
+        """, (last_id, CHUNK))
+        rows = cur.fetchall()
+        if not rows:
+            break
+
+        values = []
+        for r in rows:
+            values += [r["book_id"], upto, r["total_copies"], r["available_copies"]]
+        cur.execute(f"""
+            INSERT INTO inventory_checkpoints
+                (book_id, movement_id, as_of, total_copies, available_copies)
+            VALUES {",".join(["(%s, %s, NOW(), %s, %s)"] * len(rows))}
+            ON DUPLICATE KEY UPDATE total_copies = VALUES(total_copies),
+                                    available_copies = VALUES(available_copies)
+        """, values)
+        conn.commit()
+        done += len(rows)
+        last_id = rows[-1]["book_id"]
+
+    cur.execute("""
+        INSERT INTO inventory_ledger_state (id, last_movement_id)
+        VALUES (1, %s)
+        ON DUPLICATE KEY UPDATE last_movement_id = VALUES(last_movement_id)
+    """, (upto,))
+    conn.commit()
+    return done
+
+
+def audit(cur):
+    """
+    Books whose counters disagree with the ledger (latest checkpoint +
+    later movements), in keyset chunks.  Yields one dict per mismatch.
+    """
+    last_id = 0
+    while True:
+        cur.execute("""
+            SELECT i.book_id,
+                   COALESCE(SUM(s.total_copies), i.total_copies) AS total_copies,
+                   COALESCE(SUM(s.available_copies), i.available_copies) AS available_copies
+            FROM inventory i
+            LEFT JOIN inventory_shards s ON s.book_id = i.book_id
+            WHERE i.book_id > %s
+            GROUP BY i.book_id, i.total_copies, i.available_copies
+            ORDER BY i.book_id
+            LIMIT %s
+        """, (last_id, CHUNK))
+        rows = cur.fetchall()
+        if not rows:
+            return
+        last_id = rows[-1]["book_id"]
+
+        for r in rows:
+            ledger = stock_at(cur, r["book_id"])
+            if (ledger["total_copies"] != int(r["total_copies"])
+                    or ledger["available_copies"] != int(r["available_copies"])):
+                yield {
+                    "book_id": r["book_id"],
+                    "counters": (int(r["total_copies"]), int(r["available_copies"])),
+                    "ledger": (ledger["total_copies"], ledger["available_copies"])
+                }
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Inventory ledger maintenance")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("baseline")
+    c = sub.add_parser("compact")
+    c.add_argument("--prune-days", type=int)
+    s = sub.add_parser("stock")
+    s.add_argument("book_id", type=int)
+    s.add_argument("--at")
+    sub.add_parser("audit")
+    args = p.parse_args()
+
+    conn = get_db_connection()
+    cur = conn.cursor(dictionary=True)
+    try:
+        if args.cmd == "baseline":
+            print(f"Checkpointed {baseline(cur, conn)} books")
+        elif args.cmd == "compact":
+            folded = 0
+            while True:
+                n = compact_once(cur)
+                conn.commit()
+                folded += n
+                if n == 0:
+                    break
+            print(f"Folded {folded} movements")
+            if args.prune_days is not None:
+                pruned = 0
+                while True:
+                    n = prune(cur, args.prune_days)
+                    conn.commit()
+                    pruned += n
+                    if n == 0:
+                        break
+                print(f"Pruned {pruned} movements")
+        elif args.cmd == "stock":
+            at = datetime.fromisoformat(args.at) if args.at else None
+            print(stock_at(cur, args.book_id, at))
+        elif args.cmd == "audit":
+            mismatches = 0
+            for m in audit(cur):
+                mismatches += 1
+                print(m)
+            print(f"{mismatches} books disagree with the ledger")
+    finally:
+        cur.close()
+        conn.close()
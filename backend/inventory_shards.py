@@ -0,0 +1,368 @@
+# backend/inventory_shards.py
+"""
+Optional counter sharding for hot titles.
+
+A sharded book keeps its stock in N rows of inventory_shards (one per slot)
+instead of its single inventory row, and inventory.shard_count = N.  Each
+reservation picks a random slot and falls back to sweeping the others, so
+concurrent orders for the same title mostly lock different rows.
+
+For sharded books inventory.available_copies / total_copies become a cached
+sum of the slots.  They are refreshed by sync(): stock writes only mark the
+book dirty, and a background thread syncs the dirty books every
+SHARD_SYNC_SECONDS (off the request path) and, once the new sums are
+committed, invalidates the cached catalog/detail reads of those books;
+enable/disable/rebalance write the sums directly.
+
+Tooling (works while the book is live; each command is one transaction):
+
+    python inventory_shards.py enable <book_id> <slots>
+    python inventory_shards.py disable <book_id>
+    python inventory_shards.py rebalance <book_id> [slots]
+    python inventory_shards.py sync [book_id ...]
+    python inventory_shards.py status
+
+Workers cache the set of sharded books for SHARD_CACHE_SECONDS; a
+reservation routed with a stale view fails its guard, refreshes the cache
+and retries once (see inventory.reserve_many).  Callers of set_slots() call
+forget_sharded() after their commit so this process reloads it at once.
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+from database import get_db_connection
+from query_cache import bump, on_bump
+
+MAX_SLOTS = 64
+SHARD_CACHE_SECONDS = float(os.getenv("SHARD_CACHE_SECONDS", 5))
+SHARD_SYNC_SECONDS = float(os.getenv("SHARD_SYNC_SECONDS", 2))
+
+_lock = threading.Lock()
+_sharded = {}          # book_id -> shard_count
+_sharded_loaded_at = None
+_dirty = set()         # sharded book ids written since the last sync
+_syncer_started = False
+
+
+# ============================================================
+# ROUTING (which books are sharded)
+# ============================================================
+
+def sharded_books(cur, refresh=False):
+    """{book_id: shard_count} for every sharded book (cached per process)."""
+    global _sharded, _sharded_loaded_at
+    now = time.monotonic()
+    if (not refresh and _sharded_loaded_at is not None
+            and now - _sharded_loaded_at < SHARD_CACHE_SECONDS):
+        return _sharded
+
+    # Plain consistent read: takes no row locks
+    cur.execute("""
+        SELECT book_id, shard_count
+        FROM inventory
+        WHERE shard_count > 0
+    """)
+    with _lock:
+        _sharded = {r["book_id"]: r["shard_count"] for r in cur.fetchall()}
+        _sharded_loaded_at = now
+    return _sharded
+
+
+def forget_sharded():
+    """Reload the sharded-book set on next use (after committing set_slots)."""
+    global _sharded_loaded_at
+    with _lock:
+        _sharded_loaded_at = None
+
+
+# ============================================================
+# RESERVE / RELEASE ON SLOTS
+# ============================================================
+
+def _slot_order(shard_count):
+    start = random.randrange(shard_count)
+    return [(start + i) % shard_count for i in range(shard_count)]
+
+
+def reserve_sharded(cur, book_id, n, sold, shard_count):
+    """
+    Take `n` copies from the book's slots (the first `sold` of them also
+    leave total_copies).  Each copy tries a random slot first and then
+    sweeps the rest.  Returns False if the slots run out; the caller must
+    roll back whatever was taken.
+    """
+    for copy in range(n):
+        consume_total = 1 if copy < sold else 0
+        for slot in _slot_order(shard_count):
+            cur.execute("""
+                UPDATE inventory_shards
+                SET available_copies = available_copies - 1,
+                    total_copies = total_copies - %s
+                WHERE book_id = %s AND slot = %s AND available_copies >= 1
+            """, (consume_total, book_id, slot))
+            if cur.rowcount == 1:
+                break
+        else:
+            return False
+    return True
+
+
+def add_to_random_slot(cur, book_id, available, total, shard_count):
+    """Add copies to one random slot (returns, manager increments)."""
+    cur.execute("""
+        UPDATE inventory_shards
+        SET available_copies = available_copies + %s,
+            total_copies = total_copies + %s
+        WHERE book_id = %s AND slot = %s
+    """, (available, total, book_id, random.randrange(shard_count)))
+    return cur.rowcount == 1
+
+
+# ============================================================
+# CACHED SUMS
+# ============================================================
+
+def sync(cur, book_ids=None):
+    """Write SUM(slots) into the inventory rows of sharded books."""
+    filter_clause = ""
+    params = []
+    if book_ids:
+        filter_clause = f"WHERE book_id IN ({','.join(['%s'] * len(book_ids))})"
+        params = list(book_ids)
+
+    cur.execute(f"""
+        UPDATE inventory i
+        JOIN (
+            SELECT book_id,
+                   SUM(available_copies) AS available,
+                   SUM(total_copies) AS total
+            FROM inventory_shards
+            {filter_clause}
+            GROUP BY book_id
+        ) s ON s.book_id = i.book_id
+        SET i.available_copies = s.available,
+            i.total_copies = s.total
+        WHERE i.shard_count > 0
+    """, params)
+
+
+def _sync_loop():
+    while True:
+        time.sleep(SHARD_SYNC_SECONDS)
+        with _lock:
+            due = list(_dirty)
+            _dirty.clear()
+        if not due:
+            continue
+
+        conn = None
+        cur = None
+        try:
+            conn = get_db_connection()
+            cur = conn.cursor(dictionary=True)
+            sync(cur, due)
+            conn.commit()
+            # reads between the write and this commit cached the old sums.
+            # No ("inventory", id) keys here: _mark_dirty would queue them again
+            bump("books", *[("book", book_id) for book_id in due])
+        except Exception as e:
+            print("[SHARD SYNC ERROR]", e)
+            with _lock:
+                _dirty.update(due)   # try again next round
+        finally:
+            if cur: cur.close()
+            if conn: conn.close()
+
+
+def _mark_dirty(keys):
+    """on_bump listener: queue written sharded books for the sync thread."""
+    global _syncer_started
+    written = [
+        key[1] for key in keys
+        if isinstance(key, tuple) and key[0] == "inventory" and key[1] in _sharded
+    ]
+    if not written:
+        return
+
+    with _lock:
+        _dirty.update(written)
+        if _syncer_started:
+            return
+        _syncer_started = True
+    threading.Thread(target=_sync_loop, name="shard-sync", daemon=True).start()
+
+
+on_bump(_mark_dirty)
+
+
+# ============================================================
+# TOOLING: ENABLE / DISABLE / REBALANCE
+# ============================================================
+
+def _split(value, slots):
+    base, extra = divmod(value, slots)
+    return [base + (1 if i < extra else 0) for i in range(slots)]
+
+
+def _write_slots(cur, book_id, available, total, slots):
+    cur.execute("DELETE FROM inventory_shards WHERE book_id = %s", (book_id,))
+    rows = []
+    for slot, (a, t) in enumerate(zip(_split(available, slots), _split(total, slots))):
+        rows += [book_id, slot, a, t]
+    cur.execute(f"""
+        INSERT INTO inventory_shards (book_id, slot, available_copies, total_copies)
+        VALUES {",".join(["(%s, %s, %s, %s)"] * slots)}
+    """, rows)
+
+
+def _lock_book(cur, book_id):
+    cur.execute("""
+        SELECT total_copies, available_copies, shard_count
+        FROM inventory
+        WHERE book_id = %s
+        FOR UPDATE
+    """, (book_id,))
+    inv = cur.fetchone()
+    if not inv:
+        raise ValueError(f"Book {book_id} has no inventory row")
+    return inv
+
+
+def _lock_slot_totals(cur, book_id):
+    cur.execute("""
+        SELECT slot, available_copies, total_copies
+        FROM inventory_shards
+        WHERE book_id = %s
+        ORDER BY slot
+        FOR UPDATE
+    """, (book_id,))
+    rows = cur.fetchall()
+    return (sum(r["available_copies"] for r in rows),
+            sum(r["total_copies"] for r in rows))
+
+
+def lock_stock(cur, book_id):
+    """
+    Lock a book's inventory row and, if sharded, every slot; returns its
+    current (available, total).  Reservations on the book wait for the
+    caller's transaction.
+    """
+    inv = _lock_book(cur, book_id)
+    if inv["shard_count"] > 0:
+        return _lock_slot_totals(cur, book_id)
+    return inv["available_copies"], inv["total_copies"]
+
+
+def set_slots(cur, book_id, slots, available=None, total=None):
+    """
+    Shard a book over `slots` rows (0 turns sharding off), keeping its
+    current stock unless `available` / `total` are given.  Locks the
+    inventory row and every slot, so in-flight reservations finish first.
+    Returns the stock before the change as (available, total).
+    """
+    if not 0 <= slots <= MAX_SLOTS:
+        raise ValueError(f"slots must be between 0 and {MAX_SLOTS}")
+
+    inv = _lock_book(cur, book_id)
+    if inv["shard_count"] > 0:
+        cur_available, cur_total = _lock_slot_totals(cur, book_id)
+    else:
+        cur_available, cur_total = inv["available_copies"], inv["total_copies"]
+
+    available = cur_available if available is None else available
+    total = cur_total if total is None else total
+
+    if slots == 0:
+        cur.execute("DELETE FROM inventory_shards WHERE book_id = %s", (book_id,))
+    else:
+        _write_slots(cur, book_id, available, total, slots)
+
+    cur.execute("""
+        UPDATE inventory
+        SET shard_count = %s,
+            available_copies = %s,
+            total_copies = %s
+        WHERE book_id = %s
+    """, (slots, available, total, book_id))
+    return cur_available, cur_total
+
+
+def set_counts(cur, book_id, available, total):
+    """
+    Set absolute stock for a book, spreading it over its slots if sharded.
+    Returns the previous (available, total).
+    """
+    inv = _lock_book(cur, book_id)
+    return set_slots(cur, book_id, inv["shard_count"], available, total)
+
+
+def _run(action, *args):
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(dictionary=True)
+        result = action(cur, *args)
+        conn.commit()
+        forget_sharded()
+        return result
+    except Exception:
+        if conn: conn.rollback()
+        raise
+    finally:
+        if cur: cur.close()
+        if conn: conn.close()
+
+
+def _rebalance(cur, book_id, slots=None):
+    inv = _lock_book(cur, book_id)
+    if inv["shard_count"] == 0:
+        raise ValueError(f"Book {book_id} is not sharded")
+    set_slots(cur, book_id, slots or inv["shard_count"])
+
+
+def _status(cur):
+    cur.execute("""
+        SELECT i.book_id, i.shard_count,
+               i.available_copies AS cached_available,
+               SUM(s.available_copies) AS available,
+               SUM(s.total_copies) AS total,
+               MIN(s.available_copies) AS min_slot,
+               MAX(s.available_copies) AS max_slot
+        FROM inventory i
+        JOIN inventory_shards s ON s.book_id = i.book_id
+        WHERE i.shard_count > 0
+        GROUP BY i.book_id, i.shard_count, i.available_copies
+        ORDER BY i.book_id
+    """)
+    return cur.fetchall()
+
+
+if __name__ == "__main__":
+    usage = "usage: python inventory_shards.py enable|disable|rebalance|sync|status ..."
+    if len(sys.argv) < 2:
+        print(usage)
+        sys.exit(1)
+
+    cmd, args = sys.argv[1], [int(a) for a in sys.argv[2:]]
+    if cmd == "enable" and len(args) == 2:
+        _run(set_slots, args[0], args[1])
+        print(f"Book {args[0]} sharded over {args[1]} slots")
+    elif cmd == "disable" and len(args) == 1:
+        _run(set_slots, args[0], 0)
+        print(f"Book {args[0]} unsharded")
+    elif cmd == "rebalance" and len(args) in (1, 2):
+        _run(_rebalance, *args)
+        print(f"Book {args[0]} rebalanced")
+    elif cmd == "sync":
+        _run(sync, args or None)
+        print("Cached availability refreshed")
+    elif cmd == "status":
+        for row in _run(_status):
+            print(row)
+    else:
+        print(usage)
+        sys.exit(1)
@@ -4,8 +4,23 @@
 
 from flask import request, jsonify
 from database import get_db_connection
-from datetime import datetime
-from auth_middleware import require_manager
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from auth_middleware import require_manager, get_current_user_id
+from query_cache import catalog_queries, current_generation, bump, bump_books
+from reviews import (
+    fetch_review_page, parse_page_size, review_total, search_reviews,
+    boolean_query, encode_cursor, decode_cursor, FT_MIN_TOKEN
+)
+from book_stats import HISTOGRAM_COLUMNS, pop_histogram
+from book_cache import book_details
+from inventory import reserve, release, adjust
+from inventory_shards import MAX_SLOTS, forget_sharded, set_counts, set_slots
+from inventory_ledger import append, movement, stock_at, movements_between
+from catalog_import import DEFAULT_COPIES, parse_records, run_import
+from idempotency import (
+    request_key, fingerprint, claim, record, replay, maybe_sweep, IdempotencyError
+)
 
 
 def init_manager_routes(app):
@@ -27,56 +42,109 @@ def init_manager_routes(app):
     # ORDERS: LIST + UPDATE STATUS
     # ============================================================
 
+    def _order_filter(args):
+        """
+        WHERE terms and params for the orders filters (status, customer,
+        since, until) in `args`; the query must join users as u.
+        Raises ValueError on bad input.
+        """
+        status = args.get("status") or None
+        customer = str(args.get("customer") or "").strip()
+
+        if status and status not in ("Paid", "Pending"):
+            raise ValueError("status must be 'Paid' or 'Pending'")
+
+        where = []
+        params = []
+        if status:
+            where.append("o.payment_status = %s")
+            params.append(status)
+        if customer.isdigit():
+            where.append("o.user_id = %s")
+            params.append(int(customer))
+        elif customer:
+            where.append("u.username LIKE %s")
+            params.append(customer.replace("%", r"\%").replace("_", r"\_") + "%")
+        try:
+            since = args.get("since") or None
+            until = args.get("until") or None
+            if since:
+                where.append("o.created_at >= %s")
+                params.append(datetime.strptime(since, "%Y-%m-%d"))
+            if until:
+                where.append("o.created_at < %s")
+                params.append(datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid date (use YYYY-MM-DD)")
+        return where, params
+
     @app.route("/api/manager/orders", methods=["GET"])
     @require_manager
     def manager_list_orders():
-        """Returns all orders w/ customer username + items."""
+        """
+        One page of orders, newest first, keyset-paginated on (created_at, id).
+        Query params:
+            status          Paid | Pending
+            customer        user id, or username prefix
+            since / until   YYYY-MM-DD (inclusive)
+            limit           page size (default 50, max 200)
+            cursor          next_cursor from the previous page
+            include_items   1 to embed items (otherwise fetch them per order
+                            from /api/manager/orders/<id>/items)
+        Returns {"orders": [...], "next_cursor": str | None}.
+        """
+        cursor_token = request.args.get("cursor") or None
+        include_items = request.args.get("include_items") == "1"
+        limit = parse_page_size(request.args.get("limit"), default=50, maximum=200)
+
+        try:
+            where, params = _order_filter(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if cursor_token:
+            try:
+                created_at, last_id = decode_cursor(cursor_token)
+            except ValueError:
+                return jsonify({"error": "Invalid cursor"}), 400
+            where.append("(o.created_at < %s OR (o.created_at = %s AND o.id < %s))")
+            params += [created_at, created_at, last_id]
+
+        where_clause = ("WHERE " + " AND ".join(where)) if where else ""
+
         conn = None
         cursor = None
         try:
             conn = get_db_connection()
             cursor = conn.cursor(dictionary=True)
 
-            cursor.execute("""
+            # idx_orders_created / idx_orders_status_created serve the
+            # ORDER BY, so each page reads about `limit` rows
+            cursor.execute(f"""
                 SELECT o.id, o.user_id, u.username AS customer_username,
                        o.total_price, o.payment_status, o.created_at
                 FROM orders o
                 JOIN users u ON o.user_id = u.id
-                ORDER BY o.created_at DESC
-            """)
+                {where_clause}
+                ORDER BY o.created_at DESC, o.id DESC
+                LIMIT %s
+            """, params + [limit + 1])
             orders = cursor.fetchall()
 
-            if orders:
-                ids = [o["id"] for o in orders]
-                fmt = ",".join(["%s"] * len(ids))
-
-                cursor.execute(f"""
-                    SELECT oi.order_id, oi.book_id, b.title, b.author,
-                           oi.type, oi.price
-                    FROM order_items oi
-                    JOIN books b ON oi.book_id = b.id
-                    WHERE oi.order_id IN ({fmt})
-                    ORDER BY oi.order_id
-                """, ids)
-                item_rows = cursor.fetchall()
-            else:
-                item_rows = []
-
-            items_by_order = {}
-            for row in item_rows:
-                items_by_order.setdefault(row["order_id"], []).append({
-                    "book_id": row["book_id"],
-                    "title": row["title"],
-                    "author": row["author"],
-                    "type": row["type"],
-                    "price": float(row["price"])
-                })
+            next_cursor = None
+            if len(orders) > limit:
+                orders = orders[:limit]
+                last = orders[-1]
+                next_cursor = encode_cursor(last["created_at"], last["id"])
 
             for o in orders:
                 o["total_price"] = float(o["total_price"])
-                o["items"] = items_by_order.get(o["id"], [])
 
-            return jsonify(orders), 200
+            if include_items and orders:
+                items_by_order = _order_items(cursor, [o["id"] for o in orders])
+                for o in orders:
+                    o["items"] = items_by_order.get(o["id"], [])
+
+            return jsonify({"orders": orders, "next_cursor": next_cursor}), 200
 
         except Exception as e:
             print("[MANAGER LIST ORDERS ERROR]", e)
@@ -85,6 +153,47 @@ def init_manager_routes(app):
             _safe_close(cursor, conn)
 
 
+    def _order_items(cursor, order_ids):
+        """{order_id: [item, ...]} from the title/author snapshots."""
+        fmt = ",".join(["%s"] * len(order_ids))
+        cursor.execute(f"""
+            SELECT oi.order_id, oi.book_id, oi.title, oi.author,
+                   oi.type, oi.price
+            FROM order_items oi
+            WHERE oi.order_id IN ({fmt})
+            ORDER BY oi.order_id, oi.id
+        """, list(order_ids))
+
+        items_by_order = {}
+        for row in cursor.fetchall():
+            items_by_order.setdefault(row["order_id"], []).append({
+                "book_id": row["book_id"],
+                "title": row["title"],
+                "author": row["author"],
+                "type": row["type"],
+                "price": float(row["price"])
+            })
+        return items_by_order
+
+
+    @app.route("/api/manager/orders/<int:order_id>/items", methods=["GET"])
+    @require_manager
+    def manager_order_items(order_id):
+        """Items of one order (lazy expansion for the orders page)."""
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            return jsonify(_order_items(cursor, [order_id]).get(order_id, [])), 200
+
+        except Exception as e:
+            print("[MANAGER ORDER ITEMS ERROR]", e)
+            return jsonify({"error": "Error loading order items"}), 500
+        finally:
+            _safe_close(cursor, conn)
+
+
     @app.route("/api/manager/orders/<int:order_id>/status", methods=["PATCH"])
     @require_manager
     def manager_update_order_status(order_id):
@@ -121,6 +230,154 @@ def init_manager_routes(app):
             _safe_close(cursor, conn)
 
 
+    BULK_STATUS_CHUNK = 1000
+    BULK_STATUS_MAX_IDS = 10000
+
+    @app.route("/api/manager/orders/status", methods=["PATCH"])
+    @require_manager
+    def manager_bulk_order_status():
+        """
+        Set payment_status on many orders at once.
+        Body: {"payment_status": "Paid" | "Pending", and either
+               "order_ids": [...]                       (max 10000), or
+               "filter": {status, customer, since, until}  (same as listing)
+                         plus optional "max" (default and cap 10000)}
+
+        An id list is applied in one transaction, BULK_STATUS_CHUNK ids per
+        UPDATE.  A filter is walked in id order and committed per chunk, so
+        a large backlog never holds its locks for long; one call changes at
+        most `max` orders and reports "more": true if matching orders remain
+        (call again to continue).
+        Returns {"payment_status", "results": [{"id", "result"}], "updated",
+        "unchanged", "not_found", "more"}; result is updated | unchanged |
+        not_found.  With a filter, only the orders that changed are listed.
+        """
+        data = request.get_json(silent=True) or {}
+        status = data.get("payment_status")
+        order_ids = data.get("order_ids")
+        filters = data.get("filter")
+
+        if status not in ("Paid", "Pending"):
+            return jsonify({"error": "payment_status must be 'Paid' or 'Pending'"}), 400
+        if (order_ids is None) == (filters is None):
+            return jsonify({"error": "Provide either order_ids or filter"}), 400
+
+        if order_ids is not None:
+            if (not isinstance(order_ids, list) or not order_ids
+                    or not all(isinstance(i, int) and not isinstance(i, bool) for i in order_ids)):
+                return jsonify({"error": "order_ids must be a non-empty list of integers"}), 400
+            order_ids = list(dict.fromkeys(order_ids))
+            if len(order_ids) > BULK_STATUS_MAX_IDS:
+                return jsonify({"error": f"At most {BULK_STATUS_MAX_IDS} order ids per request"}), 400
+        else:
+            if not isinstance(filters, dict):
+                return jsonify({"error": "filter must be an object"}), 400
+            max_updates = filters.get("max", BULK_STATUS_MAX_IDS)
+            if (not isinstance(max_updates, int) or isinstance(max_updates, bool)
+                    or not 1 <= max_updates <= BULK_STATUS_MAX_IDS):
+                return jsonify({"error": f"max must be between 1 and {BULK_STATUS_MAX_IDS}"}), 400
+            try:
+                where, params = _order_filter(filters)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if not where:
+                return jsonify({"error": "filter must restrict at least one field"}), 400
+
+        results = []
+        more = False
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+
+            if order_ids is not None:
+                for i in range(0, len(order_ids), BULK_STATUS_CHUNK):
+                    chunk = order_ids[i:i + BULK_STATUS_CHUNK]
+                    fmt = ",".join(["%s"] * len(chunk))
+                    cursor.execute(f"""
+                        SELECT id, payment_status FROM orders
+                        WHERE id IN ({fmt})
+                        FOR UPDATE
+                    """, chunk)
+                    current = {r["id"]: r["payment_status"] for r in cursor.fetchall()}
+
+                    changing = [oid for oid in chunk if current.get(oid) not in (None, status)]
+                    if changing:
+                        cursor.execute(f"""
+                            UPDATE orders SET payment_status = %s
+                            WHERE id IN ({",".join(["%s"] * len(changing))})
+                        """, [status] + changing)
+
+                    for oid in chunk:
+                        if oid not in current:
+                            results.append({"id": oid, "result": "not_found"})
+                        elif current[oid] == status:
+                            results.append({"id": oid, "result": "unchanged"})
+                        else:
+                            results.append({"id": oid, "result": "updated"})
+                conn.commit()
+
+            else:
+                last_id = 0
+                while True:
+                    room = max_updates - len(results)
+                    if room == 0:
+                        # anything left is reported, not changed
+                        cursor.execute(f"""
+                            SELECT 1 FROM orders o
+                            JOIN users u ON o.user_id = u.id
+                            WHERE {" AND ".join(where)}
+                              AND o.payment_status <> %s
+                              AND o.id > %s
+                            LIMIT 1
+                        """, params + [status, last_id])
+                        more = cursor.fetchone() is not None
+                        break
+
+                    cursor.execute(f"""
+                        SELECT o.id
+                        FROM orders o
+                        JOIN users u ON o.user_id = u.id
+                        WHERE {" AND ".join(where)}
+                          AND o.payment_status <> %s
+                          AND o.id > %s
+                        ORDER BY o.id
+                        LIMIT %s
+                        FOR UPDATE
+                    """, params + [status, last_id, min(BULK_STATUS_CHUNK, room)])
+                    chunk = [r["id"] for r in cursor.fetchall()]
+                    if not chunk:
+                        break
+
+                    cursor.execute(f"""
+                        UPDATE orders SET payment_status = %s
+                        WHERE id IN ({",".join(["%s"] * len(chunk))})
+                    """, [status] + chunk)
+                    conn.commit()
+
+                    results += [{"id": oid, "result": "updated"} for oid in chunk]
+                    last_id = chunk[-1]
+
+            counts = {"updated": 0, "unchanged": 0, "not_found": 0}
+            for r in results:
+                counts[r["result"]] += 1
+            return jsonify({"payment_status": status, "results": results,
+                            "more": more, **counts}), 200
+
+        except Exception as e:
+            print("[MANAGER BULK ORDER STATUS ERROR]", e)
+            if conn:
+                conn.rollback()
+            # filter mode commits per chunk; report what already went through
+            return jsonify({
+                "error": "Error updating orders",
+                "results": results if order_ids is None else []
+            }), 500
+        finally:
+            _safe_close(cursor, conn)
+
+
     # ============================================================
     # BOOKS — SEARCH / LIST
     # ============================================================
@@ -152,6 +409,12 @@ def init_manager_routes(app):
         if where_clause:
             where_clause = "WHERE " + where_clause
 
+        cache_key = ("manager_books", q.lower(), genre.lower(), year)
+        cached = catalog_queries.get(cache_key)
+        if cached is not None:
+            return jsonify(cached), 200
+        generation = current_generation()
+
         conn = None
         cursor = None
         try:
@@ -163,16 +426,11 @@ def init_manager_routes(app):
                     b.genre, b.publication_year, b.created_at,
                     COALESCE(inv.total_copies, 0) AS total_copies,
                     COALESCE(inv.available_copies, 0) AS available_copies,
-                    COALESCE((
-                        SELECT AVG(r.rating) FROM reviews r
-                        WHERE r.book_id = b.id
-                    ), 0) AS avg_rating,
-                    COALESCE((
-                        SELECT COUNT(*) FROM reviews r
-                        WHERE r.book_id = b.id
-                    ), 0) AS review_count
+                    COALESCE(bs.avg_rating, 0) AS avg_rating,
+                    COALESCE(bs.rating_count, 0) AS review_count
                 FROM books b
                 LEFT JOIN inventory inv ON inv.book_id = b.id
+                LEFT JOIN book_stats bs ON bs.book_id = b.id
                 {where_clause}
                 ORDER BY b.created_at DESC
             """, params)
@@ -185,6 +443,12 @@ def init_manager_routes(app):
                 row["avg_rating"] = float(row["avg_rating"])
                 row["review_count"] = int(row.get("review_count", 0))
 
+            catalog_queries.put(
+                cache_key, rows, generation,
+                ["books"]
+                + [("inventory", r["id"]) for r in rows]
+                + [("reviews", r["id"]) for r in rows]
+            )
             return jsonify(rows), 200
 
         except Exception as e:
@@ -201,37 +465,41 @@ def init_manager_routes(app):
     @app.route("/api/manager/books/<int:book_id>/details", methods=["GET"])
     @require_manager
     def manager_book_details(book_id):
+        """Book row + inventory + rating stats (served from the book cache)."""
+        hit, book = book_details.get("manager", book_id)
+        if hit:
+            if book is None:
+                return jsonify({"error": "Book not found"}), 404
+            return jsonify(book), 200
 
+        generation = current_generation()
         conn = None
         cursor = None
         try:
             conn = get_db_connection()
             cursor = conn.cursor(dictionary=True)
 
-            cursor.execute("""
-                SELECT b.*, inv.total_copies, inv.available_copies
+            cursor.execute(f"""
+                SELECT b.*, inv.total_copies, inv.available_copies,
+                       bs.avg_rating,
+                       COALESCE(bs.rating_count, 0) AS review_count,
+                       {HISTOGRAM_COLUMNS}
                 FROM books b
                 LEFT JOIN inventory inv ON inv.book_id = b.id
+                LEFT JOIN book_stats bs ON bs.book_id = b.id
                 WHERE b.id = %s
             """, (book_id,))
             book = cursor.fetchone()
 
             if not book:
+                book_details.put("manager", book_id, None, generation)
                 return jsonify({"error": "Book not found"}), 404
 
-            # Get average rating and review count
-            cursor.execute("""
-                SELECT ROUND(AVG(rating), 1) AS avg_rating,
-                       COUNT(*) AS review_count
-                FROM reviews
-                WHERE book_id = %s
-            """, (book_id,))
-            stats = cursor.fetchone()
-
-            book["avg_rating"] = float(stats["avg_rating"]) if stats["avg_rating"] else None
-            book["review_count"] = stats["review_count"]
+            book["avg_rating"] = float(book["avg_rating"]) if book["avg_rating"] else None
+            book["review_count"] = int(book["review_count"])
+            book["rating_histogram"] = pop_histogram(book)
 
-            return jsonify(book), 200
+            return jsonify(book_details.put("manager", book_id, book, generation)), 200
 
         except Exception as e:
             print("[MANAGER BOOK DETAILS ERROR]", e)
@@ -240,30 +508,90 @@ def init_manager_routes(app):
             _safe_close(cursor, conn)
 
 
+    @app.route("/api/manager/books/rating-histograms", methods=["GET"])
+    @require_manager
+    def manager_rating_histograms():
+        """
+        Star distributions for many books at once (books table).
+        Query: ids=1,2,3 (max 500)
+        Returns: [{ book_id, avg_rating, review_count, rating_histogram }]
+        """
+        try:
+            ids = list(dict.fromkeys(
+                int(p) for p in (request.args.get("ids") or "").split(",") if p.strip()
+            ))
+        except ValueError:
+            return jsonify({"error": "ids must be integers"}), 400
+
+        if not ids:
+            return jsonify({"error": "ids required"}), 400
+        if len(ids) > 500:
+            return jsonify({"error": "At most 500 ids per request"}), 400
+
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+
+            fmt = ",".join(["%s"] * len(ids))
+            cursor.execute(f"""
+                SELECT bs.book_id, bs.avg_rating, bs.rating_count,
+                       {HISTOGRAM_COLUMNS}
+                FROM book_stats bs
+                WHERE bs.book_id IN ({fmt})
+            """, ids)
+            found = {row["book_id"]: row for row in cursor.fetchall()}
+
+            result = []
+            for book_id in ids:
+                row = found.get(book_id)
+                if row:
+                    histogram = pop_histogram(row)
+                    avg = float(row["avg_rating"]) if row["avg_rating"] else None
+                    count = int(row["rating_count"])
+                else:
+                    histogram = {str(star): 0 for star in range(1, 6)}
+                    avg, count = None, 0
+                result.append({
+                    "book_id": book_id,
+                    "avg_rating": avg,
+                    "review_count": count,
+                    "rating_histogram": histogram
+                })
+
+            return jsonify(result), 200
+
+        except Exception as e:
+            print("[MANAGER RATING HISTOGRAMS ERROR]", e)
+            return jsonify({"error": "Error loading rating histograms"}), 500
+        finally:
+            _safe_close(cursor, conn)
+
+
     @app.route("/api/manager/books/<int:book_id>/reviews", methods=["GET"])
     @require_manager
     def manager_book_reviews(book_id):
-        """Return all reviews for this book."""
+        """One page of reviews for this book (limit, cursor)."""
+        limit = parse_page_size(request.args.get("limit"))
+        page_cursor = request.args.get("cursor") or None
+
         conn = None
         cursor = None
         try:
             conn = get_db_connection()
             cursor = conn.cursor(dictionary=True)
 
-            cursor.execute("""
-                SELECT r.id, r.rating, r.review_text, r.created_at,
-                       u.username
-                FROM reviews r
-                JOIN users u ON r.user_id = u.id
-                WHERE r.book_id = %s
-                ORDER BY r.created_at DESC
-            """, (book_id,))
+            reviews, next_cursor = fetch_review_page(cursor, book_id, limit, page_cursor)
 
-            reviews = cursor.fetchall()
-            for r in reviews:
-                r["rating"] = int(r["rating"])
+            return jsonify({
+                "reviews": reviews,
+                "next_cursor": next_cursor,
+                "total": review_total(cursor, book_id)
+            }), 200
 
-            return jsonify(reviews), 200
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
 
         except Exception as e:
             print("[MANAGER REVIEWS ERROR]", e)
@@ -272,6 +600,63 @@ def init_manager_routes(app):
             _safe_close(cursor, conn)
 
 
+    # ============================================================
+    # REVIEWS — CATALOG-WIDE SEARCH
+    # ============================================================
+
+    @app.route("/api/manager/reviews/search", methods=["GET"])
+    @require_manager
+    def manager_search_reviews():
+        """
+        Search all reviews.
+        Query: q (keywords), min_rating, max_rating,
+               since / until (YYYY-MM-DD, inclusive), limit, cursor
+        Returns: { "reviews": [...], "next_cursor": str|null }
+        """
+        q = request.args.get("q", "").strip()
+        limit = parse_page_size(request.args.get("limit"))
+        page_cursor = request.args.get("cursor") or None
+
+        try:
+            min_rating = request.args.get("min_rating", type=int)
+            max_rating = request.args.get("max_rating", type=int)
+            since = request.args.get("since") or None
+            until = request.args.get("until") or None
+            if since:
+                since = datetime.strptime(since, "%Y-%m-%d")
+            if until:
+                # inclusive: everything before the start of the next day
+                until = datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1)
+        except ValueError:
+            return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+
+        if q and not boolean_query(q):
+            return jsonify({
+                "error": f"Search words must be at least {FT_MIN_TOKEN} characters"
+            }), 400
+
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+
+            hits, next_cursor = search_reviews(
+                cursor, q, min_rating, max_rating, since, until,
+                limit, page_cursor
+            )
+            return jsonify({"reviews": hits, "next_cursor": next_cursor}), 200
+
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+        except Exception as e:
+            print("[MANAGER REVIEW SEARCH ERROR]", e)
+            return jsonify({"error": "Error searching reviews"}), 500
+        finally:
+            _safe_close(cursor, conn)
+
+
     # ============================================================
     # BOOK UPDATE + INVENTORY
     # ============================================================
@@ -308,8 +693,11 @@ def init_manager_routes(app):
                 INSERT INTO inventory (book_id, total_copies, available_copies)
                 VALUES (%s, 10, 10)
             """, (book_id,))
+            append(cursor, [movement(book_id, "create", 10, 10, "book", book_id,
+                                     get_current_user_id())])
 
             conn.commit()
+            bump("books", ("book", book_id))
 
             return jsonify({
                 "id": book_id,
@@ -327,6 +715,48 @@ def init_manager_routes(app):
             _safe_close(cursor, conn)
 
 
+    @app.route("/api/manager/books/import", methods=["POST"])
+    @require_manager
+    def manager_import_books():
+        """
+        Bulk import a CSV or NDJSON catalog sent as the raw request body
+        (see catalog_import.py for fields and batching).
+        Query params: format=csv|ndjson, copies (default 10), skip=N to
+        resume after record N.  Returns the import summary; on failure,
+        last_record is the last committed record to resume from.
+        """
+        fmt = request.args.get("format", "csv")
+        if fmt not in ("csv", "ndjson"):
+            return jsonify({"error": "format must be 'csv' or 'ndjson'"}), 400
+        try:
+            skip = int(request.args.get("skip", 0))
+            copies = int(request.args.get("copies", DEFAULT_COPIES))
+        except ValueError:
+            return jsonify({"error": "skip and copies must be integers"}), 400
+        if skip < 0 or copies < 0:
+            return jsonify({"error": "skip and copies must not be negative"}), 400
+
+        progress = {"last_record": skip}
+        conn = None
+        try:
+            conn = get_db_connection()
+            summary = run_import(
+                conn, parse_records(request.stream, fmt),
+                copies=copies, skip=skip, actor_id=get_current_user_id(),
+                on_batch=lambda s: progress.update(last_record=s["last_record"])
+            )
+            return jsonify(summary), 200
+
+        except Exception as e:
+            print("[MANAGER IMPORT BOOKS ERROR]", e)
+            return jsonify({
+                "error": "Error importing books",
+                "last_record": progress["last_record"]
+            }), 500
+        finally:
+            _safe_close(None, conn)
+
+
     @app.route("/api/manager/books/<int:book_id>", methods=["PUT"])
     @require_manager
     def manager_update_book(book_id):
@@ -362,7 +792,7 @@ def init_manager_routes(app):
         cursor = None
         try:
             conn = get_db_connection()
-            cursor = conn.cursor()
+            cursor = conn.cursor(dictionary=True)
 
             # Ensure the book exists first. Relying on cursor.rowcount after an
             # UPDATE can be misleading (MySQL reports 0 affected rows when the
@@ -380,14 +810,16 @@ def init_manager_routes(app):
                 WHERE id=%s
             """, (title, author, pb, pr, genre, year, book_id))
 
-            cursor.execute("""
-                UPDATE inventory
-                SET total_copies = %s,
-                    available_copies = %s
-                WHERE book_id = %s
-            """, (total_copies, available_copies, book_id))
+            # spreads the counts over the slots if the book is sharded
+            old_available, old_total = set_counts(cursor, book_id,
+                                                  available_copies, total_copies)
+            append(cursor, [movement(book_id, "edit",
+                                     total_copies - old_total,
+                                     available_copies - old_available,
+                                     "book", book_id, get_current_user_id())])
 
             conn.commit()
+            bump("books", ("book", book_id), ("inventory", book_id))
             return jsonify({"message": "Book updated"}), 200
 
         except Exception as e:
@@ -408,25 +840,25 @@ def init_manager_routes(app):
 
         if inc is None:
             return jsonify({"error": "increment required"}), 400
+        try:
+            inc = int(inc)
+        except (TypeError, ValueError):
+            return jsonify({"error": "increment must be an integer"}), 400
 
         conn = None
         cursor = None
         try:
             conn = get_db_connection()
-            cursor = conn.cursor()
+            cursor = conn.cursor(dictionary=True)
 
             # increment total + available equally
-            cursor.execute("""
-                UPDATE inventory
-                SET total_copies = total_copies + %s,
-                    available_copies = available_copies + %s
-                WHERE book_id = %s
-            """, (inc, inc, book_id))
-
-            if cursor.rowcount == 0:
+            if not adjust(cursor, book_id, inc, inc):
                 return jsonify({"error": "Book not found"}), 404
+            append(cursor, [movement(book_id, "adjust", inc, inc,
+                                     "book", book_id, get_current_user_id())])
 
             conn.commit()
+            bump_books("inventory", [book_id])
             return jsonify({"message": "Inventory updated"}), 200
 
         except Exception as e:
@@ -438,6 +870,272 @@ def init_manager_routes(app):
             _safe_close(cursor, conn)
 
 
+    @app.route("/api/manager/books/<int:book_id>/inventory/shards", methods=["PATCH"])
+    @require_manager
+    def manager_set_inventory_shards(book_id):
+        """
+        Shard a hot title's stock over N slot rows, re-spread it evenly over
+        its current (or a new) slot count, or turn sharding off with 0.
+        Safe while the book is being ordered.
+        """
+        data = request.get_json(silent=True) or {}
+        try:
+            slots = int(data.get("slots"))
+        except (TypeError, ValueError):
+            return jsonify({"error": "slots must be an integer"}), 400
+
+        if not 0 <= slots <= MAX_SLOTS:
+            return jsonify({"error": f"slots must be between 0 and {MAX_SLOTS}"}), 400
+
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+
+            try:
+                set_slots(cursor, book_id, slots)
+            except ValueError:
+                conn.rollback()
+                return jsonify({"error": "Book not found"}), 404
+
+            conn.commit()
+            forget_sharded()
+            bump_books("inventory", [book_id])
+            return jsonify({"book_id": book_id, "shard_count": slots}), 200
+
+        except Exception as e:
+            print("[MANAGER INVENTORY SHARDS ERROR]", e)
+            if conn:
+                conn.rollback()
+            return jsonify({"error": "Error updating inventory shards"}), 500
+        finally:
+            _safe_close(cursor, conn)
+
+
+    @app.route("/api/manager/books/<int:book_id>/inventory/history", methods=["GET"])
+    @require_manager
+    def manager_inventory_history(book_id):
+        """
+        Stock audit from the movements ledger:
+            at     point in time for the stock figures (default now)
+            since / until  movement window (YYYY-MM-DD, inclusive)
+            limit  max movements returned (default 200, max 1000)
+        """
+        try:
+            at = request.args.get("at") or None
+            since = request.args.get("since") or None
+            until = request.args.get("until") or None
+            if at:
+                at = datetime.fromisoformat(at)
+            if since:
+                since = datetime.strptime(since, "%Y-%m-%d")
+            if until:
+                until = datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1)
+        except ValueError:
+            return jsonify({"error": "Invalid date"}), 400
+        limit = parse_page_size(request.args.get("limit"), default=200, maximum=1000)
+
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+
+            stock = stock_at(cursor, book_id, at)
+            movements = movements_between(cursor, book_id, since, until, limit)
+            return jsonify({"stock": stock, "movements": movements}), 200
+
+        except Exception as e:
+            print("[MANAGER INVENTORY HISTORY ERROR]", e)
+            return jsonify({"error": "Error loading inventory history"}), 500
+        finally:
+            _safe_close(cursor, conn)
+
+
+    # ============================================================
+    # BOOKS — BULK REPRICING
+    # ============================================================
+
+    REPRICE_CHUNK = 1000
+    REPRICE_MAX_IDS = 10000
+    REPRICE_SAMPLE = 20
+    MAX_PRICE = Decimal("999999.99")
+
+    def _reprice_rule(data):
+        """
+        (set_exprs, set_params, where, where_params) for a repricing rule;
+        raises ValueError on a bad rule.  set_exprs maps each price column
+        to its new-value expression (the column itself if not targeted).
+        """
+        target = data.get("target", "both")
+        if target not in ("price_buy", "price_rent", "both"):
+            raise ValueError("target must be 'price_buy', 'price_rent' or 'both'")
+        columns = ("price_buy", "price_rent") if target == "both" else (target,)
+
+        if ("percent" in data) == ("set" in data):
+            raise ValueError("Provide either percent or set")
+        try:
+            if "percent" in data:
+                percent = Decimal(str(data["percent"]))
+                if not percent.is_finite() or not Decimal(-100) <= percent <= Decimal(1000):
+                    raise ValueError
+                expr = "LEAST(GREATEST(ROUND(b.{col} * %s, 2), 0), 999999.99)"
+                value = 1 + percent / 100
+            else:
+                value = Decimal(str(data["set"])).quantize(Decimal("0.01"))
+                if not value.is_finite() or not 0 <= value <= MAX_PRICE:
+                    raise ValueError
+                expr = "%s"
+        except (InvalidOperation, ValueError):
+            raise ValueError("percent must be -100..1000 and set must be 0..999999.99")
+
+        set_exprs = {}
+        set_params = []
+        for col in ("price_buy", "price_rent"):
+            if col in columns:
+                set_exprs[col] = expr.format(col=col)
+                set_params.append(value)
+            else:
+                set_exprs[col] = f"b.{col}"
+
+        match = data.get("match") or {}
+        if not isinstance(match, dict):
+            raise ValueError("match must be an object")
+        where = []
+        params = []
+        if match.get("genre"):
+            where.append("b.genre = %s")
+            params.append(str(match["genre"]).strip())
+        if match.get("author"):
+            where.append("b.author = %s")
+            params.append(str(match["author"]).strip())
+        try:
+            if match.get("year_from") not in (None, ""):
+                where.append("b.publication_year >= %s")
+                params.append(int(match["year_from"]))
+            if match.get("year_to") not in (None, ""):
+                where.append("b.publication_year <= %s")
+                params.append(int(match["year_to"]))
+        except (TypeError, ValueError):
+            raise ValueError("year_from and year_to must be integers")
+        ids = match.get("ids")
+        if ids is not None:
+            if (not isinstance(ids, list) or not ids
+                    or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+                raise ValueError("ids must be a non-empty list of integers")
+            if len(ids) > REPRICE_MAX_IDS:
+                raise ValueError(f"At most {REPRICE_MAX_IDS} ids per rule")
+            where.append(f"b.id IN ({','.join(['%s'] * len(ids))})")
+            params += ids
+        if not where:
+            raise ValueError("match must name a genre, author, year range or ids")
+
+        return set_exprs, set_params, where, params
+
+
+    @app.route("/api/manager/books/reprice", methods=["POST"])
+    @require_manager
+    def manager_reprice_books():
+        """
+        Rule-based bulk price change.
+        Body: {"target": "price_buy" | "price_rent" | "both",
+               "percent": -10   or   "set": 9.99,
+               "match": {genre, author, year_from, year_to, ids},
+               "dry_run": true}
+        A dry run returns {"matched", "changed", "sample"} without writing.
+        Otherwise matching books are updated REPRICE_CHUNK ids per UPDATE and
+        transaction, with one cache invalidation per chunk; returns
+        {"matched", "updated", "batches"}.
+        """
+        data = request.get_json(silent=True) or {}
+        dry_run = bool(data.get("dry_run"))
+        try:
+            set_exprs, set_params, where, where_params = _reprice_rule(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        where_clause = " AND ".join(where)
+
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+
+            if dry_run:
+                cursor.execute(f"""
+                    SELECT COUNT(*) AS matched,
+                           COALESCE(SUM(new_buy <> price_buy OR new_rent <> price_rent), 0) AS changed
+                    FROM (
+                        SELECT b.price_buy, b.price_rent,
+                               {set_exprs["price_buy"]} AS new_buy,
+                               {set_exprs["price_rent"]} AS new_rent
+                        FROM books b
+                        WHERE {where_clause}
+                    ) t
+                """, set_params + where_params)
+                counts = cursor.fetchone()
+
+                cursor.execute(f"""
+                    SELECT b.id, b.title, b.author, b.price_buy, b.price_rent,
+                           {set_exprs["price_buy"]} AS new_price_buy,
+                           {set_exprs["price_rent"]} AS new_price_rent
+                    FROM books b
+                    WHERE {where_clause}
+                    ORDER BY b.id
+                    LIMIT %s
+                """, set_params + where_params + [REPRICE_SAMPLE])
+                sample = cursor.fetchall()
+                for row in sample:
+                    for col in ("price_buy", "price_rent", "new_price_buy", "new_price_rent"):
+                        row[col] = float(row[col])
+
+                return jsonify({
+                    "matched": int(counts["matched"]),
+                    "changed": int(counts["changed"]),
+                    "sample": sample
+                }), 200
+
+            matched = updated = batches = 0
+            last_id = 0
+            while True:
+                cursor.execute(f"""
+                    SELECT b.id FROM books b
+                    WHERE {where_clause} AND b.id > %s
+                    ORDER BY b.id
+                    LIMIT %s
+                """, where_params + [last_id, REPRICE_CHUNK])
+                chunk = [r["id"] for r in cursor.fetchall()]
+                if not chunk:
+                    break
+
+                # the rule is re-checked so books edited since the scan are skipped
+                cursor.execute(f"""
+                    UPDATE books b
+                    SET b.price_buy = {set_exprs["price_buy"]},
+                        b.price_rent = {set_exprs["price_rent"]}
+                    WHERE b.id IN ({",".join(["%s"] * len(chunk))})
+                      AND {where_clause}
+                """, set_params + chunk + where_params)
+                updated += cursor.rowcount
+                conn.commit()
+                bump("books", *[("book", book_id) for book_id in chunk])
+
+                matched += len(chunk)
+                batches += 1
+                last_id = chunk[-1]
+
+            return jsonify({"matched": matched, "updated": updated, "batches": batches}), 200
+
+        except Exception as e:
+            print("[MANAGER REPRICE BOOKS ERROR]", e)
+            if conn:
+                conn.rollback()
+            return jsonify({"error": "Error repricing books"}), 500
+        finally:
+            _safe_close(cursor, conn)
+
+
     # ============================================================
     # CUSTOMERS — SEARCH + PROFILE
     # ============================================================
@@ -479,6 +1177,102 @@ def init_manager_routes(app):
             _safe_close(cursor, conn)
 
 
+    @app.route("/api/manager/customers/summary", methods=["GET"])
+    @require_manager
+    def manager_customer_summaries():
+        """
+        One page of customers with their activity, newest first,
+        keyset-paginated on (created_at, id).
+        Query params: q (username/email contains), limit (default 50,
+        max 200), cursor (next_cursor from the previous page).
+        Each customer has order_count, active_rental_count, lifetime_spend
+        (sum of order totals) and last_order_at, from one grouped query over
+        the page's ids.  Returns {"customers": [...], "next_cursor"}.
+        """
+        q = request.args.get("q", "").strip()
+        cursor_token = request.args.get("cursor") or None
+        limit = parse_page_size(request.args.get("limit"), default=50, maximum=200)
+
+        where = ["role = 'customer'"]
+        params = []
+        if q:
+            where.append("(username LIKE %s OR email LIKE %s)")
+            params += [f"%{q}%", f"%{q}%"]
+        if cursor_token:
+            try:
+                created_at, last_id = decode_cursor(cursor_token)
+            except ValueError:
+                return jsonify({"error": "Invalid cursor"}), 400
+            where.append("(created_at < %s OR (created_at = %s AND id < %s))")
+            params += [created_at, created_at, last_id]
+
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+
+            # idx_users_role_created serves the ORDER BY
+            cursor.execute(f"""
+                SELECT id, username, email, created_at
+                FROM users
+                WHERE {" AND ".join(where)}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+            """, params + [limit + 1])
+            customers = cursor.fetchall()
+
+            next_cursor = None
+            if len(customers) > limit:
+                customers = customers[:limit]
+                last = customers[-1]
+                next_cursor = encode_cursor(last["created_at"], last["id"])
+
+            stats = {}
+            if customers:
+                ids = [c["id"] for c in customers]
+                fmt = ",".join(["%s"] * len(ids))
+                cursor.execute(f"""
+                    SELECT u.id,
+                           COALESCE(o.order_count, 0) AS order_count,
+                           COALESCE(o.lifetime_spend, 0) AS lifetime_spend,
+                           o.last_order_at,
+                           COALESCE(r.active_rental_count, 0) AS active_rental_count
+                    FROM users u
+                    LEFT JOIN (
+                        SELECT user_id, COUNT(*) AS order_count,
+                               SUM(total_price) AS lifetime_spend,
+                               MAX(created_at) AS last_order_at
+                        FROM orders
+                        WHERE user_id IN ({fmt})
+                        GROUP BY user_id
+                    ) o ON o.user_id = u.id
+                    LEFT JOIN (
+                        SELECT user_id, COUNT(*) AS active_rental_count
+                        FROM rentals
+                        WHERE user_id IN ({fmt}) AND returned_at IS NULL
+                        GROUP BY user_id
+                    ) r ON r.user_id = u.id
+                    WHERE u.id IN ({fmt})
+                """, ids * 3)
+                stats = {row["id"]: row for row in cursor.fetchall()}
+
+            for c in customers:
+                row = stats.get(c["id"], {})
+                c["order_count"] = int(row.get("order_count") or 0)
+                c["active_rental_count"] = int(row.get("active_rental_count") or 0)
+                c["lifetime_spend"] = float(row.get("lifetime_spend") or 0)
+                c["last_order_at"] = row.get("last_order_at")
+
+            return jsonify({"customers": customers, "next_cursor": next_cursor}), 200
+
+        except Exception as e:
+            print("[MANAGER CUSTOMER SUMMARY ERROR]", e)
+            return jsonify({"error": "Error loading customers"}), 500
+        finally:
+            _safe_close(cursor, conn)
+
+
     @app.route("/api/manager/customers/<int:customer_id>", methods=["GET"])
     @require_manager
     def manager_get_customer(customer_id):
@@ -555,9 +1349,8 @@ def init_manager_routes(app):
 
             cursor.execute("""
                 SELECT r.id, r.book_id, r.due_date, r.rented_at, r.returned_at,
-                       b.title
+                       r.title
                 FROM rentals r
-                JOIN books b ON r.book_id = b.id
                 WHERE r.user_id = %s
                 ORDER BY r.rented_at DESC
             """, (customer_id,))
@@ -585,38 +1378,56 @@ def init_manager_routes(app):
         if not book_id or not due_date:
             return jsonify({"error": "book_id and due_date required"}), 400
 
+        # Optional retry safety: a repeated key replays the first response
+        try:
+            idem_key = request_key()
+        except IdempotencyError as e:
+            return jsonify({"error": e.message}), e.status
+        manager_id = get_current_user_id()
+        request_hash = fingerprint("manual_rental", customer_id, book_id, due_date)
+
         conn = None
         cursor = None
         try:
             conn = get_db_connection()
             cursor = conn.cursor(dictionary=True)
 
-            # check available
-            cursor.execute("""
-                SELECT available_copies FROM inventory
-                WHERE book_id=%s
-            """, (book_id,))
-            inv = cursor.fetchone()
+            if idem_key:
+                stored = claim(cursor, "manual_rental", manager_id, idem_key, request_hash)
+                if stored:
+                    conn.rollback()
+                    return replay(stored)
 
-            if not inv or inv["available_copies"] <= 0:
+            # take one copy (check + decrement in a single conditional UPDATE)
+            if not reserve(cursor, book_id):
+                conn.rollback()
                 return jsonify({"error": "No copies available"}), 400
 
-            # create rental record
+            # create rental record (title/author snapshotted for history)
             cursor.execute("""
-                INSERT INTO rentals (order_item_id, user_id, book_id, due_date)
-                VALUES (NULL, %s, %s, %s)
-            """, (customer_id, book_id, due_date))
+                INSERT INTO rentals (order_item_id, user_id, book_id, due_date,
+                                     title, author)
+                SELECT NULL, %s, id, %s, title, author
+                FROM books
+                WHERE id = %s
+            """, (customer_id, due_date, book_id))
+            body = {"message": "Rental created", "rental_id": cursor.lastrowid}
+            append(cursor, [movement(book_id, "rent", 0, -1, "rental",
+                                     body["rental_id"], manager_id)])
 
-            # decrement inventory
-            cursor.execute("""
-                UPDATE inventory
-                SET available_copies = available_copies - 1
-                WHERE book_id = %s
-            """, (book_id,))
+            if idem_key:
+                record(cursor, "manual_rental", manager_id, idem_key, 201, body)
 
             conn.commit()
-            return jsonify({"message": "Rental created"}), 201
+            bump_books("inventory", [book_id])
+            if idem_key:
+                maybe_sweep()
+            return jsonify(body), 201
 
+        except IdempotencyError as e:
+            if conn:
+                conn.rollback()
+            return jsonify({"error": e.message}), e.status
         except Exception as e:
             print("[MANAGER MANUAL RENT ERROR]", e)
             if conn:
@@ -653,22 +1464,26 @@ def init_manager_routes(app):
             if rental["returned_at"] is not None:
                 return jsonify({"error": "Already returned"}), 400
 
-            # set returned time
+            # set returned time (conditional, so a concurrent return of the
+            # same rental cannot put the copy back twice)
             now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             cursor.execute("""
                 UPDATE rentals
                 SET returned_at = %s
-                WHERE id = %s
+                WHERE id = %s AND returned_at IS NULL
             """, (now, rental_id))
 
-            # increment inventory
-            cursor.execute("""
-                UPDATE inventory
-                SET available_copies = available_copies + 1
-                WHERE book_id = %s
-            """, (rental["book_id"],))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return jsonify({"error": "Already returned"}), 400
+
+            # put the copy back on the shelf
+            release(cursor, rental["book_id"])
+            append(cursor, [movement(rental["book_id"], "return", 0, 1, "rental",
+                                     rental_id, get_current_user_id())])
 
             conn.commit()
+            bump_books("inventory", [rental["book_id"]])
             return jsonify({"message": "Marked as returned"}), 200
 
         except Exception as e:
@@ -678,3 +1493,17 @@ def init_manager_routes(app):
             return jsonify({"error": "Error returning rental"}), 500
         finally:
             _safe_close(cursor, conn)
+
+
+    # ============================================================
+    # METRICS
+    # ============================================================
+
+    @app.route("/api/manager/metrics", methods=["GET"])
+    @require_manager
+    def manager_metrics():
+        """In-process cache statistics for this worker."""
+        return jsonify({
+            "catalog_query_cache": catalog_queries.stats(),
+            "book_detail_cache": book_details.stats()
+        }), 200
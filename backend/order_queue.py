@@ -0,0 +1,389 @@
+# backend/order_queue.py
+"""
+Optional asynchronous order intake.
+
+With ORDER_INTAKE=async, POST /api/orders validates the cart (its shape,
+plus a non-locking read that every book exists and is in stock, see
+orders.check_cart), appends it to a durable local queue and answers 202
+with a ticket; worker threads drain the queue into MySQL in batches and the
+client polls GET /api/orders/tickets/<ticket> for the outcome.  Intake then
+costs one plain read and a local fsync instead of a locking transaction.
+Stock can still run out before the order is drained; that fails the ticket.
+
+The queue is a SQLite database in WAL mode (ORDER_QUEUE_PATH, default
+order_queue.db next to this file) with synchronous=FULL, so a ticket is on
+disk before the 202 is sent.  Ticket states:
+
+    queued -> processing -> done | failed
+
+Each batch is placed in one MySQL transaction with a savepoint per order
+and committed once.  A rejected cart fails only its own ticket; any other
+error while placing an order is rolled back to that order's savepoint and
+the ticket is retried alone, until it has been claimed
+ORDER_QUEUE_MAX_ATTEMPTS times and is marked failed (the error is logged).  Every
+order stores its ticket in orders.intake_ticket (UNIQUE), so a batch that
+was committed but not marked done -- a worker crash, or a claim that timed
+out -- is recognised when it is drained again instead of being placed twice.
+If MySQL is unreachable or the commit fails, the whole batch goes back to
+the queue and is retried; that does not count against the tickets'
+attempts.
+
+Workers run inside the API process (ORDER_QUEUE_WORKERS threads) or
+standalone:
+
+    python order_queue.py
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from database import get_db_connection
+from idempotency import IdempotencyError
+from orders import place_order_tx, OrderError
+from query_cache import bump_books
+
+ASYNC_INTAKE = os.getenv("ORDER_INTAKE", "sync").lower() == "async"
+QUEUE_PATH = os.getenv(
+    "ORDER_QUEUE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "order_queue.db")
+)
+WORKERS = int(os.getenv("ORDER_QUEUE_WORKERS", 2))
+BATCH_SIZE = int(os.getenv("ORDER_QUEUE_BATCH", 20))
+POLL_SECONDS = float(os.getenv("ORDER_QUEUE_POLL", 0.2))
+CLAIM_TIMEOUT = float(os.getenv("ORDER_QUEUE_CLAIM_TIMEOUT", 60))
+RETENTION_SECONDS = float(os.getenv("ORDER_QUEUE_RETENTION", 86400))
+MAX_ATTEMPTS = int(os.getenv("ORDER_QUEUE_MAX_ATTEMPTS", 5))
+MAX_BACKOFF = 30
+
+_local = threading.local()
+_started = False
+_start_lock = threading.Lock()
+
+
+# ============================================================
+# LOCAL QUEUE (SQLite, WAL)
+# ============================================================
+
+def _queue():
+    """Per-thread connection to the queue database."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(QUEUE_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tickets (
+                seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+                ticket     TEXT NOT NULL UNIQUE,
+                user_id    INTEGER NOT NULL,
+                items      TEXT NOT NULL,
+                status     TEXT NOT NULL DEFAULT 'queued',
+                attempts   INTEGER NOT NULL DEFAULT 0,
+                claimed_at REAL,
+                result     TEXT,
+                error      TEXT,
+                http_status INTEGER,
+                idem_key   TEXT,
+                request_hash TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tickets_status
+            ON tickets (status, seq)
+        """)
+        conn.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_tickets_idem_key
+            ON tickets (user_id, idem_key)
+        """)
+        _local.conn = conn
+    return conn
+
+
+def find_ticket(user_id, idem_key, request_hash):
+    """
+    Ticket already queued under this Idempotency-Key, or None.  Raises
+    IdempotencyError if the key was used for a different request.
+    """
+    row = _queue().execute("""
+        SELECT ticket, request_hash
+        FROM tickets
+        WHERE user_id = ? AND idem_key = ?
+    """, (user_id, idem_key)).fetchone()
+    if row is None:
+        return None
+    if row["request_hash"] != request_hash:
+        raise IdempotencyError(
+            "Idempotency-Key was already used for a different request", 422
+        )
+    return row["ticket"]
+
+
+def enqueue(user_id, items, idem_key=None, request_hash=None):
+    """
+    Durably queue a (validated) cart; returns the ticket id.  With an
+    Idempotency-Key, a repeated request gets the ticket of the first one.
+    """
+    ticket = uuid.uuid4().hex
+    now = time.time()
+    try:
+        _queue().execute("""
+            INSERT INTO tickets (ticket, user_id, items, idem_key, request_hash,
+                                 created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (ticket, user_id, json.dumps(items), idem_key, request_hash, now, now))
+        return ticket
+    except sqlite3.IntegrityError:
+        if idem_key is None:
+            raise
+
+    ticket = find_ticket(user_id, idem_key, request_hash)
+    if ticket is None:
+        raise IdempotencyError("Could not claim Idempotency-Key, please retry", 409)
+    return ticket
+
+
+def ticket_status(ticket, user_id):
+    """Public view of a ticket owned by `user_id`, or None."""
+    row = _queue().execute("""
+        SELECT ticket, status, result, error, http_status
+        FROM tickets
+        WHERE ticket = ? AND user_id = ?
+    """, (ticket, user_id)).fetchone()
+    if row is None:
+        return None
+
+    status = {"ticket": row["ticket"], "status": row["status"]}
+    if row["status"] == "done":
+        status["order"] = json.loads(row["result"])
+    elif row["status"] == "failed":
+        status["error"] = row["error"]
+        status["http_status"] = row["http_status"]
+    else:
+        status["status"] = "queued"   # processing is an internal detail
+    return status
+
+
+def _claim(limit):
+    """Move up to `limit` tickets (oldest first) to processing."""
+    q = _queue()
+    now = time.time()
+    q.execute("BEGIN IMMEDIATE")
+    try:
+        rows = q.execute("""
+            SELECT ticket, user_id, items, attempts
+            FROM tickets
+            WHERE status = 'queued'
+               OR (status = 'processing' AND claimed_at < ?)
+            ORDER BY seq
+            LIMIT ?
+        """, (now - CLAIM_TIMEOUT, limit)).fetchall()
+        if rows:
+            q.execute(f"""
+                UPDATE tickets
+                SET status = 'processing', claimed_at = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE ticket IN ({",".join("?" * len(rows))})
+            """, [now, now] + [r["ticket"] for r in rows])
+        q.execute("COMMIT")
+    except Exception:
+        q.execute("ROLLBACK")
+        raise
+    return [
+        {"ticket": r["ticket"], "user_id": r["user_id"], "items": r["items"],
+         "attempts": r["attempts"] + 1}
+        for r in rows
+    ]
+
+
+def _finish(outcomes):
+    """
+    outcomes: {ticket: ("done", bill) | ("failed", message, status)
+                       | ("retry", error)}
+    A ticket to retry is queued again, or failed once it has used up
+    MAX_ATTEMPTS.
+    """
+    q = _queue()
+    now = time.time()
+    q.execute("BEGIN IMMEDIATE")
+    for ticket, outcome in outcomes.items():
+        if outcome[0] == "done":
+            q.execute("""
+                UPDATE tickets
+                SET status = 'done', result = ?, updated_at = ?
+                WHERE ticket = ?
+            """, (json.dumps(outcome[1], default=str), now, ticket))
+        elif outcome[0] == "failed":
+            q.execute("""
+                UPDATE tickets
+                SET status = 'failed', error = ?, http_status = ?, updated_at = ?
+                WHERE ticket = ?
+            """, (outcome[1], outcome[2], now, ticket))
+        else:
+            q.execute("""
+                UPDATE tickets
+                SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                    error = CASE WHEN attempts >= ? THEN 'Order could not be processed' END,
+                    http_status = CASE WHEN attempts >= ? THEN 500 END,
+                    claimed_at = NULL, updated_at = ?
+                WHERE ticket = ?
+            """, (MAX_ATTEMPTS, MAX_ATTEMPTS, MAX_ATTEMPTS, now, ticket))
+    q.execute("COMMIT")
+
+
+def _requeue(tickets):
+    """Put a whole batch back after a MySQL failure (attempt not counted)."""
+    q = _queue()
+    q.execute(f"""
+        UPDATE tickets
+        SET status = 'queued', claimed_at = NULL, updated_at = ?,
+            attempts = MAX(attempts - 1, 0)
+        WHERE ticket IN ({",".join("?" * len(tickets))})
+    """, [time.time()] + list(tickets))
+
+
+def _purge():
+    _queue().execute("""
+        DELETE FROM tickets
+        WHERE status IN ('done', 'failed') AND updated_at < ?
+    """, (time.time() - RETENTION_SECONDS,))
+
+
+# ============================================================
+# DRAINING INTO MYSQL
+# ============================================================
+
+def _existing_bills(cur, tickets):
+    """Bills for tickets whose order was already committed by an earlier run."""
+    cur.execute(f"""
+        SELECT o.id AS order_id, o.user_id, o.total_price, o.payment_status,
+               o.intake_ticket,
+               oi.book_id, oi.type, oi.price, oi.title, oi.author
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.id
+        WHERE o.intake_ticket IN ({",".join(["%s"] * len(tickets))})
+        ORDER BY oi.id
+    """, list(tickets))
+
+    bills = {}
+    for r in cur.fetchall():
+        bill = bills.setdefault(r["intake_ticket"], {
+            "order_id": r["order_id"],
+            "user_id": r["user_id"],
+            "items": [],
+            "total_price": float(r["total_price"]),
+            "payment_status": r["payment_status"]
+        })
+        bill["items"].append({
+            "book_id": r["book_id"],
+            "title": r["title"],
+            "author": r["author"],
+            "type": r["type"],
+            "price": float(r["price"])
+        })
+    return bills
+
+
+def drain_batch(jobs):
+    """Place `jobs` in one MySQL transaction; returns the outcomes."""
+    outcomes = {}
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(dictionary=True)
+
+        for ticket, bill in _existing_bills(cur, [j["ticket"] for j in jobs]).items():
+            outcomes[ticket] = ("done", bill)
+
+        touched = []
+        for job in jobs:
+            if job["ticket"] in outcomes:
+                continue
+            cur.execute("SAVEPOINT intake_order")
+            try:
+                bill = place_order_tx(cur, job["user_id"], json.loads(job["items"]),
+                                      ticket=job["ticket"])
+            except OrderError as e:
+                cur.execute("ROLLBACK TO SAVEPOINT intake_order")
+                outcomes[job["ticket"]] = ("failed", e.message, e.status)
+                continue
+            except Exception as e:
+                # only this order is undone; if the connection or the
+                # transaction itself is gone this raises and the batch
+                # is requeued
+                cur.execute("ROLLBACK TO SAVEPOINT intake_order")
+                print("[ORDER QUEUE TICKET ERROR]", job["ticket"],
+                      f"attempt {job['attempts']}/{MAX_ATTEMPTS}:", e)
+                outcomes[job["ticket"]] = ("retry", str(e))
+                continue
+            cur.execute("RELEASE SAVEPOINT intake_order")
+            outcomes[job["ticket"]] = ("done", bill)
+            touched += [it["book_id"] for it in bill["items"]]
+
+        conn.commit()
+        if touched:
+            bump_books("inventory", touched)
+        return outcomes
+
+    except Exception:
+        if conn: conn.rollback()
+        raise
+    finally:
+        if cur: cur.close()
+        if conn: conn.close()
+
+
+def _worker():
+    backoff = POLL_SECONDS
+    last_purge = 0
+    while True:
+        try:
+            jobs = _claim(BATCH_SIZE)
+            if not jobs:
+                if time.time() - last_purge > 3600:
+                    _purge()
+                    last_purge = time.time()
+                time.sleep(POLL_SECONDS)
+                continue
+
+            try:
+                outcomes = drain_batch(jobs)
+            except Exception as e:
+                # MySQL trouble: keep the orders and retry with backoff
+                print("[ORDER QUEUE DRAIN ERROR]", e)
+                _requeue([j["ticket"] for j in jobs])
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+
+            _finish(outcomes)
+            backoff = POLL_SECONDS
+
+        except Exception as e:
+            print("[ORDER QUEUE ERROR]", e)
+            time.sleep(backoff)
+
+
+def start_workers(count=None):
+    """Start the drain threads once per process."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+
+    for i in range(WORKERS if count is None else count):
+        threading.Thread(target=_worker, name=f"order-queue-{i}", daemon=True).start()
+
+
+if __name__ == "__main__":
+    print(f"Draining {QUEUE_PATH} with {WORKERS} workers")
+    start_workers()
+    while True:
+        time.sleep(3600)
@@ -0,0 +1,238 @@
+# backend/orders.py
+"""
+Order placement, shared by POST /api/orders and anything else that needs to
+turn a cart into an order inside an open transaction.
+
+Stock is handled set-based so lock hold time does not grow with cart size:
+
+    1. price the cart with one SELECT on books
+    2. reserve stock for every book in the cart with one conditional UPDATE
+       (inventory.reserve_many): rows are locked in book_id order and the
+       stock check is part of the UPDATE, so there is no SELECT ... FOR UPDATE
+       round trip and concurrent carts can neither deadlock nor oversell
+    3. write the order and all order_items with multi-row statements, and
+       create rentals with one INSERT ... SELECT
+
+quote_cart() answers the same pricing and stock questions read-only, so the
+client can catch conflicts before checkout instead of failing inside it;
+check_cart() turns its conflicts into the OrderError place_order_tx() would
+raise.
+"""
+from datetime import datetime, timedelta
+
+from inventory import reserve_many
+from inventory_ledger import append, movement
+
+RENTAL_DAYS = 14
+
+
+class OrderError(Exception):
+    """The cart was rejected; `status` is the HTTP status to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def normalize_items(items):
+    """Validate cart items -> [{"book_id": int, "type": "buy"|"rent"}]."""
+    if not items:
+        raise OrderError("Missing items")
+
+    clean = []
+    for it in items:
+        try:
+            book_id = int(it["book_id"])
+        except (KeyError, TypeError, ValueError):
+            raise OrderError("Each item needs a numeric book_id")
+        if it.get("type") not in ("buy", "rent"):
+            raise OrderError("Item type must be 'buy' or 'rent'")
+        clean.append({"book_id": book_id, "type": it["type"]})
+    return clean
+
+
+def _in_list(values):
+    return ",".join(["%s"] * len(values))
+
+
+def quote_cart(cur, items):
+    """
+    Current prices and availability for a cart, from one non-locking SELECT.
+    Items may carry the "price" the client last saw; a difference is
+    reported as a price_changed conflict.  Returns
+    {items, total_price, conflicts, ok}.
+    """
+    clean = normalize_items(items)
+    ids = sorted({it["book_id"] for it in clean})
+
+    cur.execute(f"""
+        SELECT b.id, b.title, b.author, b.price_buy, b.price_rent,
+               COALESCE(inv.available_copies, 0) AS available_copies
+        FROM books b
+        LEFT JOIN inventory inv ON inv.book_id = b.id
+        WHERE b.id IN ({_in_list(ids)})
+    """, ids)
+    book_map = {b["id"]: b for b in cur.fetchall()}
+
+    need = {}
+    for it in clean:
+        need[it["book_id"]] = need.get(it["book_id"], 0) + 1
+
+    quoted = []
+    conflicts = []
+    total = 0.0
+    for it, raw in zip(clean, items):
+        bid = it["book_id"]
+        b = book_map.get(bid)
+        if not b:
+            conflicts.append({"book_id": bid, "type": it["type"], "reason": "not_found"})
+            continue
+
+        price = float(b["price_buy"] if it["type"] == "buy" else b["price_rent"])
+        available = int(b["available_copies"])
+        total += price
+        quoted.append({
+            "book_id": bid,
+            "title": b["title"],
+            "author": b["author"],
+            "type": it["type"],
+            "price": price,
+            "available_copies": available
+        })
+
+        try:
+            seen = float(raw["price"]) if raw.get("price") is not None else None
+        except (TypeError, ValueError):
+            raise OrderError("Item price must be a number")
+        if seen is not None and round(seen, 2) != round(price, 2):
+            conflicts.append({
+                "book_id": bid, "type": it["type"], "reason": "price_changed",
+                "old_price": seen, "price": price
+            })
+
+    for bid in ids:
+        b = book_map.get(bid)
+        if b and int(b["available_copies"]) < need[bid]:
+            conflicts.append({
+                "book_id": bid, "reason": "out_of_stock",
+                "requested": need[bid], "available": int(b["available_copies"])
+            })
+
+    return {
+        "items": quoted,
+        "total_price": total,
+        "conflicts": conflicts,
+        "ok": not conflicts
+    }
+
+
+def check_cart(cur, items):
+    """
+    Read-only version of place_order_tx()'s checks, for intake paths that
+    accept a cart before placing it: raises the same OrderError for an
+    unknown book or missing stock.  Returns the normalized items.
+    """
+    clean = normalize_items(items)
+    quote = quote_cart(cur, clean)
+    for c in quote["conflicts"]:
+        if c["reason"] == "not_found":
+            raise OrderError(f"Book {c['book_id']} not found")
+    for c in quote["conflicts"]:
+        if c["reason"] == "out_of_stock":
+            first = next(it for it in clean if it["book_id"] == c["book_id"])
+            raise OrderError(f"No available copies to {first['type']} book {c['book_id']}")
+    return clean
+
+
+def place_order_tx(cur, user_id, items, ticket=None):
+    """
+    Create an order for `items` using dictionary cursor `cur`.  Runs inside
+    the caller's transaction; the caller commits, or rolls back on error.
+    `ticket` is the async intake ticket (see order_queue.py), if any.
+    Raises OrderError when a book is unknown or out of stock.
+    Returns the bill that POST /api/orders responds with.
+    """
+    items = normalize_items(items)
+    ids = sorted({it["book_id"] for it in items})
+
+    # 1. prices
+    cur.execute(f"""
+        SELECT id, title, author, price_buy, price_rent
+        FROM books
+        WHERE id IN ({_in_list(ids)})
+    """, ids)
+    book_map = {b["id"]: b for b in cur.fetchall()}
+
+    bill_items = []
+    total = 0.0
+    for it in items:
+        b = book_map.get(it["book_id"])
+        if not b:
+            raise OrderError(f"Book {it['book_id']} not found")
+
+        price = float(b["price_buy"] if it["type"] == "buy" else b["price_rent"])
+        total += price
+        bill_items.append({
+            "book_id": b["id"],
+            "title": b["title"],
+            "author": b["author"],
+            "type": it["type"],
+            "price": price
+        })
+
+    # 2. reserve stock for the whole cart (renting consumes available
+    #    copies; buying consumes total AND available copies)
+    need = {}
+    sold = {}
+    for it in bill_items:
+        bid = it["book_id"]
+        need[bid] = need.get(bid, 0) + 1
+        if it["type"] == "buy":
+            sold[bid] = sold.get(bid, 0) + 1
+
+    short = reserve_many(cur, need, sold)
+    if short:
+        # report the first short item in cart order
+        first = next(it for it in bill_items if it["book_id"] in short)
+        raise OrderError(f"No available copies to {first['type']} book {first['book_id']}")
+
+    # 3. writes
+    cur.execute("""
+        INSERT INTO orders (user_id, total_price, payment_status, intake_ticket)
+        VALUES (%s, %s, 'Pending', %s)
+    """, (user_id, total, ticket))
+    order_id = cur.lastrowid
+
+    # title/author are snapshotted so history reads need no books join
+    rows = []
+    for it in bill_items:
+        rows += [order_id, it["book_id"], it["type"], it["price"],
+                 it["title"], it["author"]]
+    cur.execute(f"""
+        INSERT INTO order_items (order_id, book_id, type, price, title, author)
+        VALUES {",".join(["(%s, %s, %s, %s, %s, %s)"] * len(bill_items))}
+    """, rows)
+
+    append(cur, [movement(bid, "buy", -n, -n, "order", order_id)
+                 for bid, n in sold.items()]
+                + [movement(bid, "rent", 0, -(need[bid] - sold.get(bid, 0)), "order", order_id)
+                   for bid in need])
+
+    if any(it["type"] == "rent" for it in bill_items):
+        due = datetime.now() + timedelta(days=RENTAL_DAYS)
+        cur.execute("""
+            INSERT INTO rentals (order_item_id, user_id, book_id,
+                                 rented_at, due_date, title, author)
+            SELECT id, %s, book_id, NOW(), %s, title, author
+            FROM order_items
+            WHERE order_id = %s AND type = 'rent'
+        """, (user_id, due, order_id))
+
+    return {
+        "order_id": order_id,
+        "user_id": user_id,
+        "items": bill_items,
+        "total_price": total,
+        "payment_status": "Pending"
+    }
@@ -0,0 +1,149 @@
+# backend/query_cache.py
+"""
+In-process result cache for catalog queries.
+
+Entries are kept in a size-bounded LRU with a TTL.  Invalidation is driven by
+generation counters: every write path calls bump() for the data it touched,
+
+    "books"                 the books table as a whole (adds, edits)
+    ("book", book_id)       core fields of one book
+    ("inventory", book_id)  stock counters of one book
+    ("reviews", book_id)    reviews of one book
+
+and each bump is stamped with a process-wide, monotonically increasing
+generation.  A cached entry remembers the generation at which its query
+started plus the keys it depends on, and is only served while none of those
+keys has been bumped since.  Writes therefore evict exactly the entries they
+affect, and a write racing with a query can never be cached over.
+
+Counters are per process; the TTL bounds staleness for writes made by other
+worker processes.  Modules holding shared (cross-process) state can register
+an on_bump() listener to hear about every write.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+_gen_lock = threading.Lock()
+_generation = 0
+_last_bump = {}  # key -> generation of the last write touching it
+_listeners = []
+
+
+def on_bump(callback):
+    """Call `callback(keys)` after every bump()."""
+    _listeners.append(callback)
+
+
+def bump(*keys):
+    """Invalidate every cached entry that depends on any of `keys`."""
+    global _generation
+    with _gen_lock:
+        _generation += 1
+        for key in keys:
+            _last_bump[key] = _generation
+
+    for callback in _listeners:
+        try:
+            callback(keys)
+        except Exception as e:
+            print("[CACHE INVALIDATION ERROR]", e)
+
+
+def bump_books(kind, book_ids):
+    """
+    bump((kind, id)) for each id, e.g. bump_books("inventory", [1, 2]).
+    Callers run this after their commit, so it never raises: an id that is
+    not an integer is logged and skipped.
+    """
+    keys = set()
+    for b in book_ids:
+        try:
+            keys.add((kind, int(b)))
+        except (TypeError, ValueError):
+            print("[CACHE INVALIDATION ERROR]", f"invalid book id {b!r}")
+    bump(*keys)
+
+
+def current_generation():
+    """Read before running a query; pass the value to QueryCache.put()."""
+    return _generation
+
+
+def _unchanged_since(generation, keys):
+    return all(_last_bump.get(k, 0) <= generation for k in keys)
+
+
+class QueryCache:
+    """Thread-safe LRU + TTL cache validated by generation counters."""
+
+    def __init__(self, name, max_entries=None, ttl_seconds=None):
+        self.name = name
+        self.max_entries = int(max_entries or os.getenv("QUERY_CACHE_SIZE", 512))
+        self.ttl = float(ttl_seconds or os.getenv("QUERY_CACHE_TTL", 30))
+        self._entries = OrderedDict()  # key -> (expires, generation, deps, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value, or None on miss/expiry/invalidation."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires, generation, deps, value = entry
+            if expires < now or not _unchanged_since(generation, deps):
+                del self._entries[key]
+                self.invalidated += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation, depends_on, ttl=None):
+        """
+        Store `value`, built from a query started at `generation` (see
+        current_generation()) that read the data named by `depends_on`.
+        `ttl` overrides the cache-wide TTL for this entry.
+        """
+        deps = tuple(depends_on)
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if not _unchanged_since(generation, deps):
+                return
+            self._entries[key] = (expires, generation, deps, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidated": self.invalidated,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+# Shared instance for /api/books and /api/manager/books
+catalog_queries = QueryCache("catalog_queries")
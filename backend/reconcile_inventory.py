@@ -0,0 +1,222 @@
+# backend/reconcile_inventory.py
+"""
+Inventory reconciliation.
+
+Every copy of a book is either on the shelf or out on an open rental, so
+
+    total_copies - available_copies == open rentals (returned_at IS NULL)
+
+must hold for each book (for sharded books, the sums of the slots).  This
+job walks inventory in keyset-ordered chunks of book ids; each chunk is one
+non-locking read that joins the chunk's rental counts through
+idx_rentals_book_open, so nothing is locked and no query touches more than
+one chunk.  1M books at the default chunk size is 200 short range scans.
+
+    python reconcile_inventory.py                      # drift report
+    python reconcile_inventory.py --report drift.csv   # also write CSV
+    python reconcile_inventory.py --fix                # repair drifted books
+
+--fix re-checks each drifted book inside its own short transaction (row
+and slots locked, rentals recounted under a share lock), sets available_copies = total_copies - open
+rentals (raising total_copies if it is below the open rentals), and
+records the correction in the inventory ledger as 'reconcile'.
+"""
+import argparse
+import csv
+import sys
+import time
+
+from database import get_db_connection
+from inventory_ledger import append, movement
+from inventory_shards import lock_stock, set_counts
+from query_cache import bump_books
+
+CHUNK = 5000
+
+
+def scan_chunk(cur, after_id, chunk=CHUNK):
+    """
+    Stock figures for the next `chunk` books after `after_id`.
+    Returns (rows, last_book_id); rows is empty when the scan is done.
+    """
+    cur.execute("""
+        SELECT book_id FROM inventory
+        WHERE book_id > %s
+        ORDER BY book_id
+        LIMIT %s
+    """, (after_id, chunk))
+    ids = [r["book_id"] for r in cur.fetchall()]
+    if not ids:
+        return [], after_id
+    lo, hi = ids[0], ids[-1]
+
+    cur.execute("""
+        SELECT i.book_id, i.shard_count,
+               COALESCE(sh.total, i.total_copies) AS total_copies,
+               COALESCE(sh.available, i.available_copies) AS available_copies,
+               COALESCE(r.open_rentals, 0) AS open_rentals
+        FROM inventory i
+        LEFT JOIN (
+            SELECT book_id,
+                   SUM(total_copies) AS total,
+                   SUM(available_copies) AS available
+            FROM inventory_shards
+            WHERE book_id BETWEEN %s AND %s
+            GROUP BY book_id
+        ) sh ON sh.book_id = i.book_id
+        LEFT JOIN (
+            SELECT book_id, COUNT(*) AS open_rentals
+            FROM rentals
+            WHERE book_id BETWEEN %s AND %s AND returned_at IS NULL
+            GROUP BY book_id
+        ) r ON r.book_id = i.book_id
+        WHERE i.book_id BETWEEN %s AND %s
+        ORDER BY i.book_id
+    """, (lo, hi, lo, hi, lo, hi))
+    return cur.fetchall(), hi
+
+
+def drift_of(row):
+    """None if the book is consistent, else a drift record."""
+    total = int(row["total_copies"])
+    available = int(row["available_copies"])
+    open_rentals = int(row["open_rentals"])
+    expected_available = max(total - open_rentals, 0)
+    if available == expected_available and total >= open_rentals:
+        return None
+    return {
+        "book_id": row["book_id"],
+        "total_copies": total,
+        "available_copies": available,
+        "open_rentals": open_rentals,
+        "expected_available": expected_available,
+        "drift": available - expected_available
+    }
+
+
+def fix_book(conn, book_id):
+    """
+    Re-check one book under its row lock and repair it.  Returns the applied
+    (delta_total, delta_available), or None if it was already consistent.
+    """
+    cur = conn.cursor(dictionary=True)
+    try:
+        # locking (current) reads throughout: the slots are locked as well as
+        # the inventory row, since sharded reservations only touch slots,
+        # and the share-locked rental count blocks new rentals of the book
+        # until we commit
+        try:
+            available, total = lock_stock(cur, book_id)
+        except ValueError:
+            conn.rollback()
+            return None
+
+        cur.execute("""
+            SELECT COUNT(*) AS open_rentals FROM rentals
+            WHERE book_id = %s AND returned_at IS NULL
+            LOCK IN SHARE MODE
+        """, (book_id,))
+        row = {
+            "book_id": book_id,
+            "total_copies": total,
+            "available_copies": available,
+            "open_rentals": cur.fetchone()["open_rentals"]
+        }
+        drift = drift_of(row)
+        if drift is None:
+            conn.rollback()
+            return None
+
+        total = max(drift["total_copies"], drift["open_rentals"])
+        available = total - drift["open_rentals"]
+        set_counts(cur, book_id, available, total)
+
+        delta = (total - drift["total_copies"], available - drift["available_copies"])
+        append(cur, [movement(book_id, "reconcile", delta[0], delta[1], "book", book_id)])
+        conn.commit()
+        return delta
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def reconcile(fix=False, chunk=CHUNK, report=None, out=sys.stdout):
+    """Walk the whole catalog; returns a summary dict."""
+    conn = get_db_connection()
+    conn.autocommit = True   # each chunk read is its own snapshot
+    cur = conn.cursor(dictionary=True)
+    fix_conn = get_db_connection() if fix else None
+
+    writer = None
+    if report:
+        report_file = open(report, "w", newline="")
+        writer = csv.DictWriter(report_file, fieldnames=[
+            "book_id", "total_copies", "available_copies", "open_rentals",
+            "expected_available", "drift", "fixed"
+        ])
+        writer.writeheader()
+
+    started = time.monotonic()
+    scanned = drifted = fixed = 0
+    last_id = 0
+    try:
+        while True:
+            rows, last_id = scan_chunk(cur, last_id, chunk)
+            if not rows:
+                break
+            scanned += len(rows)
+
+            repaired = []
+            for row in rows:
+                drift = drift_of(row)
+                if drift is None:
+                    continue
+                drifted += 1
+                drift["fixed"] = False
+                if fix:
+                    delta = fix_book(fix_conn, drift["book_id"])
+                    if delta is not None:
+                        drift["fixed"] = True
+                        fixed += 1
+                        repaired.append(drift["book_id"])
+
+                print(f"book {drift['book_id']}: total {drift['total_copies']}, "
+                      f"available {drift['available_copies']}, open rentals "
+                      f"{drift['open_rentals']} (drift {drift['drift']:+d})"
+                      + (" FIXED" if drift["fixed"] else ""), file=out)
+                if writer:
+                    writer.writerow(drift)
+
+            if repaired:
+                bump_books("inventory", repaired)
+    finally:
+        cur.close()
+        conn.close()
+        if fix_conn:
+            fix_conn.close()
+        if writer:
+            report_file.close()
+
+    elapsed = time.monotonic() - started
+    return {
+        "scanned": scanned,
+        "drifted": drifted,
+        "fixed": fixed,
+        "seconds": round(elapsed, 2),
+        "books_per_second": round(scanned / elapsed, 1) if elapsed else None
+    }
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Reconcile inventory with open rentals")
+    p.add_argument("--fix", action="store_true", help="repair drifted books")
+    p.add_argument("--chunk", type=int, default=CHUNK)
+    p.add_argument("--report", help="write the drift report to this CSV file")
+    args = p.parse_args()
+
+    summary = reconcile(fix=args.fix, chunk=args.chunk, report=args.report)
+    print(f"Scanned {summary['scanned']} books in {summary['seconds']}s "
+          f"({summary['books_per_second']} books/s): "
+          f"{summary['drifted']} drifted, {summary['fixed']} fixed")
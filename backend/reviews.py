@@ -0,0 +1,169 @@
+# backend/reviews.py
+"""
+Keyset-paginated review listing shared by the customer and manager routes.
+
+Reviews are listed newest first, ordered by (created_at, id) DESC, and read
+through idx_reviews_book_created (book_id, created_at, id) so each page is an
+index range scan no matter how many reviews a book has.  The cursor is an
+opaque token holding the (created_at, id) of the last review on the page.
+
+search_reviews() serves the catalog-wide manager search.  Keywords go
+through the ft_reviews_text FULLTEXT index, which InnoDB maintains as part
+of every reviews insert/update (including add_review's upsert).
+"""
+import base64
+import os
+import re
+from datetime import datetime
+
+REVIEW_PAGE_DEFAULT = 20
+REVIEW_PAGE_MAX = 100
+# must match the server's innodb_ft_min_token_size: shorter words are not
+# indexed, so requiring one ("+ab*") would match no review at all
+FT_MIN_TOKEN = int(os.getenv("FT_MIN_TOKEN_SIZE", 3))
+
+
+def parse_page_size(value, default=REVIEW_PAGE_DEFAULT, maximum=REVIEW_PAGE_MAX):
+    """Clamp a ?limit= value to 1..maximum, falling back to `default`."""
+    try:
+        return min(max(int(value), 1), maximum)
+    except (TypeError, ValueError):
+        return default
+
+
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token):
+    """Return (created_at, id) from a cursor; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token.encode()).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def fetch_review_page(cur, book_id, limit, cursor=None):
+    """
+    Return (reviews, next_cursor) for one page of a book's reviews.
+    `cur` must be a dictionary cursor.  Raises ValueError on a bad cursor.
+    """
+    params = [book_id]
+    after = ""
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        after = """
+            AND (r.created_at < %s OR (r.created_at = %s AND r.id < %s))
+        """
+        params += [created_at, created_at, last_id]
+
+    cur.execute(f"""
+        SELECT r.id, r.rating, r.review_text, r.created_at,
+               u.username
+        FROM reviews r
+        JOIN users u ON r.user_id = u.id
+        WHERE r.book_id = %s
+        {after}
+        ORDER BY r.created_at DESC, r.id DESC
+        LIMIT %s
+    """, params + [limit + 1])
+    reviews = cur.fetchall()
+
+    next_cursor = None
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        last = reviews[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+
+    for r in reviews:
+        r["rating"] = int(r["rating"])
+
+    return reviews, next_cursor
+
+
+def review_total(cur, book_id):
+    """Review count from book_stats (no scan of reviews)."""
+    cur.execute("""
+        SELECT rating_count FROM book_stats WHERE book_id = %s
+    """, (book_id,))
+    row = cur.fetchone()
+    return int(row["rating_count"]) if row else 0
+
+
+_KEYWORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def boolean_query(q):
+    """
+    Turn free text into a FULLTEXT boolean-mode query where every word is
+    required and may be a prefix ("fast mag" -> "+fast* +mag*").  Boolean
+    operators typed by the user and words shorter than FT_MIN_TOKEN are
+    dropped; "" means nothing searchable is left.
+    """
+    return " ".join(f"+{w}*" for w in _KEYWORD_RE.findall(q or "")
+                    if len(w) >= FT_MIN_TOKEN)
+
+
+def search_reviews(cur, q="", min_rating=None, max_rating=None,
+                   since=None, until=None, limit=REVIEW_PAGE_DEFAULT, cursor=None):
+    """
+    Return (hits, next_cursor) for reviews across all books, newest first,
+    with book title/author and username.  Raises ValueError on a bad cursor.
+    """
+    where = []
+    params = []
+
+    terms = boolean_query(q)
+    if terms:
+        where.append("MATCH(r.review_text) AGAINST (%s IN BOOLEAN MODE)")
+        params.append(terms)
+
+    if min_rating is not None:
+        where.append("r.rating >= %s")
+        params.append(min_rating)
+
+    if max_rating is not None:
+        where.append("r.rating <= %s")
+        params.append(max_rating)
+
+    if since is not None:
+        where.append("r.created_at >= %s")
+        params.append(since)
+
+    if until is not None:
+        where.append("r.created_at < %s")
+        params.append(until)
+
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        where.append("(r.created_at < %s OR (r.created_at = %s AND r.id < %s))")
+        params += [created_at, created_at, last_id]
+
+    where_clause = ("WHERE " + " AND ".join(where)) if where else ""
+
+    cur.execute(f"""
+        SELECT r.id, r.book_id, b.title, b.author,
+               r.rating, r.review_text, r.created_at,
+               u.username
+        FROM reviews r
+        JOIN books b ON b.id = r.book_id
+        JOIN users u ON u.id = r.user_id
+        {where_clause}
+        ORDER BY r.created_at DESC, r.id DESC
+        LIMIT %s
+    """, params + [limit + 1])
+    hits = cur.fetchall()
+
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        last = hits[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+
+    for h in hits:
+        h["rating"] = int(h["rating"])
+
+    return hits, next_cursor
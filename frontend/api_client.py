@@ -1,4 +1,7 @@
 # frontend/api_client.py
+import os
+import uuid
+
 import requests
 
 BASE_URL = "http://localhost:5001"
@@ -97,15 +100,72 @@ def api_search_books(params: dict):
     return None, msg
 
 
-def api_place_order(user_id: int, items):
+def api_quote_cart(items):
+    """Current prices / availability for cart items: {items, total_price, conflicts, ok}"""
     try:
-        resp = requests.post(f"{BASE_URL}/api/orders", json={
-            "items": items  # user_id now comes from token
+        resp = requests.post(f"{BASE_URL}/api/cart/quote", json={
+            "items": items
         }, headers=_get_headers())
     except requests.exceptions.RequestException as e:
         return None, f"Connection error: {e}"
 
-    if resp.status_code in (200, 201):
+    if resp.status_code == 200:
+        return resp.json(), None
+
+    try:
+        msg = resp.json().get("error", f"HTTP {resp.status_code}")
+    except:
+        msg = f"HTTP {resp.status_code}"
+    return None, msg
+
+
+def new_idempotency_key():
+    """Fresh Idempotency-Key; reuse it when retrying the same request."""
+    return uuid.uuid4().hex
+
+
+def _post_idempotent(url, payload, key, retries=2, timeout=30):
+    """
+    POST with an Idempotency-Key header, retrying connection failures and
+    timeouts with the same key (the server replays the first response).
+    """
+    headers = _get_headers()
+    headers["Idempotency-Key"] = key
+    for attempt in range(retries + 1):
+        try:
+            return requests.post(url, json=payload, headers=headers, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries:
+                raise
+
+
+def api_place_order(user_id: int, items, idempotency_key=None):
+    try:
+        resp = _post_idempotent(f"{BASE_URL}/api/orders", {
+            "items": items  # user_id now comes from token
+        }, idempotency_key or new_idempotency_key())
+    except requests.exceptions.RequestException as e:
+        return None, f"Connection error: {e}"
+
+    # 202 = queued by the server's async intake; poll api_get_order_ticket
+    if resp.status_code in (200, 201, 202):
+        return resp.json(), None
+
+    try:
+        msg = resp.json().get("error", f"HTTP {resp.status_code}")
+    except:
+        msg = f"HTTP {resp.status_code}"
+    return None, msg
+
+
+def api_get_order_ticket(ticket: str):
+    """Status of a queued order: {"status": "queued"|"done"|"failed", ...}"""
+    try:
+        resp = requests.get(f"{BASE_URL}/api/orders/tickets/{ticket}", headers=_get_headers())
+    except requests.exceptions.RequestException as e:
+        return None, f"Connection error: {e}"
+
+    if resp.status_code == 200:
         return resp.json(), None
 
     try:
@@ -153,10 +213,53 @@ def api_get_book_details(book_id: int, user_id: int = None):
     return None, msg
 
 
-def api_get_book_reviews(book_id: int):
-    """Get all reviews for a book"""
+def api_get_book_page(book_id: int, limit: int = 20):
+    """Book details, own review and first page of reviews in one call"""
+    try:
+        resp = requests.get(f"{BASE_URL}/api/books/{book_id}/page",
+                            params={"limit": limit}, headers=_get_headers())
+    except requests.exceptions.RequestException as e:
+        return None, f"Connection error: {e}"
+
+    if resp.status_code == 200:
+        return resp.json(), None
+
+    try:
+        msg = resp.json().get("error", f"HTTP {resp.status_code}")
+    except:
+        msg = f"HTTP {resp.status_code}"
+    return None, msg
+
+
+def api_get_books_batch(book_ids):
+    """Details + availability for several books in one request"""
+    try:
+        resp = requests.post(f"{BASE_URL}/api/books/batch",
+                             json={"ids": list(book_ids)}, headers=_get_headers())
+    except requests.exceptions.RequestException as e:
+        return None, f"Connection error: {e}"
+
+    if resp.status_code == 200:
+        return resp.json(), None
+
+    try:
+        msg = resp.json().get("error", f"HTTP {resp.status_code}")
+    except:
+        msg = f"HTTP {resp.status_code}"
+    return None, msg
+
+
+def api_get_book_reviews(book_id: int, cursor: str = None, limit: int = 20):
+    """
+    Get one page of reviews for a book.
+    Returns { "reviews": [...], "next_cursor": str|None, "total": int }
+    """
+    params = {"limit": limit}
+    if cursor:
+        params["cursor"] = cursor
     try:
-        resp = requests.get(f"{BASE_URL}/api/books/{book_id}/reviews", headers=_get_headers())
+        resp = requests.get(f"{BASE_URL}/api/books/{book_id}/reviews",
+                            params=params, headers=_get_headers())
     except requests.exceptions.RequestException as e:
         return None, f"Connection error: {e}"
 
@@ -211,14 +314,61 @@ def _handle(resp):
 # MANAGER — ORDERS
 # ============================================================
 
-def api_manager_get_orders():
+def api_manager_get_orders(params=None):
+    """
+    One page of orders: {"orders": [...], "next_cursor": str | None}.
+    params: status, customer, since, until (YYYY-MM-DD), limit, cursor
+    """
     try:
-        resp = requests.get(f"{BASE_URL}/api/manager/orders", headers=_get_headers())
+        resp = requests.get(f"{BASE_URL}/api/manager/orders",
+                            params=params or {}, headers=_get_headers())
     except Exception as e:
         return None, f"Connection error: {e}"
     return _handle(resp)
 
 
+def api_manager_get_order_items(order_id: int):
+    try:
+        resp = requests.get(f"{BASE_URL}/api/manager/orders/{order_id}/items",
+                            headers=_get_headers())
+    except Exception as e:
+        return None, f"Connection error: {e}"
+    return _handle(resp)
+
+
+def api_manager_export(dataset: str, path: str, fmt: str = "csv",
+                       gzip: bool = False, since: str = None, until: str = None):
+    """
+    Stream an export (orders, order_items, rentals, customers) into `path`
+    without holding it in memory.  Returns (bytes_written, err).
+    """
+    params = {"format": fmt}
+    if gzip:
+        params["gzip"] = "1"
+    if since:
+        params["since"] = since
+    if until:
+        params["until"] = until
+    try:
+        with requests.get(f"{BASE_URL}/api/manager/exports/{dataset}",
+                          headers=_get_headers(), params=params,
+                          stream=True, timeout=(10, 300)) as resp:
+            if resp.status_code != 200:
+                return _handle(resp)
+            written = 0
+            with open(path + ".part", "wb") as f:
+                for block in resp.iter_content(chunk_size=64 * 1024):
+                    f.write(block)
+                    written += len(block)
+        # an aborted stream raises above, so only complete files get renamed
+        os.replace(path + ".part", path)
+        return written, None
+    except Exception as e:
+        if os.path.exists(path + ".part"):
+            os.remove(path + ".part")
+        return None, f"Connection error: {e}"
+
+
 def api_manager_update_order_status(order_id: int, new_status: str):
     try:
         resp = requests.patch(
@@ -239,6 +389,29 @@ def api_manager_update_order_status(order_id: int, new_status: str):
 # MANAGER — BOOKS (ADVANCED)
 # ============================================================
 
+
+def api_manager_bulk_update_order_status(new_status: str, order_ids=None, filters=None):
+    """
+    Set many orders' status in one call, by id list or by listing filters.
+    Returns ({"results": [{"id", "result"}], "updated", ...}, err).
+    """
+    payload = {"payment_status": new_status}
+    if order_ids is not None:
+        payload["order_ids"] = list(order_ids)
+    else:
+        payload["filter"] = filters or {}
+    try:
+        resp = requests.patch(
+            f"{BASE_URL}/api/manager/orders/status",
+            json=payload,
+            headers=_get_headers(),
+            timeout=120
+        )
+    except Exception as e:
+        return None, f"Connection error: {e}"
+    return _handle(resp)
+
+
 def api_manager_list_books(params: dict):
     """
     Manager-side search:
@@ -260,9 +433,82 @@ def api_manager_get_book_details(book_id: int):
     return _handle(resp)
 
 
-def api_manager_get_reviews(book_id: int):
+def api_manager_get_reviews(book_id: int, cursor: str = None, limit: int = 20):
+    """One page of reviews: { "reviews", "next_cursor", "total" }"""
+    params = {"limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    try:
+        resp = requests.get(f"{BASE_URL}/api/manager/books/{book_id}/reviews",
+                            params=params, headers=_get_headers())
+    except Exception as e:
+        return None, f"Connection error: {e}"
+    return _handle(resp)
+
+
+def api_manager_get_rating_histograms(book_ids):
+    """Star distributions for several books in one request"""
+    try:
+        resp = requests.get(
+            f"{BASE_URL}/api/manager/books/rating-histograms",
+            params={"ids": ",".join(str(b) for b in book_ids)},
+            headers=_get_headers()
+        )
+    except Exception as e:
+        return None, f"Connection error: {e}"
+    return _handle(resp)
+
+
+def api_manager_search_reviews(params: dict):
+    """
+    Catalog-wide review search:
+    q=, min_rating=, max_rating=, since=, until= (YYYY-MM-DD), limit=, cursor=
+    """
+    try:
+        resp = requests.get(f"{BASE_URL}/api/manager/reviews/search",
+                            params=params, headers=_get_headers())
+    except Exception as e:
+        return None, f"Connection error: {e}"
+    return _handle(resp)
+
+
+def api_manager_import_books(path: str, fmt: str = None, skip: int = 0):
+    """
+    Upload a CSV/NDJSON catalog file, streamed from disk.
+    Returns (summary, err); on a failed import err names the record to
+    resume after (pass it back as skip).
+    """
+    fmt = fmt or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+    try:
+        with open(path, "rb") as f:
+            resp = requests.post(
+                f"{BASE_URL}/api/manager/books/import",
+                params={"format": fmt, "skip": skip},
+                data=f,
+                headers=_get_headers(),
+                timeout=(10, 3600)
+            )
+    except Exception as e:
+        return None, f"Connection error: {e}"
+    if resp.status_code == 500:
+        data = _safe_json(resp)
+        return None, (f"{data.get('error', 'Import failed')} "
+                      f"(committed through record {data.get('last_record', skip)})")
+    return _handle(resp)
+
+
+def api_manager_reprice_books(rule: dict, dry_run: bool = False):
+    """
+    Bulk price change.  rule: target, percent | set, match {genre, author,
+    year_from, year_to, ids}.  A dry run returns a preview.
+    """
     try:
-        resp = requests.get(f"{BASE_URL}/api/manager/books/{book_id}/reviews", headers=_get_headers())
+        resp = requests.post(
+            f"{BASE_URL}/api/manager/books/reprice",
+            json={**rule, "dry_run": dry_run},
+            headers=_get_headers(),
+            timeout=300
+        )
     except Exception as e:
         return None, f"Connection error: {e}"
     return _handle(resp)
@@ -341,6 +587,20 @@ def api_manager_search_customers(query: str):
     return _handle(resp)
 
 
+def api_manager_get_customer_summaries(params=None):
+    """
+    One page of customers with order_count, active_rental_count,
+    lifetime_spend and last_order_at: {"customers": [...], "next_cursor"}.
+    params: q, limit, cursor
+    """
+    try:
+        resp = requests.get(f"{BASE_URL}/api/manager/customers/summary",
+                            params=params or {}, headers=_get_headers())
+    except Exception as e:
+        return None, f"Connection error: {e}"
+    return _handle(resp)
+
+
 def api_manager_get_customer(customer_id: int):
     try:
         resp = requests.get(f"{BASE_URL}/api/manager/customers/{customer_id}", headers=_get_headers())
@@ -365,12 +625,13 @@ def api_manager_get_customer_rentals(customer_id: int):
     return _handle(resp)
 
 
-def api_manager_manual_rent(customer_id: int, book_id: int, due_date: str):
+def api_manager_manual_rent(customer_id: int, book_id: int, due_date: str,
+                            idempotency_key=None):
     try:
-        resp = requests.post(
+        resp = _post_idempotent(
             f"{BASE_URL}/api/manager/customers/{customer_id}/rentals",
-            json={"book_id": book_id, "due_date": due_date},
-            headers=_get_headers()
+            {"book_id": book_id, "due_date": due_date},
+            idempotency_key or new_idempotency_key()
         )
     except Exception as e:
         return None, f"Connection error: {e}"
@@ -9,10 +9,14 @@ from datetime import datetime
 from api_client import (
     api_search_books,
     api_place_order,
+    api_quote_cart,
+    api_get_order_ticket,
+    new_idempotency_key,
     api_get_history,
-    api_get_book_details,
-    api_submit_review,
-    api_get_book_reviews
+    api_get_book_page,
+    api_get_books_batch,
+    api_get_book_reviews,
+    api_submit_review
 )
 
 # ---------------- COLORS (UNCHANGED) ----------------
@@ -44,6 +48,8 @@ class CustomerFrame(tk.Frame):
         self.cart = []       # items user selected
         self.book_map = {}   # id → book row
         self.sort_states = {}  # sorting memory for books (matches manager style)
+        self.order_key = None    # Idempotency-Key for the current cart
+        self.order_key_cart = None
         
         # Configure treeview style once during init
         style = ttk.Style()
@@ -344,6 +350,22 @@ class CustomerFrame(tk.Frame):
                      fg=TEXT_COLOR).pack(anchor="w")
             return
 
+        # Refresh prices / stock so problems show up before checkout
+        quote, err = self._quote_cart()
+        if err:
+            tk.Label(self.content,
+                     text=f"Could not check prices and stock: {err}",
+                     font=LABEL_FONT,
+                     bg=PRIMARY_BG,
+                     fg=ACCENT).pack(anchor="w")
+        elif not quote["ok"]:
+            tk.Label(self.content,
+                     text="\n".join(self._describe_conflicts(quote["conflicts"])),
+                     font=LABEL_FONT,
+                     bg=PRIMARY_BG,
+                     fg=ACCENT,
+                     justify="left").pack(anchor="w", pady=(0, 8))
+
         tf = tk.Frame(self.content, bg=PRIMARY_BG)
         tf.pack(fill="both", expand=True)
 
@@ -440,18 +462,94 @@ class CustomerFrame(tk.Frame):
             self.cart = []
             self.show_cart_view()
 
+    def _quote_cart(self):
+        """Quote the cart and update its prices in place -> (quote, err)."""
+        quote, err = api_quote_cart([
+            {"book_id": it["book_id"], "type": it["type"], "price": it["price"]}
+            for it in self.cart
+        ])
+        if err:
+            return None, err
+
+        prices = {(q["book_id"], q["type"]): q["price"] for q in quote["items"]}
+        for it in self.cart:
+            it["price"] = prices.get((it["book_id"], it["type"]), it["price"])
+        return quote, None
+
+    def _describe_conflicts(self, conflicts):
+        titles = {it["book_id"]: it["title"] for it in self.cart}
+        lines = []
+        for c in conflicts:
+            title = titles.get(c["book_id"], f"Book {c['book_id']}")
+            if c["reason"] == "out_of_stock":
+                lines.append(f"{title}: only {c['available']} available "
+                             f"(cart has {c['requested']})")
+            elif c["reason"] == "price_changed":
+                lines.append(f"{title} ({c['type']}): price changed from "
+                             f"${c['old_price']:.2f} to ${c['price']:.2f}")
+            else:
+                lines.append(f"{title}: no longer in the catalog")
+        return lines
+
     def _place_order(self):
+        # Validate the whole cart first (read-only, no locks) so checkout
+        # does not fail inside the order transaction
+        quote, err = self._quote_cart()
+        if err:
+            messagebox.showerror("Order Error", err)
+            return
+        if not quote["ok"]:
+            messagebox.showwarning(
+                "Cart Changed",
+                "\n".join(self._describe_conflicts(quote["conflicts"]))
+                + "\n\nPlease review your cart before ordering."
+            )
+            self.show_cart_view()
+            return
+
         payload = [{"book_id": it["book_id"], "type": it["type"]} for it in self.cart]
 
-        bill, err = api_place_order(self.user_info["user_id"], payload)
+        # Same cart -> same key until it succeeds, so clicking again after a
+        # timeout replays the first order instead of placing a second one
+        if self.order_key is None or self.order_key_cart != payload:
+            self.order_key = new_idempotency_key()
+            self.order_key_cart = payload
+
+        bill, err = api_place_order(self.user_info["user_id"], payload, self.order_key)
         if err:
             messagebox.showerror("Order Error", err)
             return
 
         self.cart = []
+        self.order_key = None
+        if "ticket" in bill:
+            # Server queued the order; poll until it has been placed
+            self.show_cart_view()
+            self._poll_order_ticket(bill["ticket"])
+            return
+
         self._show_bill(bill)
         self.show_cart_view()
 
+    def _poll_order_ticket(self, ticket, attempt=0):
+        status, err = api_get_order_ticket(ticket)
+        if err:
+            messagebox.showerror("Order Error", err)
+            return
+
+        if status["status"] == "done":
+            self._show_bill(status["order"])
+        elif status["status"] == "failed":
+            messagebox.showerror("Order Error", status.get("error", "Order failed"))
+        elif attempt < 120:
+            self.after(min(250 * (attempt + 1), 2000),
+                       lambda: self._poll_order_ticket(ticket, attempt + 1))
+        else:
+            messagebox.showinfo(
+                "Order Queued",
+                "Your order is still being processed. Check Order History shortly."
+            )
+
     def _show_bill(self, bill):
         win = tk.Toplevel(self)
         win.title(f"Order #{bill['order_id']}")
@@ -547,11 +645,27 @@ class CustomerFrame(tk.Frame):
             messagebox.showerror("Error", err)
             return
 
+        self._add_availability(data["purchases"] + data["past_rentals"])
+
         self._history_block("Purchases", data["purchases"], scrollable_frame)
         self._history_block("Current Rentals", data["current_rentals"], scrollable_frame)
         self._history_block("Past Rentals", data["past_rentals"], scrollable_frame)
         self._history_block("Your Reviews", data["reviews"], scrollable_frame)
 
+    def _add_availability(self, rows):
+        """Add an "available" column (current stock) to history rows."""
+        book_ids = list(dict.fromkeys(r["book_id"] for r in rows))
+        stock = {}
+        for i in range(0, len(book_ids), 100):   # server caps ids per request
+            batch, err = api_get_books_batch(book_ids[i:i + 100])
+            if err:
+                return  # leave the column out rather than show wrong stock
+            for b in batch["books"]:
+                stock[b["id"]] = b["available_copies"]
+
+        for r in rows:
+            r["available"] = stock.get(r["book_id"], "Removed")
+
     def _history_block(self, title, rows, parent_frame):
         tk.Label(
             parent_frame,
@@ -691,7 +805,7 @@ class CustomerFrame(tk.Frame):
         self._open_book_popup(book_id)
 
     def _open_book_popup(self, book_id):
-        data, err = api_get_book_details(book_id, self.user_info["user_id"])
+        data, err = api_get_book_page(book_id)
         if err:
             messagebox.showerror("Error", err)
             return
@@ -739,6 +853,9 @@ class CustomerFrame(tk.Frame):
                     if book_data.get("avg_rating") is not None else f"Average Rating: N/A ({book_data.get('review_count', 0)} reviews)"
                 )
             ]
+            histogram = book_data.get("rating_histogram")
+            if histogram and book_data.get("review_count"):
+                info.append("  ".join(f"{star}★ {histogram.get(str(star), 0)}" for star in range(5, 0, -1)))
             info_label.config(text="\n".join(info))
 
         # Initial info display
@@ -789,16 +906,18 @@ class CustomerFrame(tk.Frame):
                 messagebox.showinfo("Success", "Review submitted!")
                 # Clear the review text box
                 review_box.delete("1.0", "end")
-                # Refresh book details to get updated average rating
-                refresh_book_data()
-                # Refresh the reviews section
-                load_reviews()
+                # Refresh rating + reviews with a single page request
+                refresh_page()
 
-        def refresh_book_data():
-            """Refresh book data to get updated average rating"""
-            fresh_data, err = api_get_book_details(book_id, self.user_info["user_id"])
-            if not err and fresh_data:
-                update_info_block(fresh_data)
+        def refresh_page():
+            """Re-fetch the book page to update average rating and reviews"""
+            fresh_data, err = api_get_book_page(book_id)
+            if err:
+                load_reviews(None, err)
+                return
+            update_info_block(fresh_data)
+            load_reviews(fresh_data.get("reviews", []),
+                         next_cursor=fresh_data.get("next_cursor"))
 
         tk.Button(
             win,
@@ -834,13 +953,106 @@ class CustomerFrame(tk.Frame):
         reviews_canvas.create_window((0, 0), window=reviews_scrollable, anchor="nw")
         reviews_canvas.configure(yscrollcommand=reviews_scrollbar.set)
 
-        def load_reviews():
+        def add_review_widget(review):
+            # Create a frame for each review (like a comment)
+            review_frame = tk.Frame(reviews_scrollable, bg="#f0f0f0", relief="raised", bd=1)
+            review_frame.pack(fill="x", padx=5, pady=5)
+
+            # Username and rating header
+            header_frame = tk.Frame(review_frame, bg="#f0f0f0")
+            header_frame.pack(fill="x", padx=8, pady=(8, 4))
+
+            username_label = tk.Label(
+                header_frame,
+                text=f"@{review['username']}",
+                bg="#f0f0f0",
+                fg=ACCENT,
+                font=("Georgia", 11, "bold")
+            )
+            username_label.pack(side="left")
+
+            # Rating stars
+            rating_stars = "★" * review['rating'] + "☆" * (5 - review['rating'])
+            rating_label = tk.Label(
+                header_frame,
+                text=rating_stars,
+                bg="#f0f0f0",
+                fg="#FFA500",
+                font=("Georgia", 10)
+            )
+            rating_label.pack(side="left", padx=(10, 0))
+
+            # Review text
+            if review.get('review_text'):
+                review_text_label = tk.Label(
+                    review_frame,
+                    text=review['review_text'],
+                    bg="#f0f0f0",
+                    fg=TEXT_COLOR,
+                    font=LABEL_FONT,
+                    justify="left",
+                    wraplength=450
+                )
+                review_text_label.pack(anchor="w", padx=8, pady=(0, 4))
+
+            # Date
+            date_str = review.get('created_at', '')
+            if date_str:
+                # Format date if needed
+                try:
+                    from datetime import datetime as dt
+                    if isinstance(date_str, str):
+                        # Handle MySQL datetime format
+                        date_str_clean = date_str.split('.')[0] if '.' in date_str else date_str
+                        date_obj = dt.strptime(date_str_clean, '%Y-%m-%d %H:%M:%S')
+                        date_str = date_obj.strftime('%B %d, %Y')
+                except Exception:
+                    # If parsing fails, use original string
+                    pass
+
+            date_label = tk.Label(
+                review_frame,
+                text=date_str,
+                bg="#f0f0f0",
+                fg="#666666",
+                font=("Georgia", 9, "italic")
+            )
+            date_label.pack(anchor="w", padx=8, pady=(0, 8))
+
+        def update_scroll_region():
+            reviews_canvas.update_idletasks()
+            reviews_canvas.configure(scrollregion=reviews_canvas.bbox("all"))
+
+        def add_load_more(cursor):
+            """Append a button that fetches the next page of reviews"""
+            if not cursor:
+                return
+            more_btn = tk.Button(
+                reviews_scrollable,
+                text="Load more reviews",
+                bg=ACCENT,
+                fg=BUTTON_FG,
+                font=LABEL_FONT,
+                command=lambda: load_more(cursor, more_btn)
+            )
+            more_btn.pack(anchor="w", padx=5, pady=5)
+
+        def load_more(cursor, more_btn):
+            page, err = api_get_book_reviews(book_id, cursor)
+            if err:
+                messagebox.showerror("Error", err)
+                return
+            more_btn.destroy()
+            for review in page.get("reviews", []):
+                add_review_widget(review)
+            add_load_more(page.get("next_cursor"))
+            update_scroll_region()
+
+        def load_reviews(all_reviews, err=None, next_cursor=None):
             # Clear existing reviews
             for widget in reviews_scrollable.winfo_children():
                 widget.destroy()
 
-            # Fetch all reviews
-            all_reviews, err = api_get_book_reviews(book_id)
             if err:
                 tk.Label(
                     reviews_scrollable,
@@ -861,80 +1073,16 @@ class CustomerFrame(tk.Frame):
                 ).pack(anchor="w", padx=5, pady=5)
             else:
                 for review in all_reviews:
-                    # Create a frame for each review (like a comment)
-                    review_frame = tk.Frame(reviews_scrollable, bg="#f0f0f0", relief="raised", bd=1)
-                    review_frame.pack(fill="x", padx=5, pady=5)
-
-                    # Username and rating header
-                    header_frame = tk.Frame(review_frame, bg="#f0f0f0")
-                    header_frame.pack(fill="x", padx=8, pady=(8, 4))
-
-                    username_label = tk.Label(
-                        header_frame,
-                        text=f"@{review['username']}",
-                        bg="#f0f0f0",
-                        fg=ACCENT,
-                        font=("Georgia", 11, "bold")
-                    )
-                    username_label.pack(side="left")
-
-                    # Rating stars
-                    rating_stars = "★" * review['rating'] + "☆" * (5 - review['rating'])
-                    rating_label = tk.Label(
-                        header_frame,
-                        text=rating_stars,
-                        bg="#f0f0f0",
-                        fg="#FFA500",
-                        font=("Georgia", 10)
-                    )
-                    rating_label.pack(side="left", padx=(10, 0))
-
-                    # Review text
-                    if review.get('review_text'):
-                        review_text_label = tk.Label(
-                            review_frame,
-                            text=review['review_text'],
-                            bg="#f0f0f0",
-                            fg=TEXT_COLOR,
-                            font=LABEL_FONT,
-                            justify="left",
-                            wraplength=450
-                        )
-                        review_text_label.pack(anchor="w", padx=8, pady=(0, 4))
-
-                    # Date
-                    date_str = review.get('created_at', '')
-                    if date_str:
-                        # Format date if needed
-                        try:
-                            from datetime import datetime as dt
-                            if isinstance(date_str, str):
-                                # Handle MySQL datetime format
-                                date_str_clean = date_str.split('.')[0] if '.' in date_str else date_str
-                                date_obj = dt.strptime(date_str_clean, '%Y-%m-%d %H:%M:%S')
-                                date_str = date_obj.strftime('%B %d, %Y')
-                        except Exception:
-                            # If parsing fails, use original string
-                            pass
-
-                    date_label = tk.Label(
-                        review_frame,
-                        text=date_str,
-                        bg="#f0f0f0",
-                        fg="#666666",
-                        font=("Georgia", 9, "italic")
-                    )
-                    date_label.pack(anchor="w", padx=8, pady=(0, 8))
-
-            # Update scroll region
-            reviews_canvas.update_idletasks()
-            reviews_canvas.configure(scrollregion=reviews_canvas.bbox("all"))
+                    add_review_widget(review)
+                add_load_more(next_cursor)
+
+            update_scroll_region()
 
         reviews_canvas.pack(side="left", fill="both", expand=True)
         reviews_scrollbar.pack(side="right", fill="y")
 
-        # Load reviews initially
-        load_reviews()
+        # First page of reviews came with the initial page request
+        load_reviews(data.get("reviews", []), next_cursor=data.get("next_cursor"))
 
     # ============================================================
     # ADD TO CART
@@ -3,23 +3,31 @@
 # ============================================================
 
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 from datetime import datetime
 
 from api_client import (
     api_manager_get_orders,
+    api_manager_get_order_items,
+    api_manager_export,
     api_manager_update_order_status,
+    api_manager_bulk_update_order_status,
     api_manager_list_books,
     api_manager_get_book_details,
+    api_manager_get_rating_histograms,
     api_manager_get_reviews,
+    api_manager_search_reviews,
     api_manager_add_book,
+    api_manager_import_books,
+    api_manager_reprice_books,
     api_manager_update_book,
     api_manager_update_inventory,
-    api_manager_search_customers,
+    api_manager_get_customer_summaries,
     api_manager_get_customer,
     api_manager_get_customer_orders,
     api_manager_get_customer_rentals,
     api_manager_manual_rent,
+    new_idempotency_key,
     api_manager_return_rental,
 )
 
@@ -60,6 +68,7 @@ class ManagerFrame(tk.Frame):
             "total_copies": "Total Copies",
             "available_copies": "Available Copies",
             "rating": "Avg Rating",
+            "stars": "5★/4★/3★/2★/1★",
             "genre": "Genre",
             "year": "Year",
             "date": "Date Added",
@@ -80,7 +89,11 @@ class ManagerFrame(tk.Frame):
         # Data caches
         self.book_rows = []
         self.customer_rows = []
+        self.customers_cursor = None
+        self.customers_params = {}
         self.order_rows = []
+        self.orders_cursor = None
+        self.orders_params = {}
 
         # Build UI
         self._build_nav()
@@ -251,13 +264,55 @@ class ManagerFrame(tk.Frame):
         )
         refresh_btn.pack(side="right", padx=5)
 
+        tk.Button(
+            header, text="Export Data",
+            bg=BUTTON_BG, fg=BUTTON_FG, font=LABEL_FONT,
+            command=self.open_export_popup
+        ).pack(side="right", padx=5)
+
+        # ------------------ FILTERS ------------------
+        filters = tk.Frame(self.content, bg=PRIMARY_BG)
+        filters.pack(fill="x", pady=(10, 0))
+
+        tk.Label(filters, text="Status:", bg=PRIMARY_BG, font=LABEL_FONT).pack(side="left")
+        self.order_status_filter = ttk.Combobox(
+            filters, state="readonly", width=9,
+            values=["All", "Pending", "Paid"]
+        )
+        self.order_status_filter.set("All")
+        self.order_status_filter.pack(side="left", padx=(2, 10))
+
+        tk.Label(filters, text="Customer:", bg=PRIMARY_BG, font=LABEL_FONT).pack(side="left")
+        self.order_customer_filter = tk.Entry(filters, width=14)
+        self.order_customer_filter.pack(side="left", padx=(2, 10))
+
+        tk.Label(filters, text="From:", bg=PRIMARY_BG, font=LABEL_FONT).pack(side="left")
+        self.order_since_filter = tk.Entry(filters, width=11)
+        self.order_since_filter.pack(side="left", padx=(2, 10))
+
+        tk.Label(filters, text="To:", bg=PRIMARY_BG, font=LABEL_FONT).pack(side="left")
+        self.order_until_filter = tk.Entry(filters, width=11)
+        self.order_until_filter.pack(side="left", padx=(2, 10))
+
+        tk.Button(
+            filters, text="Apply",
+            bg=ACCENT, fg=BUTTON_FG, font=LABEL_FONT,
+            command=self.load_orders
+        ).pack(side="left")
+
+        tk.Label(
+            filters, text="(dates YYYY-MM-DD)",
+            bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Georgia", 9)
+        ).pack(side="left", padx=6)
+
         # ------------------ TABLE ------------------
         table_frame = tk.Frame(self.content, bg=PRIMARY_BG)
         table_frame.pack(fill="both", expand=True, pady=(10, 0))
 
         columns = ("id", "customer", "total", "status", "created")
         self.orders_tree = ttk.Treeview(
-            table_frame, columns=columns, show="headings", height=14
+            table_frame, columns=columns, show="headings", height=14,
+            selectmode="extended"
         )
 
         headings = {
@@ -291,6 +346,13 @@ class ManagerFrame(tk.Frame):
 
         self.orders_tree.bind("<<TreeviewSelect>>", self.show_order_details)
 
+        self.btn_more_orders = tk.Button(
+            self.content, text="Load More Orders",
+            bg=BUTTON_BG, fg=BUTTON_FG, font=LABEL_FONT,
+            command=lambda: self.load_orders(append=True)
+        )
+        self.btn_more_orders.pack(anchor="e", pady=(5, 0))
+
         # ------------------ DETAILS + BUTTONS ------------------
         bottom = tk.Frame(self.content, bg=PRIMARY_BG)
         bottom.pack(fill="x", pady=(10, 0))
@@ -318,23 +380,131 @@ class ManagerFrame(tk.Frame):
         )
         self.btn_set_pending.pack(pady=5, fill="x")
 
+        tk.Button(
+            button_frame, text="Mark All Matching as Paid",
+            bg=BUTTON_BG, fg=BUTTON_FG, font=LABEL_FONT,
+            command=lambda: self.change_filtered_order_status("Paid")
+        ).pack(pady=5, fill="x")
+
         # ------------------ LOAD INITIAL DATA ------------------
         self.load_orders()
 
 
+    # ========================================================
+    # Export
+    # ========================================================
+
+    def open_export_popup(self):
+        """Download a dataset to a file; the From/To order filters bound it."""
+        win = tk.Toplevel(self)
+        win.title("Export Data")
+        win.geometry("420x260")
+        win.configure(bg=PRIMARY_BG)
+        win.transient(self)
+        win.grab_set()
+
+        tk.Label(
+            win, text="Export Data",
+            bg=PRIMARY_BG, fg=ACCENT, font=TITLE_FONT
+        ).pack(pady=10)
+
+        form = tk.Frame(win, bg=PRIMARY_BG)
+        form.pack(fill="x", padx=20)
+
+        tk.Label(form, text="Dataset:", bg=PRIMARY_BG, font=LABEL_FONT).grid(row=0, column=0, sticky="e", pady=5)
+        dataset_box = ttk.Combobox(form, state="readonly", width=14,
+                                   values=["orders", "order_items", "rentals", "customers"])
+        dataset_box.set("orders")
+        dataset_box.grid(row=0, column=1, sticky="w", padx=5)
+
+        tk.Label(form, text="Format:", bg=PRIMARY_BG, font=LABEL_FONT).grid(row=1, column=0, sticky="e", pady=5)
+        format_box = ttk.Combobox(form, state="readonly", width=14, values=["csv", "ndjson"])
+        format_box.set("csv")
+        format_box.grid(row=1, column=1, sticky="w", padx=5)
+
+        gzip_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            form, text="Compress (gzip)", variable=gzip_var,
+            bg=PRIMARY_BG, font=LABEL_FONT
+        ).grid(row=2, column=1, sticky="w", pady=5)
+
+        filters = self._order_filters()
+
+        def do_export():
+            dataset, fmt = dataset_box.get(), format_box.get()
+            ext = f".{fmt}" + (".gz" if gzip_var.get() else "")
+            path = filedialog.asksaveasfilename(
+                parent=win, title="Save Export",
+                initialfile=dataset + ext, defaultextension=ext
+            )
+            if not path:
+                return
+
+            win.config(cursor="watch")
+            win.update_idletasks()
+            try:
+                written, error = api_manager_export(
+                    dataset, path, fmt=fmt, gzip=gzip_var.get(),
+                    since=filters.get("since"), until=filters.get("until")
+                )
+            finally:
+                win.config(cursor="")
+
+            if error:
+                messagebox.showerror("Error", error, parent=win)
+                return
+            messagebox.showinfo("Export Finished",
+                                f"Saved {written:,} bytes to {path}", parent=win)
+            win.destroy()
+
+        btn_frame = tk.Frame(win, bg=PRIMARY_BG)
+        btn_frame.pack(fill="x", padx=20, pady=10)
+        tk.Button(btn_frame, text="Export", bg=ACCENT, fg=BUTTON_FG, font=LABEL_FONT,
+                  command=do_export).pack(side="left", padx=5)
+        tk.Button(btn_frame, text="Cancel", bg=BUTTON_BG, fg=BUTTON_FG, font=LABEL_FONT,
+                  command=win.destroy).pack(side="left", padx=5)
+
     # ========================================================
     # Load Orders
     # ========================================================
 
-    def load_orders(self):
-        self.orders_tree.delete(*self.orders_tree.get_children())
+    def _order_filters(self):
+        params = {}
+        status = self.order_status_filter.get()
+        if status and status != "All":
+            params["status"] = status
+        for key, entry in (("customer", self.order_customer_filter),
+                           ("since", self.order_since_filter),
+                           ("until", self.order_until_filter)):
+            value = entry.get().strip()
+            if value:
+                params[key] = value
+        return params
+
+    def load_orders(self, append=False):
+        """
+        Load the first page for the current filters, or the next page of the
+        query already shown (filters edited since are not applied until
+        Apply/Refresh).
+        """
+        if append:
+            if not self.orders_cursor:
+                return
+            params = dict(self.orders_params, cursor=self.orders_cursor)
+        else:
+            params = self._order_filters()
+            self.orders_params = params
+            self.orders_tree.delete(*self.orders_tree.get_children())
+            self.order_rows = []
 
-        orders, error = api_manager_get_orders()
+        page, error = api_manager_get_orders(params)
         if error:
             messagebox.showerror("Error", error)
             return
 
-        self.order_rows = orders
+        orders = page["orders"]
+        self.orders_cursor = page["next_cursor"]
+        self.order_rows.extend(orders)
 
         for o in orders:
             self.orders_tree.insert(
@@ -348,8 +518,13 @@ class ManagerFrame(tk.Frame):
                 )
             )
 
-        self.order_details.delete("1.0", "end")
-        self.order_details.insert("1.0", "Select an order to see details.")
+        self.btn_more_orders.config(
+            state="normal" if self.orders_cursor else "disabled"
+        )
+
+        if not append:
+            self.order_details.delete("1.0", "end")
+            self.order_details.insert("1.0", "Select an order to see details.")
 
 
     # ========================================================
@@ -371,6 +546,14 @@ class ManagerFrame(tk.Frame):
         if not order:
             return
 
+        # items are fetched on first selection
+        if "items" not in order:
+            items, error = api_manager_get_order_items(order_id)
+            if error:
+                messagebox.showerror("Error", error)
+                return
+            order["items"] = items
+
         lines = [
             f"Order ID: {order['id']}",
             f"Customer: {order['customer_username']} (ID {order['user_id']})",
@@ -395,27 +578,74 @@ class ManagerFrame(tk.Frame):
     # ========================================================
 
     def change_order_status(self, new_status):
+        """Apply new_status to every selected order in one request."""
         sel = self.orders_tree.selection()
         if not sel:
             messagebox.showwarning("Select Order", "Select an order first.")
             return
 
-        order_id = int(sel[0])
+        order_ids = [int(iid) for iid in sel]
+        what = (f"Order #{order_ids[0]}" if len(order_ids) == 1
+                else f"{len(order_ids)} orders")
+
+        confirm = messagebox.askyesno("Confirm", f"Change {what} to '{new_status}'?")
+        if not confirm:
+            return
+
+        result, error = api_manager_bulk_update_order_status(new_status, order_ids=order_ids)
+        if error:
+            messagebox.showerror("Error", error)
+            return
+
+        self._apply_order_status(result)
+        messagebox.showinfo("Success", self._describe_status_result(result))
+
+    def change_filtered_order_status(self, new_status):
+        """Apply new_status to every order matching the current filters."""
+        filters = self._order_filters()
+        if not filters:
+            messagebox.showwarning("Filter Orders", "Set at least one filter first.")
+            return
 
         confirm = messagebox.askyesno(
             "Confirm",
-            f"Change Order #{order_id} to '{new_status}'?"
+            f"Mark ALL orders matching the current filters as '{new_status}'?"
         )
         if not confirm:
             return
 
-        ok, error = api_manager_update_order_status(order_id, new_status)
+        result, error = api_manager_bulk_update_order_status(new_status, filters=filters)
         if error:
             messagebox.showerror("Error", error)
             return
 
-        self.load_orders()
-        messagebox.showinfo("Success", f"Order marked as {new_status}.")
+        self._apply_order_status(result)
+        messagebox.showinfo("Success", self._describe_status_result(result))
+
+    def _apply_order_status(self, result):
+        """Update the loaded rows in place from a bulk status result."""
+        new_status = result["payment_status"]
+        updated = {r["id"] for r in result["results"] if r["result"] == "updated"}
+
+        for o in self.order_rows:
+            if o["id"] in updated:
+                o["payment_status"] = new_status
+                iid = str(o["id"])
+                if self.orders_tree.exists(iid):
+                    self.orders_tree.set(iid, "status", new_status)
+
+        self.show_order_details()
+
+    def _describe_status_result(self, result):
+        parts = [f"{result['updated']} marked as {result['payment_status']}"]
+        if result["unchanged"]:
+            parts.append(f"{result['unchanged']} already {result['payment_status']}")
+        if result["not_found"]:
+            parts.append(f"{result['not_found']} not found")
+        message = ", ".join(parts) + "."
+        if result.get("more"):
+            message += "\nMore matching orders remain; run it again to continue."
+        return message
 
 
     # ========================================================
@@ -434,6 +664,12 @@ class ManagerFrame(tk.Frame):
             bg=PRIMARY_BG, fg=ACCENT, font=TITLE_FONT
         ).pack(side="left")
 
+        tk.Button(
+            header, text="Import Catalog",
+            bg=BUTTON_BG, fg=BUTTON_FG, font=LABEL_FONT,
+            command=self.import_catalog
+        ).pack(side="right", padx=5)
+
         # ------------------ ADVANCED SEARCH BAR ------------------
         search_frame = tk.Frame(self.content, bg=PRIMARY_BG)
         search_frame.pack(fill="x", pady=(10, 0))
@@ -468,12 +704,13 @@ class ManagerFrame(tk.Frame):
         columns = (
             "id", "title", "author", "buy", "rent",
             "total_copies", "available_copies",
-            "rating", "genre", "year", "date"
+            "rating", "stars", "genre", "year", "date"
         )
 
 
         self.books_tree = ttk.Treeview(
-            table_frame, columns=columns, show="headings", height=12
+            table_frame, columns=columns, show="headings", height=12,
+            selectmode="extended"
         )
         # Removed TreeviewSelect binding since form is gone
 
@@ -511,6 +748,7 @@ class ManagerFrame(tk.Frame):
         self.books_tree.column("total_copies", width=110, anchor="center")
         self.books_tree.column("available_copies", width=130, anchor="center")
         self.books_tree.column("rating", width=100, anchor="center")
+        self.books_tree.column("stars", width=130, anchor="center")
         self.books_tree.column("genre", width=120)
         self.books_tree.column("year", width=80, anchor="center")
         self.books_tree.column("date", width=150)
@@ -551,6 +789,20 @@ class ManagerFrame(tk.Frame):
         )
         reviews_btn.pack(side="left", padx=5)
 
+        search_reviews_btn = tk.Button(
+            btn_frame, text="Search Reviews",
+            bg=ACCENT, fg=BUTTON_FG, font=LABEL_FONT,
+            command=self.open_review_search_popup
+        )
+        search_reviews_btn.pack(side="left", padx=5)
+
+        reprice_btn = tk.Button(
+            btn_frame, text="Bulk Reprice",
+            bg=ACCENT, fg=BUTTON_FG, font=LABEL_FONT,
+            command=self.open_reprice_popup
+        )
+        reprice_btn.pack(side="left", padx=5)
+
         # ------------------ LOAD INITIAL BOOKS ------------------
         self.load_books()
 
@@ -591,6 +843,7 @@ class ManagerFrame(tk.Frame):
                     b["total_copies"],
                     b["available_copies"],
                         ("N/A" if (b.get('review_count') is None or b.get('review_count') == 0) else f"{b['avg_rating']:.1f}"),
+                    "",
                     b["genre"] or "",
                     b["publication_year"] or "",
                     b["created_at"]
@@ -598,6 +851,26 @@ class ManagerFrame(tk.Frame):
 
             )
 
+        self._load_star_columns([b["id"] for b in books])
+
+    def _load_star_columns(self, book_ids):
+        """Fill the star-distribution column, 500 books per request."""
+        for i in range(0, len(book_ids), 500):
+            stats, error = api_manager_get_rating_histograms(book_ids[i:i + 500])
+            if error:
+                return   # the column just stays empty
+
+            for st in stats:
+                iid = str(st["book_id"])
+                if not self.books_tree.exists(iid):
+                    continue
+                histogram = st["rating_histogram"]
+                self.books_tree.set(
+                    iid, "stars",
+                    "/".join(str(histogram.get(str(star), 0)) for star in range(5, 0, -1))
+                    if st["review_count"] else "—"
+                )
+
     # ========================================================
     # Add New Book
     # ========================================================
@@ -700,6 +973,162 @@ class ManagerFrame(tk.Frame):
             command=win.destroy
         ).pack(side="left", padx=5)
 
+    # ========================================================
+    # Import Catalog
+    # ========================================================
+
+    def import_catalog(self):
+        path = filedialog.askopenfilename(
+            title="Import Catalog",
+            filetypes=[("Catalog files", "*.csv *.ndjson *.jsonl"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        self.config(cursor="watch")
+        self.update_idletasks()
+        try:
+            summary, error = api_manager_import_books(path)
+        finally:
+            self.config(cursor="")
+
+        if error:
+            messagebox.showerror("Error", error)
+            return
+
+        lines = [
+            f"{summary['inserted']} books imported",
+            f"{summary['duplicates']} duplicates skipped",
+            f"{summary['invalid']} invalid records"
+        ]
+        for e in summary["errors"][:10]:
+            lines.append(f"  record {e['record']}: {e['error']}")
+        messagebox.showinfo("Import Finished", "\n".join(lines))
+        self.load_books()
+
+    # ========================================================
+    # Bulk Reprice
+    # ========================================================
+
+    def open_reprice_popup(self):
+        """Preview and apply a price rule to many books at once."""
+        selected = [int(iid) for iid in self.books_tree.selection()]
+
+        win = tk.Toplevel(self)
+        win.title("Bulk Reprice")
+        win.geometry("620x560")
+        win.configure(bg=PRIMARY_BG)
+        win.transient(self)
+        win.grab_set()
+
+        tk.Label(
+            win, text="Bulk Reprice",
+            bg=PRIMARY_BG, fg=ACCENT, font=TITLE_FONT
+        ).pack(pady=10)
+
+        form = tk.Frame(win, bg=PRIMARY_BG)
+        form.pack(fill="x", padx=20)
+
+        tk.Label(form, text="Prices:", bg=PRIMARY_BG, font=LABEL_FONT).grid(row=0, column=0, sticky="e", pady=5)
+        target_box = ttk.Combobox(form, state="readonly", width=12,
+                                  values=["both", "price_buy", "price_rent"])
+        target_box.set("both")
+        target_box.grid(row=0, column=1, sticky="w", padx=5)
+
+        tk.Label(form, text="Change:", bg=PRIMARY_BG, font=LABEL_FONT).grid(row=1, column=0, sticky="e", pady=5)
+        mode_box = ttk.Combobox(form, state="readonly", width=12,
+                                values=["percent", "set price"])
+        mode_box.set("percent")
+        mode_box.grid(row=1, column=1, sticky="w", padx=5)
+        value_var = tk.StringVar()
+        tk.Entry(form, textvariable=value_var, width=10, font=LABEL_FONT).grid(row=1, column=2, sticky="w")
+
+        genre_var = tk.StringVar()
+        author_var = tk.StringVar()
+        year_from_var = tk.StringVar()
+        year_to_var = tk.StringVar()
+        for row, (label, var) in enumerate((("Genre:", genre_var),
+                                            ("Author:", author_var),
+                                            ("Year from:", year_from_var),
+                                            ("Year to:", year_to_var)), start=2):
+            tk.Label(form, text=label, bg=PRIMARY_BG, font=LABEL_FONT).grid(row=row, column=0, sticky="e", pady=5)
+            tk.Entry(form, textvariable=var, width=30, font=LABEL_FONT).grid(row=row, column=1, columnspan=2, sticky="w", padx=5)
+
+        use_selected = tk.BooleanVar(value=bool(selected))
+        tk.Checkbutton(
+            form, text=f"Only the {len(selected)} selected books",
+            variable=use_selected, bg=PRIMARY_BG, font=LABEL_FONT,
+            state="normal" if selected else "disabled"
+        ).grid(row=6, column=1, columnspan=2, sticky="w", pady=5)
+
+        preview = tk.Text(win, bg=PRIMARY_BG, fg=TEXT_COLOR, height=12, font=("Courier New", 10))
+        preview.pack(fill="both", expand=True, padx=20, pady=(10, 0))
+
+        def build_rule():
+            try:
+                value = float(value_var.get())
+            except ValueError:
+                messagebox.showerror("Invalid Input", "Change must be numeric.", parent=win)
+                return None
+
+            rule = {"target": target_box.get(), "match": {}}
+            rule["percent" if mode_box.get() == "percent" else "set"] = value
+            for key, var in (("genre", genre_var), ("author", author_var),
+                             ("year_from", year_from_var), ("year_to", year_to_var)):
+                if var.get().strip():
+                    rule["match"][key] = var.get().strip()
+            if use_selected.get():
+                rule["match"]["ids"] = selected
+            return rule
+
+        def do_preview():
+            rule = build_rule()
+            if rule is None:
+                return
+            result, error = api_manager_reprice_books(rule, dry_run=True)
+            if error:
+                messagebox.showerror("Error", error, parent=win)
+                return
+
+            lines = [f"{result['matched']} books match, {result['changed']} would change", ""]
+            for b in result["sample"]:
+                lines.append(
+                    f"{b['title'][:30]:30}  buy {b['price_buy']:>8.2f} -> {b['new_price_buy']:<8.2f}"
+                    f"  rent {b['price_rent']:>7.2f} -> {b['new_price_rent']:.2f}"
+                )
+            if result["matched"] > len(result["sample"]):
+                lines.append("...")
+            preview.delete("1.0", "end")
+            preview.insert("1.0", "\n".join(lines))
+
+        def do_apply():
+            rule = build_rule()
+            if rule is None:
+                return
+            if not messagebox.askyesno("Confirm", "Apply this price change to all matching books?",
+                                       parent=win):
+                return
+            result, error = api_manager_reprice_books(rule)
+            if error:
+                messagebox.showerror("Error", error, parent=win)
+                return
+            messagebox.showinfo(
+                "Success",
+                f"{result['updated']} of {result['matched']} matching books repriced.",
+                parent=win
+            )
+            win.destroy()
+            self.load_books()
+
+        btn_frame = tk.Frame(win, bg=PRIMARY_BG)
+        btn_frame.pack(fill="x", padx=20, pady=10)
+        tk.Button(btn_frame, text="Preview", bg=BUTTON_BG, fg=BUTTON_FG, font=LABEL_FONT,
+                  command=do_preview).pack(side="left", padx=5)
+        tk.Button(btn_frame, text="Apply", bg=ACCENT, fg=BUTTON_FG, font=LABEL_FONT,
+                  command=do_apply).pack(side="left", padx=5)
+        tk.Button(btn_frame, text="Cancel", bg=BUTTON_BG, fg=BUTTON_FG, font=LABEL_FONT,
+                  command=win.destroy).pack(side="left", padx=5)
+
     # ========================================================
     # Update Selected Book
     # ========================================================
@@ -875,6 +1304,106 @@ class ManagerFrame(tk.Frame):
         ).pack(side="left", padx=5)
 
 
+    # ========================================================
+    # Search Reviews Popup (all books)
+    # ========================================================
+
+    def open_review_search_popup(self):
+        """Keyword / rating / date search over every book's reviews."""
+        win = tk.Toplevel(self)
+        win.title("Search Reviews")
+        win.geometry("760x600")
+        win.configure(bg=PRIMARY_BG)
+        win.transient(self)
+
+        tk.Label(
+            win, text="Search Reviews",
+            bg=PRIMARY_BG, fg=ACCENT, font=TITLE_FONT
+        ).pack(pady=10)
+
+        form = tk.Frame(win, bg=PRIMARY_BG)
+        form.pack(fill="x", padx=20)
+
+        tk.Label(form, text="Keywords:", bg=PRIMARY_BG, font=LABEL_FONT).pack(side="left")
+        q_entry = tk.Entry(form, width=20, font=LABEL_FONT)
+        q_entry.pack(side="left", padx=(2, 10))
+
+        tk.Label(form, text="Rating:", bg=PRIMARY_BG, font=LABEL_FONT).pack(side="left")
+        rating_box = ttk.Combobox(form, state="readonly", width=5,
+                                  values=["Any", "5", "4", "3", "2", "1"])
+        rating_box.set("Any")
+        rating_box.pack(side="left", padx=(2, 10))
+
+        tk.Label(form, text="From:", bg=PRIMARY_BG, font=LABEL_FONT).pack(side="left")
+        since_entry = tk.Entry(form, width=11)
+        since_entry.pack(side="left", padx=(2, 10))
+
+        tk.Label(form, text="To:", bg=PRIMARY_BG, font=LABEL_FONT).pack(side="left")
+        until_entry = tk.Entry(form, width=11)
+        until_entry.pack(side="left", padx=(2, 10))
+
+        results_box = tk.Text(win, bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Courier New", 10))
+        results_box.pack(fill="both", expand=True, padx=20, pady=10)
+
+        # the filters of the first page, reused by Load More
+        state = {"params": None, "next_cursor": None}
+
+        def insert_hits(hits):
+            for r in hits:
+                results_box.insert("end", f"Book: {r['title']} by {r['author']}\n")
+                results_box.insert("end", f"User: {r['username']}   Rating: {r['rating']}/5\n")
+                results_box.insert("end", f"Review: {r['review_text']}\n")
+                results_box.insert("end", f"Date: {r['created_at']}\n")
+                results_box.insert("end", "-" * 50 + "\n")
+
+        def run_search(append=False):
+            if append:
+                params = dict(state["params"], cursor=state["next_cursor"])
+            else:
+                params = {}
+                for key, entry in (("q", q_entry), ("since", since_entry),
+                                   ("until", until_entry)):
+                    if entry.get().strip():
+                        params[key] = entry.get().strip()
+                if rating_box.get() != "Any":
+                    params["min_rating"] = params["max_rating"] = rating_box.get()
+                state["params"] = params
+
+            page, err = api_manager_search_reviews(params)
+            if err:
+                messagebox.showerror("Error", err, parent=win)
+                return
+
+            if not append:
+                results_box.delete("1.0", "end")
+                if not page["reviews"]:
+                    results_box.insert("1.0", "No matching reviews.")
+            insert_hits(page["reviews"])
+            state["next_cursor"] = page.get("next_cursor")
+            more_btn.config(state="normal" if state["next_cursor"] else "disabled")
+
+        tk.Button(
+            form, text="Search",
+            bg=ACCENT, fg=BUTTON_FG, font=LABEL_FONT,
+            command=run_search
+        ).pack(side="left")
+
+        btn_frame = tk.Frame(win, bg=PRIMARY_BG)
+        btn_frame.pack(fill="x", padx=20, pady=(0, 10))
+        more_btn = tk.Button(
+            btn_frame, text="Load More Reviews",
+            bg=ACCENT, fg=BUTTON_FG, font=LABEL_FONT,
+            command=lambda: run_search(append=True), state="disabled"
+        )
+        more_btn.pack(side="left", padx=5)
+        tk.Button(
+            btn_frame, text="Close",
+            bg=BUTTON_BG, fg=BUTTON_FG, font=LABEL_FONT,
+            command=win.destroy
+        ).pack(side="left", padx=5)
+
+        run_search()
+
     # ========================================================
     # View Book Reviews Popup
     # ========================================================
@@ -905,10 +1434,11 @@ class ManagerFrame(tk.Frame):
             messagebox.showerror("Error", err_details)
             return
         
-        reviews, err = api_manager_get_reviews(book_id)
+        page, err = api_manager_get_reviews(book_id)
         if err:
             messagebox.showerror("Error", err)
             return
+        reviews = page.get("reviews", [])
         
         # Create reviews popup
         win = tk.Toplevel(self)
@@ -940,6 +1470,17 @@ class ManagerFrame(tk.Frame):
             fg=TEXT_COLOR,
             font=("Georgia", 14, "bold")
         ).pack()
+
+        # Star distribution (5★ first)
+        histogram = book_details.get("rating_histogram") or {}
+        if book_details.get("review_count"):
+            tk.Label(
+                avg_rating_frame,
+                text="   ".join(f"{star}★ {histogram.get(str(star), 0)}" for star in range(5, 0, -1)),
+                bg=PRIMARY_BG,
+                fg=TEXT_COLOR,
+                font=LABEL_FONT
+            ).pack()
         
         # Reviews Section
         reviews_section = tk.Frame(win, bg=PRIMARY_BG)
@@ -966,6 +1507,95 @@ class ManagerFrame(tk.Frame):
         reviews_canvas.create_window((0, 0), window=reviews_scrollable, anchor="nw")
         reviews_canvas.configure(yscrollcommand=reviews_scrollbar.set)
         
+        def add_review_widget(review):
+            # Create a frame for each review (like a comment)
+            review_frame = tk.Frame(reviews_scrollable, bg="#f0f0f0", relief="raised", bd=1)
+            review_frame.pack(fill="x", padx=5, pady=5)
+        
+            # Username and rating header
+            header_frame = tk.Frame(review_frame, bg="#f0f0f0")
+            header_frame.pack(fill="x", padx=8, pady=(8, 4))
+        
+            username_label = tk.Label(
+                header_frame,
+                text=f"@{review['username']}",
+                bg="#f0f0f0",
+                fg=ACCENT,
+                font=("Georgia", 11, "bold")
+            )
+            username_label.pack(side="left")
+        
+            # Rating stars
+            rating_stars = "★" * review['rating'] + "☆" * (5 - review['rating'])
+            rating_label = tk.Label(
+                header_frame,
+                text=rating_stars,
+                bg="#f0f0f0",
+                fg="#FFA500",
+                font=("Georgia", 10)
+            )
+            rating_label.pack(side="left", padx=(10, 0))
+        
+            # Review text
+            if review.get('review_text'):
+                review_text_label = tk.Label(
+                    review_frame,
+                    text=review['review_text'],
+                    bg="#f0f0f0",
+                    fg=TEXT_COLOR,
+                    font=LABEL_FONT,
+                    justify="left",
+                    wraplength=450
+                )
+                review_text_label.pack(anchor="w", padx=8, pady=(0, 4))
+        
+            # Date
+            date_str = review.get('created_at', '')
+            if date_str:
+                # Format date if needed
+                try:
+                    from datetime import datetime as dt
+                    if isinstance(date_str, str):
+                        # Handle MySQL datetime format
+                        date_str_clean = date_str.split('.')[0] if '.' in date_str else date_str
+                        date_obj = dt.strptime(date_str_clean, '%Y-%m-%d %H:%M:%S')
+                        date_str = date_obj.strftime('%B %d, %Y')
+                except Exception:
+                    # If parsing fails, use original string
+                    pass
+        
+            date_label = tk.Label(
+                review_frame,
+                text=date_str,
+                bg="#f0f0f0",
+                fg="#666666",
+                font=("Georgia", 9, "italic")
+            )
+            date_label.pack(anchor="w", padx=8, pady=(0, 8))
+
+        def add_load_more(cursor):
+            """Append a button that fetches the next page of reviews"""
+            if not cursor:
+                return
+            more_btn = tk.Button(
+                reviews_scrollable, text="Load more reviews",
+                bg=ACCENT, fg=BUTTON_FG, font=LABEL_FONT,
+                command=lambda: load_more(cursor, more_btn)
+            )
+            more_btn.pack(anchor="w", padx=5, pady=5)
+
+        def load_more(cursor, more_btn):
+            next_page, err = api_manager_get_reviews(book_id, cursor)
+            if err:
+                messagebox.showerror("Error", err, parent=win)
+                return
+            more_btn.destroy()
+            for review in next_page.get("reviews", []):
+                add_review_widget(review)
+            add_load_more(next_page.get("next_cursor"))
+            reviews_canvas.update_idletasks()
+            reviews_canvas.configure(scrollregion=reviews_canvas.bbox("all"))
+
         # Display reviews in comment-style format
         if not reviews:
             tk.Label(
@@ -977,70 +1607,8 @@ class ManagerFrame(tk.Frame):
             ).pack(anchor="w", padx=5, pady=5)
         else:
             for review in reviews:
-                # Create a frame for each review (like a comment)
-                review_frame = tk.Frame(reviews_scrollable, bg="#f0f0f0", relief="raised", bd=1)
-                review_frame.pack(fill="x", padx=5, pady=5)
-                
-                # Username and rating header
-                header_frame = tk.Frame(review_frame, bg="#f0f0f0")
-                header_frame.pack(fill="x", padx=8, pady=(8, 4))
-                
-                username_label = tk.Label(
-                    header_frame,
-                    text=f"@{review['username']}",
-                    bg="#f0f0f0",
-                    fg=ACCENT,
-                    font=("Georgia", 11, "bold")
-                )
-                username_label.pack(side="left")
-                
-                # Rating stars
-                rating_stars = "★" * review['rating'] + "☆" * (5 - review['rating'])
-                rating_label = tk.Label(
-                    header_frame,
-                    text=rating_stars,
-                    bg="#f0f0f0",
-                    fg="#FFA500",
-                    font=("Georgia", 10)
-                )
-                rating_label.pack(side="left", padx=(10, 0))
-                
-                # Review text
-                if review.get('review_text'):
-                    review_text_label = tk.Label(
-                        review_frame,
-                        text=review['review_text'],
-                        bg="#f0f0f0",
-                        fg=TEXT_COLOR,
-                        font=LABEL_FONT,
-                        justify="left",
-                        wraplength=450
-                    )
-                    review_text_label.pack(anchor="w", padx=8, pady=(0, 4))
-                
-                # Date
-                date_str = review.get('created_at', '')
-                if date_str:
-                    # Format date if needed
-                    try:
-                        from datetime import datetime as dt
-                        if isinstance(date_str, str):
-                            # Handle MySQL datetime format
-                            date_str_clean = date_str.split('.')[0] if '.' in date_str else date_str
-                            date_obj = dt.strptime(date_str_clean, '%Y-%m-%d %H:%M:%S')
-                            date_str = date_obj.strftime('%B %d, %Y')
-                    except Exception:
-                        # If parsing fails, use original string
-                        pass
-                
-                date_label = tk.Label(
-                    review_frame,
-                    text=date_str,
-                    bg="#f0f0f0",
-                    fg="#666666",
-                    font=("Georgia", 9, "italic")
-                )
-                date_label.pack(anchor="w", padx=8, pady=(0, 8))
+                add_review_widget(review)
+            add_load_more(page.get("next_cursor"))
         
         reviews_canvas.pack(side="left", fill="both", expand=True)
         reviews_scrollbar.pack(side="right", fill="y")
@@ -1070,10 +1638,11 @@ class ManagerFrame(tk.Frame):
             messagebox.showerror("Error", error)
             return
 
-        reviews, err2 = api_manager_get_reviews(book_id)
+        reviews_page, err2 = api_manager_get_reviews(book_id)
         if err2:
             messagebox.showerror("Error", err2)
             return
+        reviews = reviews_page.get("reviews", [])
 
         # ------------------ POPUP WINDOW ------------------
         win = tk.Toplevel(self)
@@ -1179,16 +1748,40 @@ class ManagerFrame(tk.Frame):
         )
         reviews_box.pack(fill="both", expand=True)
 
-        if not reviews:
-            reviews_box.insert("1.0", "No reviews yet.")
-        else:
-            for r in reviews:
+        def insert_reviews(rows):
+            for r in rows:
                 reviews_box.insert("end", f"User: {r['username']}\n")
                 reviews_box.insert("end", f"Rating: {r['rating']}/5\n")
                 reviews_box.insert("end", f"Review: {r['review_text']}\n")
                 reviews_box.insert("end", f"Date: {r['created_at']}\n")
                 reviews_box.insert("end", "-" * 50 + "\n")
 
+        next_cursor = {"value": reviews_page.get("next_cursor")}
+
+        def load_more_reviews():
+            more, err = api_manager_get_reviews(book_id, next_cursor["value"])
+            if err:
+                messagebox.showerror("Error", err, parent=win)
+                return
+            insert_reviews(more.get("reviews", []))
+            next_cursor["value"] = more.get("next_cursor")
+            if not next_cursor["value"]:
+                more_btn.config(state="disabled")
+
+        if not reviews:
+            reviews_box.insert("1.0", "No reviews yet.")
+        else:
+            insert_reviews(reviews)
+
+        more_btn = tk.Button(
+            reviews_frame, text="Load More Reviews",
+            bg=ACCENT, fg=BUTTON_FG, font=LABEL_FONT,
+            command=load_more_reviews
+        )
+        more_btn.pack(anchor="w", pady=(5, 0))
+        if not next_cursor["value"]:
+            more_btn.config(state="disabled")
+
         # ------------------ SAVE CHANGES BUTTON ------------------
         def save_updates():
             try:
@@ -1264,7 +1857,8 @@ class ManagerFrame(tk.Frame):
         table_frame = tk.Frame(self.content, bg=PRIMARY_BG)
         table_frame.pack(fill="both", expand=True, pady=(10, 0))
 
-        columns = ("id", "username", "email", "created", "orders", "rentals")
+        columns = ("id", "username", "email", "created", "orders", "rentals",
+                   "spend", "last_order")
         self.customers_tree = ttk.Treeview(
             table_frame, columns=columns, show="headings", height=14
         )
@@ -1275,7 +1869,9 @@ class ManagerFrame(tk.Frame):
             "email": "Email",
             "created": "Joined",
             "orders": "Total Orders",
-            "rentals": "Active Rentals"
+            "rentals": "Active Rentals",
+            "spend": "Lifetime Spend",
+            "last_order": "Last Order"
         }
 
         for col in columns:
@@ -1292,6 +1888,8 @@ class ManagerFrame(tk.Frame):
         self.customers_tree.column("created", width=150)
         self.customers_tree.column("orders", width=120, anchor="center")
         self.customers_tree.column("rentals", width=120, anchor="center")
+        self.customers_tree.column("spend", width=120, anchor="e")
+        self.customers_tree.column("last_order", width=150)
 
         self.customers_tree.pack(side="left", fill="both", expand=True)
 
@@ -1312,6 +1910,13 @@ class ManagerFrame(tk.Frame):
             command=self.open_customer_profile
         ).pack(side="left", padx=5)
 
+        self.btn_more_customers = tk.Button(
+            btn_frame, text="Load More Customers",
+            bg=BUTTON_BG, fg=BUTTON_FG, font=LABEL_FONT,
+            command=lambda: self.load_customers(append=True)
+        )
+        self.btn_more_customers.pack(side="right", padx=5)
+
         # Initial load
         self.load_customers()
 
@@ -1320,47 +1925,49 @@ class ManagerFrame(tk.Frame):
     # Load customers
     # ========================================================
 
-    def load_customers(self):
-        query = self.customer_search_var.get().strip()
-
-        users, error = api_manager_search_customers(query)
+    def load_customers(self, append=False):
+        """Load the first page for the current search, or the next page of it."""
+        if append:
+            if not self.customers_cursor:
+                return
+            params = dict(self.customers_params, cursor=self.customers_cursor)
+        else:
+            params = {}
+            query = self.customer_search_var.get().strip()
+            if query:
+                params["q"] = query
+            self.customers_params = params
+            self.customers_tree.delete(*self.customers_tree.get_children())
+            self.customer_rows = []
+
+        page, error = api_manager_get_customer_summaries(params)
         if error:
             messagebox.showerror("Error", error)
             return
 
-        # Count orders & rentals
-        rows = []
-        for u in users:
-            orders, _ = api_manager_get_customer_orders(u["id"])
-            rentals, _ = api_manager_get_customer_rentals(u["id"])
-
-            active_rentals = [r for r in rentals if r["returned_at"] is None]
+        customers = page["customers"]
+        self.customers_cursor = page["next_cursor"]
+        self.customer_rows.extend(customers)
 
-            rows.append({
-                "id": u["id"],
-                "username": u["username"],
-                "email": u["email"],
-                "created": u["created_at"],
-                "orders": len(orders),
-                "rentals": len(active_rentals)
-            })
-
-        self.customer_rows = rows
-        self.customers_tree.delete(*self.customers_tree.get_children())
-
-        for r in rows:
+        for c in customers:
             self.customers_tree.insert(
-                "", "end", iid=str(r["id"]),
+                "", "end", iid=str(c["id"]),
                 values=(
-                    r["id"],
-                    r["username"],
-                    r["email"],
-                    r["created"],
-                    r["orders"],
-                    r["rentals"]
+                    c["id"],
+                    c["username"],
+                    c["email"],
+                    c["created_at"],
+                    c["order_count"],
+                    c["active_rental_count"],
+                    f"${c['lifetime_spend']:.2f}",
+                    c["last_order_at"] or "—"
                 )
             )
 
+        self.btn_more_customers.config(
+            state="normal" if self.customers_cursor else "disabled"
+        )
+
 
     # ========================================================
     # View Selected Customer Profile
@@ -1642,6 +2249,9 @@ class ManagerFrame(tk.Frame):
         )
         due_box.pack()
 
+        # one Idempotency-Key per (book, due date), reused if Create is retried
+        rent_keys = {}
+
         def submit():
             if not dropdown.get() or not due_box.get():
                 messagebox.showwarning("Missing Fields", "Select both fields.")
@@ -1651,7 +2261,8 @@ class ManagerFrame(tk.Frame):
             days = int(due_box.get().split()[0])
             due_date = (datetime.now() + timedelta(days=days)).strftime("%Y-%m-%d")
 
-            _, err = api_manager_manual_rent(cid, book_id, due_date)
+            key = rent_keys.setdefault((book_id, due_date), new_idempotency_key())
+            _, err = api_manager_manual_rent(cid, book_id, due_date, key)
             if err:
                 messagebox.showerror("Error", err)
                 return
@@ -8,6 +8,12 @@ CREATE DATABASE IF NOT EXISTS online_bookstore
 
 USE online_bookstore;
 
+DROP TABLE IF EXISTS inventory_ledger_state;
+DROP TABLE IF EXISTS inventory_checkpoints;
+DROP TABLE IF EXISTS inventory_movements;
+DROP TABLE IF EXISTS idempotency_keys;
+DROP TABLE IF EXISTS inventory_shards;
+DROP TABLE IF EXISTS book_stats;
 DROP TABLE IF EXISTS rentals;
 DROP TABLE IF EXISTS reviews;
 DROP TABLE IF EXISTS inventory;
@@ -169,3 +175,198 @@ CREATE TABLE reviews (
 
     UNIQUE KEY unique_review_per_user (user_id, book_id)
 );
+
+-- Keyset pagination of a book's reviews (newest first)
+CREATE INDEX idx_reviews_book_created ON reviews (book_id, created_at, id);
+
+-- Manager review search across the catalog (keywords, date order)
+CREATE FULLTEXT INDEX ft_reviews_text ON reviews (review_text);
+CREATE INDEX idx_reviews_created ON reviews (created_at, id);
+
+
+-- ============================
+-- FUTURE: Denormalized Rating Aggregates
+-- ============================
+-- Kept in step with reviews by add_review (see backend/book_stats.py).
+-- Rebuild after manual edits or drift with:  python book_stats.py
+
+CREATE TABLE book_stats (
+    book_id      INT UNSIGNED PRIMARY KEY,
+    rating_sum   INT NOT NULL DEFAULT 0,
+    rating_count INT NOT NULL DEFAULT 0,
+    avg_rating   DECIMAL(3,1)
+      AS (ROUND(rating_sum / NULLIF(rating_count, 0), 1)) STORED,
+    -- 1–5 star histogram
+    rating_1     INT NOT NULL DEFAULT 0,
+    rating_2     INT NOT NULL DEFAULT 0,
+    rating_3     INT NOT NULL DEFAULT 0,
+    rating_4     INT NOT NULL DEFAULT 0,
+    rating_5     INT NOT NULL DEFAULT 0,
+    last_updated DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    CONSTRAINT fk_book_stats_book
+      FOREIGN KEY (book_id) REFERENCES books(id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+
+-- ============================
+-- FUTURE: Sharded Inventory Counters
+-- ============================
+-- Hot titles can keep their stock in N slot rows instead of one inventory
+-- row, so concurrent orders lock different rows.  shard_count = 0 means the
+-- inventory row is authoritative; otherwise its counts are a cached SUM of
+-- the slots.  Managed with:  python inventory_shards.py enable <book_id> <slots>
+
+ALTER TABLE inventory
+  ADD COLUMN shard_count TINYINT UNSIGNED NOT NULL DEFAULT 0,
+  ADD INDEX idx_inventory_shard_count (shard_count);
+
+CREATE TABLE inventory_shards (
+    book_id          INT UNSIGNED NOT NULL,
+    slot             TINYINT UNSIGNED NOT NULL,
+    -- per-slot totals can go negative (a copy rented from one slot may be
+    -- returned to another); only the sums are meaningful
+    available_copies INT NOT NULL DEFAULT 0,
+    total_copies     INT NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (book_id, slot),
+    CONSTRAINT chk_inventory_shards_available CHECK (available_copies >= 0),
+    CONSTRAINT fk_inventory_shards_book
+      FOREIGN KEY (book_id) REFERENCES books(id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+
+-- ============================
+-- FUTURE: Async Order Intake
+-- ============================
+-- Orders placed from the local intake queue (backend/order_queue.py) carry
+-- their ticket, so a batch drained twice is recognised instead of re-placed.
+
+ALTER TABLE orders
+  ADD COLUMN intake_ticket CHAR(32) NULL,
+  ADD UNIQUE KEY uq_orders_intake_ticket (intake_ticket);
+
+
+-- ============================
+-- FUTURE: Idempotency Keys
+-- ============================
+-- Responses of POST /api/orders and manual rentals sent with an
+-- Idempotency-Key header (see backend/idempotency.py).  Expired keys are
+-- swept in batches through idx_idempotency_expires.
+
+CREATE TABLE idempotency_keys (
+    id            BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    scope         VARCHAR(32) NOT NULL,
+    user_id       INT UNSIGNED NOT NULL,
+    idem_key      VARCHAR(64) NOT NULL,
+    request_hash  CHAR(64) NOT NULL,
+    status_code   SMALLINT UNSIGNED NULL,
+    response_body MEDIUMTEXT NULL,
+    created_at    DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at    DATETIME NOT NULL,
+
+    UNIQUE KEY uq_idempotency_key (scope, user_id, idem_key),
+    INDEX idx_idempotency_expires (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+
+-- ============================
+-- FUTURE: Inventory Movements Ledger
+-- ============================
+-- Every stock change is appended here by the write path that made it
+-- (see backend/inventory_ledger.py).  The compactor folds movements into
+-- per-book checkpoints so point-in-time stock never needs full history:
+--   python inventory_ledger.py compact [--prune-days N]
+
+CREATE TABLE inventory_movements (
+    id              BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    book_id         INT UNSIGNED NOT NULL,
+    reason          ENUM('create','buy','rent','return','adjust','edit',
+                         'import','reconcile') NOT NULL,
+    delta_total     INT NOT NULL DEFAULT 0,
+    delta_available INT NOT NULL DEFAULT 0,
+    ref_type        VARCHAR(16) NULL,
+    ref_id          BIGINT UNSIGNED NULL,
+    actor_id        INT UNSIGNED NULL,
+    created_at      DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+
+    -- movements after a checkpoint (book_id, id > n) and time windows
+    INDEX idx_movements_book_id (book_id, id),
+    INDEX idx_movements_book_time (book_id, created_at, id),
+    INDEX idx_movements_created (created_at, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE inventory_checkpoints (
+    book_id          INT UNSIGNED NOT NULL,
+    movement_id      BIGINT UNSIGNED NOT NULL,  -- last movement folded in
+    as_of            DATETIME(6) NOT NULL,
+    total_copies     INT NOT NULL,
+    available_copies INT NOT NULL,
+
+    PRIMARY KEY (book_id, movement_id),
+    INDEX idx_checkpoints_book_time (book_id, as_of)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE inventory_ledger_state (
+    id               TINYINT UNSIGNED PRIMARY KEY,
+    last_movement_id BIGINT UNSIGNED NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
+
+INSERT INTO inventory_ledger_state (id, last_movement_id) VALUES (1, 0);
+
+
+-- ============================
+-- FUTURE: Inventory Reconciliation
+-- ============================
+-- Open-rental counts per book range for backend/reconcile_inventory.py
+
+CREATE INDEX idx_rentals_book_open ON rentals (book_id, returned_at);
+
+
+-- ============================
+-- FUTURE: Display Snapshots on Order Items / Rentals
+-- ============================
+-- Title/author as they were when the item was ordered or rented, so
+-- history and order listings need no join to books.  Existing rows:
+--   python backfill_snapshots.py
+
+ALTER TABLE order_items
+  ADD COLUMN title  VARCHAR(255) NULL,
+  ADD COLUMN author VARCHAR(255) NULL;
+
+ALTER TABLE rentals
+  ADD COLUMN title  VARCHAR(255) NULL,
+  ADD COLUMN author VARCHAR(255) NULL;
+
+
+-- ============================
+-- FUTURE: Paginated Manager Orders
+-- ============================
+-- Keyset pages on (created_at, id), optionally filtered by status
+
+CREATE INDEX idx_orders_created ON orders (created_at, id);
+CREATE INDEX idx_orders_status_created ON orders (payment_status, created_at, id);
+
+
+-- ============================
+-- FUTURE: Bulk Repricing
+-- ============================
+-- Author rules in POST /api/manager/books/reprice (genre/year rules use
+-- idx_books_genre_year)
+
+CREATE INDEX idx_books_author ON books (author);
+
+
+-- ============================
+-- FUTURE: Customer Summaries
+-- ============================
+-- GET /api/manager/customers/summary: keyset pages of customers, then
+-- per-page order and open-rental aggregates read from the indexes alone
+
+CREATE INDEX idx_users_role_created ON users (role, created_at, id);
+CREATE INDEX idx_orders_user_spend ON orders (user_id, created_at, total_price);
+CREATE INDEX idx_rentals_user_open ON rentals (user_id, returned_at);
@@ -183,3 +183,39 @@ VALUES
   (4, 20, 4, 'Great dystopian energy and strong characters.'),
   (4, 31, 3, 'Well-written but a bit slow in the middle.'),
   (4, 47, 5, 'A powerful book that really made me think.');
+
+
+-- ========================================
+-- BOOK STATS (rating aggregates for the reviews above)
+-- ========================================
+
+INSERT INTO book_stats (book_id, rating_sum, rating_count,
+                        rating_1, rating_2, rating_3, rating_4, rating_5)
+SELECT book_id, SUM(rating), COUNT(*),
+       SUM(rating = 1), SUM(rating = 2), SUM(rating = 3),
+       SUM(rating = 4), SUM(rating = 5)
+FROM reviews
+GROUP BY book_id;
+
+
+-- ========================================
+-- INVENTORY LEDGER BASELINE (seeded stock, before any movements)
+-- ========================================
+
+INSERT INTO inventory_checkpoints (book_id, movement_id, as_of,
+                                   total_copies, available_copies)
+SELECT book_id, 0, NOW(6), total_copies, available_copies
+FROM inventory;
+
+
+-- ========================================
+-- TITLE / AUTHOR SNAPSHOTS for the seeded order items and rentals
+-- ========================================
+
+UPDATE order_items oi
+JOIN books b ON b.id = oi.book_id
+SET oi.title = b.title, oi.author = b.author;
+
+UPDATE rentals r
+JOIN books b ON b.id = r.book_id
+SET r.title = b.title, r.author = b.author;